@@ -15,20 +15,115 @@ BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 PIPER_MODEL_RELATIVE = os.getenv('PIPER_MODEL', 'models/fr_FR-siwis-medium.onnx')
 PIPER_MODEL = os.path.join(BASE_DIR, PIPER_MODEL_RELATIVE)
 
+# Nombre de processus Piper pour la synthèse parallèle par phrases (0 ou 1 = synthèse série)
+PIPER_WORKERS = int(os.getenv('PIPER_WORKERS', 0))
+
+# Regroupement des requêtes PaddleOCR : taille maximale d'un lot et attente maximale (ms)
+OCR_BATCH_MAX_SIZE = int(os.getenv('OCR_BATCH_MAX_SIZE', 4))
+OCR_BATCH_MAX_WAIT_MS = int(os.getenv('OCR_BATCH_MAX_WAIT_MS', 20))
+
 # Configuration Coqui
 COQUI_TTS_URL = os.getenv('COQUI_TTS_URL', 'http://localhost:5002')
+# Un ou plusieurs serveurs Coqui (séparés par des virgules), utilisés à tour de rôle
+COQUI_TTS_URLS = [url.strip() for url in COQUI_TTS_URL.split(',') if url.strip()]
+COQUI_SPEAKER = os.getenv('COQUI_SPEAKER', 'Viktor Eka')
+COQUI_LANGUAGE = os.getenv('COQUI_LANGUAGE', 'fr')
+# Synthèse Coqui par morceaux alignés sur les phrases : taille maximale d'un morceau
+# (XTTS tronque au-delà d'environ 250 caractères) et nombre de requêtes simultanées
+COQUI_CHUNK_CHARS = int(os.getenv('COQUI_CHUNK_CHARS', 240))
+COQUI_WORKERS = int(os.getenv('COQUI_WORKERS', 2))
 
 # Jeton
 GROQ_TOKEN = os.getenv('GROQ_TOKEN', '')
 
+# Adresses des API Groq et Google Books (à remplacer par de faux serveurs pour les tests de charge).
+# GROQ_BASE_URL vide : adresse par défaut du client Groq
+GROQ_BASE_URL = os.getenv('GROQ_BASE_URL', '') or None
+GOOGLE_BOOKS_URL = os.getenv('GOOGLE_BOOKS_URL', 'https://www.googleapis.com/books/v1').rstrip('/')
+
 # Port de communication flask
 FLASK_PORT = int(os.getenv('FLASK_PORT', 5000)) 
 
-# Définir le chemin des uploads
-UPLOAD_FOLDER = os.path.join(BASE_DIR, '../lutrin_data/')
+# Nombre de threads de waitress (requêtes traitées simultanément)
+WAITRESS_THREADS = int(os.getenv('WAITRESS_THREADS', 6))
+
+# Définir le chemin des uploads (dossier des données : fichiers, caches et base de données)
+UPLOAD_FOLDER = os.getenv('DATA_FOLDER', '') or os.path.join(BASE_DIR, '../lutrin_data/')
+
+# Cache disque des fichiers audio TTS (taille maximale en Mo, tous formats confondus)
+TTS_CACHE_FOLDER = os.path.join(UPLOAD_FOLDER, 'tts_cache')
+TTS_CACHE_MAX_MB = int(os.getenv('TTS_CACHE_MAX_MB', 1024))
+
+# Format de l'audio servi par défaut : wav, mp3 ou opus (les formats compressés nécessitent ffmpeg)
+AUDIO_FORMAT = os.getenv('AUDIO_FORMAT', 'mp3').lower()
+FFMPEG_PATH = os.getenv('FFMPEG_PATH', 'ffmpeg')
+
+# Cache des EPUB déjà importés (résultat de l'extraction, par empreinte du fichier)
+# et des enrichissements de métadonnées (par titre et auteur), tailles maximales en Mo
+EPUB_CACHE_FOLDER = os.path.join(UPLOAD_FOLDER, 'epub_cache')
+EPUB_CACHE_MAX_MB = int(os.getenv('EPUB_CACHE_MAX_MB', 512))
+ENRICHMENT_CACHE_FOLDER = os.path.join(UPLOAD_FOLDER, 'enrichment_cache')
+ENRICHMENT_CACHE_MAX_MB = int(os.getenv('ENRICHMENT_CACHE_MAX_MB', 32))
+
+# Couvertures des EPUB (fichiers adressés par contenu) et largeurs des miniatures générées (px)
+COVER_FOLDER = os.path.join(UPLOAD_FOLDER, 'covers')
+COVER_SIZES = sorted(int(size) for size in os.getenv('COVER_SIZES', '160,480').split(','))
+
+# Fichiers produits pour chaque utilisateur (captures, textes OCR), rangés par utilisateur :
+# durée de conservation depuis le dernier accès (en secondes), quota par utilisateur (en Mo)
+# et intervalle (en secondes) entre deux passages du nettoyage en tâche de fond
+ARTIFACT_FOLDER = os.path.join(UPLOAD_FOLDER, 'users')
+ARTIFACT_TTL = int(os.getenv('ARTIFACT_TTL', 3600))
+ARTIFACT_USER_MAX_MB = int(os.getenv('ARTIFACT_USER_MAX_MB', 100))
+ARTIFACT_JANITOR_INTERVAL = int(os.getenv('ARTIFACT_JANITOR_INTERVAL', 60))
+
+# Travaux asynchrones : nombre de travailleurs par type, profondeur maximale des files
+# et durée de conservation (en secondes) des résultats des travaux terminés
+JOB_WORKERS = {
+    'ocr': int(os.getenv('JOB_WORKERS_OCR', 1)),
+    'tts': int(os.getenv('JOB_WORKERS_TTS', 2)),
+    'epub': int(os.getenv('JOB_WORKERS_EPUB', 2)),
+}
+JOB_QUEUE_MAX = int(os.getenv('JOB_QUEUE_MAX', 50))
+JOB_RETENTION = int(os.getenv('JOB_RETENTION', 600))
+
+# Nombre de processus pour l'extraction parallèle du texte des EPUB (0 ou 1 = extraction série)
+EPUB_PARSE_WORKERS = int(os.getenv('EPUB_PARSE_WORKERS', 0))
+
+# Enrichissement des métadonnées des EPUB : délai maximal par source (Groq, Google Books...)
+# et délai global au-delà duquel on garde les résultats déjà disponibles (en secondes)
+ENRICHMENT_SOURCE_TIMEOUT = float(os.getenv('ENRICHMENT_SOURCE_TIMEOUT', 8))
+ENRICHMENT_DEADLINE = float(os.getenv('ENRICHMENT_DEADLINE', 15))
+
+# Appels sortants (Coqui, Groq, Google Books, Open Library) : connexions conservées par hôte,
+# nouvelles tentatives, échecs consécutifs ouvrant le disjoncteur d'un service distant
+# et durée (en secondes) pendant laquelle il est ensuite considéré comme indisponible
+HTTP_POOL_SIZE = int(os.getenv('HTTP_POOL_SIZE', 10))
+HTTP_RETRIES = int(os.getenv('HTTP_RETRIES', 2))
+HTTP_BREAKER_THRESHOLD = int(os.getenv('HTTP_BREAKER_THRESHOLD', 5))
+HTTP_BREAKER_RESET = float(os.getenv('HTTP_BREAKER_RESET', 30))
+
+# Délais (en secondes) : établissement d'une connexion, réponse de Coqui (synthèse) et de Groq (OCR)
+HTTP_CONNECT_TIMEOUT = float(os.getenv('HTTP_CONNECT_TIMEOUT', 3))
+COQUI_TIMEOUT = float(os.getenv('COQUI_TIMEOUT', 120))
+GROQ_TIMEOUT = float(os.getenv('GROQ_TIMEOUT', 30))
+
+# Durée (en secondes) de mise en cache des utilisateurs authentifiés par clé d'API ; les modifications
+# faites par un autre processus (make add-user) ne sont vues qu'après ce délai
+AUTH_CACHE_TTL = int(os.getenv('AUTH_CACHE_TTL', 60))
+
+# Journalisation : niveau minimal (debug, info, warning, error), format (text pour un terminal,
+# json pour un collecteur de journaux), longueur maximale d'un message, taille de la file d'écriture
+# et limitation de débit par appel (messages par fenêtre de LOG_RATE_WINDOW secondes, 0 = sans limite)
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'info')
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'text')
+LOG_MAX_CHARS = int(os.getenv('LOG_MAX_CHARS', 2000))
+LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', 10000))
+LOG_RATE_LIMIT = int(os.getenv('LOG_RATE_LIMIT', 20))
+LOG_RATE_WINDOW = float(os.getenv('LOG_RATE_WINDOW', 10))
 
 # Définir le chemin de la base de données
-DATABASE_PATH = os.path.join(BASE_DIR, '../lutrin_data/database.db')
+DATABASE_PATH = os.path.join(UPLOAD_FOLDER, 'database.db')
 
 # Création du répertoire de stockage s'il n'existe pas
 if not os.path.exists(UPLOAD_FOLDER):
@@ -1,16 +1,18 @@
 import os
+import io
+import json
 import time
-import uuid
 import asyncio
 
 from functools import wraps
 import ssl
 from flask import Flask, Response, jsonify, send_from_directory, url_for, request, g
 from flask_cors import CORS
+from werkzeug.datastructures import FileStorage
 from werkzeug.utils import secure_filename
 from waitress import serve
-from .services import ocr_image, generate_tts, BigTitle, auth_service, ocr_service, tts_service, epub_service
-from .config import UPLOAD_FOLDER, FLASK_PORT
+from .services import ocr_image, ocr_image_bytes, generate_tts, BigTitle, auth_service, ocr_service, tts_service, epub_service, job_service, library_service, http_service, audio_service, artifact_service, metrics_service, logger_service
+from .config import UPLOAD_FOLDER, FLASK_PORT, COVER_FOLDER, TTS_CACHE_FOLDER, ARTIFACT_FOLDER, GROQ_TOKEN, WAITRESS_THREADS
 
 # Configuration de Flask
 app = Flask(__name__)
@@ -19,6 +21,24 @@ app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 # Activation de CORS pour toutes les routes
 CORS(app)
 
+# --- Mesures des requêtes (exposées par /metrics) ---
+@app.before_request
+def start_request_metrics():
+    g.request_start = time.perf_counter()
+    if request.mimetype == 'multipart/form-data':
+        # Les fichiers envoyés sont décodés ici, une fois : leur réception est mesurée à part du traitement
+        metrics_service.observe('lutrin_upload_size_bytes', request.content_length or 0, endpoint=request.endpoint or 'unknown')
+        with metrics_service.timed('upload'):
+            request.files
+
+@app.after_request
+def record_request_metrics(response):
+    endpoint = request.endpoint or 'unknown' # Routes inconnues regroupées : pas d'étiquette par URL
+    if 'request_start' in g:
+        metrics_service.observe('lutrin_http_request_duration_seconds', time.perf_counter() - g.request_start, endpoint=endpoint)
+    metrics_service.inc('lutrin_http_requests_total', endpoint=endpoint, status=response.status_code)
+    return response
+
 # --- Décorateur pour la protection par clé d'API ---
 def api_key_required(f):
     @wraps(f)
@@ -50,18 +70,145 @@ def admin_required(f):
         return f(*args, **kwargs)
     return decorated_function
 
+def _file_url(filename):
+    """URL d'un fichier servi par /file, utilisable aussi hors requête (travaux asynchrones)."""
+    with app.test_request_context():
+        return url_for('serve_file', filename=filename)
+
+def _wants_async():
+    """Indique si le client demande un traitement asynchrone (paramètre '?async=1')."""
+    return request.args.get('async', '').lower() in ('1', 'true', 'yes')
+
+def _dispatch(job_type, func, *args, on_rejected=None):
+    """
+    Exécute `func` (qui retourne un couple (données, code HTTP)) immédiatement, ou
+    la soumet à la file de travaux si le client a demandé un traitement asynchrone.
+    `on_rejected` est appelé si la file est pleine (func ne sera alors jamais exécutée).
+    """
+
+    if not _wants_async():
+        payload, http_status = func(*args)
+        return jsonify(payload), http_status
+
+    try:
+        job_id = job_service.submit_job(job_type, func, *args, user_id=g.user['id'])
+    except job_service.QueueFullError as e:
+        if on_rejected:
+            on_rejected()
+        return jsonify({"error": str(e)}), 503
+
+    return jsonify({
+        "status": "queued",
+        "job_id": job_id,
+        "job_url": url_for('get_job', job_id=job_id),
+        "events_url": url_for('job_events', job_id=job_id),
+    }), 202
+
+def _job_view(job):
+    """Met en forme un travail pour la réponse JSON (résultat et code HTTP du traitement)."""
+    view = {key: value for key, value in job.items() if key != 'result'}
+    if job['result'] is not None:
+        view['result'], view['result_status'] = job['result']
+    return view
+
 @app.route('/status')
 def status():
     """
-    Vérifie l'état de l'API.
+    Vérifie l'état de l'API. Le détail (caches, files, fichiers des utilisateurs, services
+    distants, journaux) n'est renvoyé qu'avec une clé d'API valide dans l'en-tête 'X-API-Key'.
     """
 
-    return jsonify({
+    payload = {
         "status": "online",
         "api_name": "Lutrin Pi API",
         "version": "1.0",
+    }
+    api_key = request.headers.get('X-API-Key')
+    if not api_key or auth_service.get_user_by_api_key(api_key) is None:
+        return jsonify(payload)
+
+    return jsonify({
+        **payload,
+        "tts_cache": tts_service.cache_stats(),
+        "epub_cache": epub_service.book_cache.stats(),
+        "enrichment_cache": epub_service.enrichment_cache.stats(),
+        "jobs": job_service.queue_stats(),
+        "artifacts": artifact_service.stats(),
+        "upstreams": http_service.upstream_stats(),
+        "stages": metrics_service.stage_quantiles(),
+        "logging": logger_service.stats(),
     })
 
+def _family(name, metric_type, description, values, label):
+    """Famille de métriques à une étiquette, à partir d'un dictionnaire {valeur d'étiquette: valeur}."""
+    return (name, metric_type, description, [({label: key}, value) for key, value in values.items()])
+
+def _metrics_families():
+    """Métriques calculées à la demande : état des moteurs, files, caches et services distants."""
+    upstreams = http_service.upstream_stats()
+    jobs = job_service.queue_stats()
+    caches = {f"tts_{audio_format}": stats for audio_format, stats in tts_service.cache_stats().items()}
+    caches.update(epub=epub_service.book_cache.stats(), enrichment=epub_service.enrichment_cache.stats())
+    artifacts = artifact_service.stats()
+    logs = logger_service.stats()
+    engines = {
+        "paddle": ocr_service.ocr_engine is not None,
+        "groq": bool(GROQ_TOKEN) and upstreams['groq']['state'] != 'open',
+        "piper": tts_service.voice is not None,
+        "piper_pool": tts_service.piper_pool is not None,
+        "coqui": upstreams['coqui']['state'] != 'open',
+        "ffmpeg": audio_service.encoder_path() is not None,
+    }
+
+    families = [
+        _family('lutrin_engine_ready', 'gauge', "Moteur chargé et disponible (1) ou non (0)", engines, 'engine'),
+        ('lutrin_ocr_batch_queue_depth', 'gauge', "Images en attente du répartiteur PaddleOCR", [({}, ocr_service.queue_depth())]),
+    ]
+    for key, metric_type, description in (
+        ('queued', 'gauge', "Travaux en attente, par type"),
+        ('running', 'gauge', "Travaux en cours, par type"),
+        ('workers', 'gauge', "Travailleurs, par type de travail"),
+        ('completed', 'counter', "Travaux terminés, par type"),
+        ('failed', 'counter', "Travaux en échec, par type"),
+        ('rejected', 'counter', "Travaux refusés (file pleine), par type"),
+    ):
+        name = f"lutrin_jobs_{key}_total" if metric_type == 'counter' else f"lutrin_jobs_{key}"
+        families.append(_family(name, metric_type, description, {t: s[key] for t, s in jobs.items()}, 'type'))
+    for key, metric_type, description in (
+        ('size_bytes', 'gauge', "Taille des caches disque, en octets"),
+        ('entries', 'gauge', "Entrées des caches disque"),
+        ('hits', 'counter', "Succès des caches disque"),
+        ('misses', 'counter', "Échecs des caches disque"),
+        ('evictions', 'counter', "Évictions des caches disque"),
+    ):
+        name = f"lutrin_cache_{key}_total" if metric_type == 'counter' else f"lutrin_cache_{key}"
+        families.append(_family(name, metric_type, description, {c: s[key] for c, s in caches.items()}, 'cache'))
+    families.append(_family('lutrin_upstream_up', 'gauge', "Disjoncteur du service distant fermé (1) ou non (0)",
+                            {u: s['state'] == 'closed' for u, s in upstreams.items()}, 'upstream'))
+    for key, description in (
+        ('calls', "Appels aux services distants"),
+        ('failures', "Appels en échec aux services distants"),
+        ('retries', "Nouvelles tentatives vers les services distants"),
+        ('short_circuited', "Appels refusés par un disjoncteur ouvert"),
+    ):
+        families.append(_family(f"lutrin_upstream_{key}_total", 'counter', description, {u: s[key] for u, s in upstreams.items()}, 'upstream'))
+    families.append(('lutrin_artifacts', 'gauge', "Fichiers des utilisateurs indexés", [({}, artifacts['artifacts'])]))
+    families.append(_family('lutrin_log_messages_total', 'counter', "Messages de journal écrits, perdus (file pleine) ou ignorés (limitation de débit)",
+                            {outcome: logs[outcome] for outcome in ('written', 'dropped', 'suppressed')}, 'outcome'))
+    families.append(('lutrin_artifacts_size_bytes', 'gauge', "Taille des fichiers des utilisateurs, en octets", [({}, artifacts['size_bytes'])]))
+    return families
+
+@app.route('/metrics')
+@api_key_required
+def metrics():
+    """
+    Métriques au format texte Prometheus : histogrammes de durée par étape (upload, OCR,
+    synthèse, EPUB, authentification), requêtes HTTP, files, caches et état des moteurs.
+    La collecte doit envoyer une clé d'API dans l'en-tête 'X-API-Key'.
+    """
+
+    return Response(metrics_service.render(_metrics_families()), content_type='text/plain; version=0.0.4; charset=utf-8')
+
 @app.route('/auth/login', methods=['POST'])
 def login():
     """Authentifie un utilisateur et retourne une clé d'API."""
@@ -92,15 +239,12 @@ def upload_image():
     if file.filename == '':
         return jsonify({"error": "Aucun fichier sélectionné"}), 400
     
-    timestamp = int(time.time())
-    unique_id = uuid.uuid4().hex[:6]
-
     # Utilise secure_filename pour la sécurité, même si on le renomme après
     original_filename = secure_filename(file.filename)
     extension = os.path.splitext(original_filename)[1] or '.jpg'
-    new_filename = f"capture_{g.user['id']}_{unique_id}_{timestamp}{extension}"
-    filepath = os.path.join(app.config['UPLOAD_FOLDER'], new_filename)
+    new_filename, filepath = artifact_service.new_artifact(g.user['id'], 'capture', extension)
     file.save(filepath)
+    artifact_service.register(filepath)
     
     return jsonify({"status": "success", "image_filename": new_filename})
 
@@ -122,15 +266,65 @@ def process_ocr():
     if not os.path.exists(image_path):
         return jsonify({"error": "Le fichier image est introuvable sur le serveur"}), 404
 
-    timestamp = int(time.time())
-    unique_id = uuid.uuid4().hex[:6]
-    text_filename = f"ocr_result_{g.user['id']}_{unique_id}_{timestamp}.txt"
+    text_filename, _ = artifact_service.new_artifact(g.user['id'], 'ocr_result', '.txt')
 
-    recognized_text, text_path_or_error = ocr_image(image_path, text_filename, ocr_engine_choice=ocr_engine, user_id=g.user['id'])
+    # La capture est protégée du nettoyage dès maintenant, pendant qu'elle attend dans la file
+    # puis pendant l'OCR : _run_ocr la libère (ou on_rejected, si elle n'entre pas dans la file)
+    artifact_service.pin(image_path)
+    return _dispatch('ocr', _run_ocr, image_path, text_filename, ocr_engine,
+                     on_rejected=lambda: artifact_service.unpin(image_path))
+
+def _run_ocr(image_path, text_filename, ocr_engine):
+    """Exécute l'OCR d'une capture protégée par artifact_service.pin() et retourne (données de réponse, code HTTP)."""
+    try:
+        recognized_text, text_path_or_error = ocr_image(image_path, text_filename, ocr_engine_choice=ocr_engine)
+    finally:
+        artifact_service.unpin(image_path)
     if not recognized_text and text_path_or_error: # Si l'OCR a échoué
-        return jsonify({"error": "L'OCR a échoué", "details": text_path_or_error}), 500
+        return {"error": "L'OCR a échoué", "details": text_path_or_error}, 500
+
+    return {"status": "success", "text": recognized_text, "text_filename": text_filename, "text_url": _file_url(text_filename)}, 200
+
+@app.route('/ocr/image', methods=['POST']) # Étapes 1+2: OCR directement depuis l'image
+@api_key_required
+def process_ocr_image():
+    """
+    Prend une image (champ 'image') et retourne le texte reconnu, sans écrire sur disque.
+    L'image et le texte ne sont conservés dans le dossier de l'utilisateur que si 'save' vaut '1'.
+    """
 
-    return jsonify({"status": "success", "text": recognized_text, "text_filename": text_filename, "text_url": url_for('serve_file', filename=text_filename)})
+    if 'image' not in request.files:
+        return jsonify({"error": "Aucun fichier image n'a été envoyé"}), 400
+
+    file = request.files['image']
+    image_bytes = file.read()
+    if not image_bytes:
+        return jsonify({"error": "Aucun fichier sélectionné"}), 400
+
+    ocr_engine = request.form.get('ocr_engine', 'paddle') # 'paddle' par défaut
+    save = request.form.get('save', '').lower() in ('1', 'true', 'yes')
+
+    image_filename = text_filename = None
+    if save:
+        extension = os.path.splitext(secure_filename(file.filename or ''))[1] or '.jpg'
+        image_filename, image_path = artifact_service.new_artifact(g.user['id'], 'capture', extension)
+        text_filename, _ = artifact_service.new_artifact(g.user['id'], 'ocr_result', '.txt')
+        with open(image_path, 'wb') as f:
+            f.write(image_bytes)
+        artifact_service.register(image_path)
+
+    return _dispatch('ocr', _run_ocr_image, image_bytes, ocr_engine, image_filename, text_filename)
+
+def _run_ocr_image(image_bytes, ocr_engine, image_filename, text_filename):
+    """Exécute l'OCR en mémoire et retourne (données de réponse, code HTTP)."""
+    recognized_text, text_path_or_error = ocr_image_bytes(image_bytes, ocr_engine_choice=ocr_engine, output_filename=text_filename)
+    if not recognized_text and text_path_or_error: # Si l'OCR a échoué
+        return {"error": "L'OCR a échoué", "details": text_path_or_error}, 500
+
+    payload = {"status": "success", "text": recognized_text}
+    if text_filename:
+        payload.update({"image_filename": image_filename, "text_filename": text_filename, "text_url": _file_url(text_filename)})
+    return payload, 200
 
 @app.route('/tts', methods=['POST']) # Étape 3: TTS
 @api_key_required
@@ -142,35 +336,191 @@ def process_tts():
     data = request.get_json()
     text = data.get('text')
     tts_engine = data.get('tts_engine', 'coqui') # 'coqui' par défaut
+    # Format de l'audio : paramètre 'format' (wav, mp3, opus), sinon en-tête Accept, sinon AUDIO_FORMAT
+    audio_format = audio_service.negotiate_format(data.get('format'), request.headers.get('Accept'))
 
     if not text:
         return jsonify({"error": "Le paramètre 'text' est manquant"}), 400
 
-    timestamp = int(time.time())
-    unique_id = uuid.uuid4().hex[:6]
-    audio_filename = f"audio_{g.user['id']}_{unique_id}_{timestamp}.wav"
+    # Fichier de travail de la synthèse, déplacé ensuite dans le cache audio
+    audio_filename, _ = artifact_service.new_artifact(g.user['id'], 'audio', '.wav')
 
-    tts_success, audio_path_or_error = generate_tts(text, audio_filename, tts_engine=tts_engine, user_id=g.user['id'])
+    return _dispatch('tts', _run_tts, text, audio_filename, tts_engine, audio_format)
+
+def _run_tts(text, audio_filename, tts_engine, audio_format='wav'):
+    """Génère l'audio et retourne (données de réponse, code HTTP)."""
+    tts_success, audio_path_or_error = generate_tts(text, audio_filename, tts_engine=tts_engine, audio_format=audio_format)
     if not tts_success:
-        return jsonify({"error": "La génération TTS a échoué", "details": audio_path_or_error}), 500
+        return {"error": "La génération TTS a échoué", "details": audio_path_or_error}, 500
 
-    # Le nom de fichier peut avoir changé (ex: .wav -> .mp3), on le récupère depuis le chemin retourné
-    final_audio_filename = os.path.basename(audio_path_or_error)
+    # Le nom de fichier peut avoir changé (ex: .wav -> .mp3, ou fichier servi depuis le cache),
+    # on le récupère depuis le chemin retourné, relativement au dossier des fichiers servis
+    final_audio_filename = os.path.relpath(audio_path_or_error, app.config['UPLOAD_FOLDER'])
 
-    return jsonify({
+    return {
         "status": "success",
         "audio_filename": final_audio_filename,
         "audio_path_local": audio_path_or_error,
-        "audio_url": url_for('serve_file', filename=final_audio_filename)
+        "audio_url": _file_url(final_audio_filename)
+    }, 200
+
+@app.route('/tts/stream', methods=['POST'])
+@api_key_required
+def register_tts_stream():
+    """
+    Prépare une synthèse vocale en flux (Piper) et retourne l'URL à laquelle l'audio
+    sera diffusé phrase par phrase, au fur et à mesure de sa génération.
+    """
+
+    data = request.get_json()
+    text = data.get('text')
+
+    if not text or not text.strip() or len(text.strip()) < 2:
+        return jsonify({"error": "Le paramètre 'text' est manquant"}), 400
+
+    if not tts_service.voice:
+        return jsonify({"error": "Le service TTS n'est pas initialisé car le modèle est manquant."}), 503
+
+    audio_format = audio_service.negotiate_format(data.get('format'))
+    token = tts_service.register_tts_stream(text, user_id=g.user['id'])
+    return jsonify({
+        "status": "success",
+        "stream_url": url_for('stream_tts', token=token, format=audio_format)
     })
 
+@app.route('/tts/stream/<token>')
+def stream_tts(token):
+    """
+    Diffuse en flux l'audio d'un texte préalablement enregistré via POST /tts/stream, au format
+    demandé ('format' dans l'URL, sinon en-tête Accept, sinon AUDIO_FORMAT).
+    Le jeton est à usage unique et tient lieu d'authentification (lecture directe par <audio>).
+    """
+
+    entry = tts_service.pop_tts_stream(token)
+    if entry is None:
+        return jsonify({"error": "Jeton de flux inconnu ou expiré"}), 404
+    text, pcm = entry
+
+    audio_format = audio_service.negotiate_format(request.args.get('format'), request.headers.get('Accept'))
+    return Response(
+        tts_service.stream_tts_piper(text, audio_format, pcm=pcm),
+        mimetype=audio_service.mimetype(audio_format),
+        headers={"Cache-Control": "no-store", "X-Accel-Buffering": "no"}
+    )
+
+@app.route('/pipeline', methods=['POST']) # Étapes 1+2+3 en un seul appel
+@api_key_required
+def process_pipeline():
+    """
+    Enchaîne côté serveur OCR (image en mémoire) et TTS, et retourne le texte,
+    l'URL de l'audio et la durée de chaque étape en une seule réponse.
+    Avec Piper, l'audio est diffusé en flux : la synthèse de la première phrase démarre
+    dès que le texte de la page est ordonné, sans attendre la fin de la page.
+    Avec 'stream=1', la réponse est en NDJSON : le texte est envoyé dès la fin de l'OCR,
+    puis l'audio.
+    """
+
+    if 'image' not in request.files:
+        return jsonify({"error": "Aucun fichier image n'a été envoyé"}), 400
+
+    image_bytes = request.files['image'].read()
+    if not image_bytes:
+        return jsonify({"error": "Aucun fichier sélectionné"}), 400
+
+    ocr_engine = request.form.get('ocr_engine', 'paddle')
+    tts_engine = request.form.get('tts_engine', 'piper')
+    audio_format = audio_service.negotiate_format(request.form.get('format'))
+    user_id = g.user['id']
+    stages = _run_pipeline(image_bytes, ocr_engine, tts_engine, user_id, audio_format)
+
+    if request.form.get('stream', '').lower() in ('1', 'true', 'yes'):
+        def ndjson():
+            for payload in stages:
+                yield json.dumps(payload, ensure_ascii=False) + "\n"
+        return Response(ndjson(), mimetype='application/x-ndjson', headers={"Cache-Control": "no-store", "X-Accel-Buffering": "no"})
+
+    result = {}
+    for payload in stages:
+        if 'error' in payload:
+            return jsonify(payload), 500
+        timings = {**result.get('timings', {}), **payload.get('timings', {})}
+        result.update(payload)
+        result['timings'] = timings
+    return jsonify({**result, "stage": "done"})
+
+def _run_pipeline(image_bytes, ocr_engine, tts_engine, user_id, audio_format='wav'):
+    """
+    Générateur des étapes du pipeline : produit un dictionnaire à la fin de l'OCR,
+    puis un à la fin de la préparation de l'audio (ou une erreur, qui arrête le pipeline).
+    """
+
+    start = time.perf_counter()
+    recognized_text, error = ocr_image_bytes(image_bytes, ocr_engine_choice=ocr_engine)
+    ocr_time = time.perf_counter() - start
+    if not recognized_text and error:
+        yield {"stage": "ocr", "error": "L'OCR a échoué", "details": error, "timings": {"ocr": round(ocr_time, 3)}}
+        return
+    yield {"stage": "ocr", "status": "success", "text": recognized_text, "timings": {"ocr": round(ocr_time, 3)}}
+
+    tts_start = time.perf_counter()
+    if tts_engine == 'piper' and tts_service.voice:
+        # Diffusion en flux : la synthèse démarre dès la fin de l'OCR, pendant que la réponse part
+        # et que le client ouvre l'URL. La durée mesurée est celle jusqu'au premier segment audio
+        # (le reste de la synthèse se poursuit pendant la lecture).
+        pcm = tts_service.PrefetchedPiper(recognized_text)
+        token = tts_service.register_tts_stream(recognized_text, user_id=user_id, pcm=pcm)
+        with app.test_request_context():
+            audio = {"stream_url": url_for('stream_tts', token=token, format=audio_format), "tts_timing": "first_audio"}
+        pcm.first_segment.wait()
+    else:
+        audio_filename, _ = artifact_service.new_artifact(user_id, 'audio', '.wav')
+        payload, http_status = _run_tts(recognized_text, audio_filename, tts_engine, audio_format)
+        if http_status != 200:
+            yield {"stage": "tts", **payload}
+            return
+        audio = {"audio_url": payload['audio_url']}
+
+    tts_time = time.perf_counter() - tts_start
+    yield {"stage": "tts", "status": "success", **audio, "timings": {"tts": round(tts_time, 3), "total": round(time.perf_counter() - start, 3)}}
+
+# Préfixes (relatifs à UPLOAD_FOLDER) des fichiers qui ne changent jamais une fois écrits, et durée
+# de mise en cache côté client de ces fichiers. Les couvertures sont nommées d'après l'empreinte de leur
+# contenu ; le cache audio d'après la clé de synthèse (texte, moteur, voix, modèle), pas d'après les octets.
+COVER_PREFIX = os.path.relpath(COVER_FOLDER, UPLOAD_FOLDER).replace(os.sep, '/') + '/'
+TTS_CACHE_PREFIX = os.path.relpath(TTS_CACHE_FOLDER, UPLOAD_FOLDER).replace(os.sep, '/') + '/'
+# Préfixe des fichiers des utilisateurs, dont chaque lecture repousse le nettoyage
+ARTIFACT_PREFIX = os.path.relpath(ARTIFACT_FOLDER, UPLOAD_FOLDER).replace(os.sep, '/') + '/'
+IMMUTABLE_PREFIXES = (COVER_PREFIX, TTS_CACHE_PREFIX)
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
 @app.route('/file/<path:filename>')
 def serve_file(filename):
     """
-    Sert un fichier depuis le dossier UPLOAD_FOLDER.
+    Sert un fichier depuis le dossier UPLOAD_FOLDER, avec ETag, Last-Modified, requêtes
+    conditionnelles (304) et partielles (Range, 206) pour la lecture des médias.
+    Les couvertures et le cache audio ne changent jamais une fois écrits : leur nom sert d'ETag
+    et ils sont mis en cache sans revalidation. Les autres sont revalidés à chaque usage.
     """
 
-    return send_from_directory(app.config['UPLOAD_FOLDER'], filename)
+    if filename.startswith(IMMUTABLE_PREFIXES):
+        file_key = os.path.splitext(os.path.basename(filename))[0]
+        if filename.startswith(TTS_CACHE_PREFIX):
+            # Clé des paramètres de synthèse, pas empreinte du contenu : Coqui n'étant pas déterministe,
+            # une entrée évincée puis régénérée a la même clé mais d'autres octets. ETag faible.
+            response = send_from_directory(app.config['UPLOAD_FOLDER'], filename, etag=False, max_age=IMMUTABLE_MAX_AGE)
+            response.set_etag(file_key, weak=True)
+            response.make_conditional(request)
+        else:
+            response = send_from_directory(app.config['UPLOAD_FOLDER'], filename, etag=file_key, max_age=IMMUTABLE_MAX_AGE)
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+        return response
+
+    response = send_from_directory(app.config['UPLOAD_FOLDER'], filename)
+    response.cache_control.no_cache = True
+    if filename.startswith(ARTIFACT_PREFIX):
+        artifact_service.touch(os.path.join(app.config['UPLOAD_FOLDER'], filename))
+    return response
 
 @app.route('/user/get-api-key', methods=['POST'])
 @admin_required
@@ -196,6 +546,9 @@ def get_user_api_key():
 def add_new_epub():
     """
     Upload un fichier EPUB et lance son traitement.
+    Avec 'stream=1' (NDJSON) ou 'stream=sse' (text/event-stream), le livre est envoyé
+    chapitre par chapitre dans l'ordre de lecture : métadonnées et premier chapitre
+    arrivent avant la fin du traitement (voir epub_service.stream_epub).
     """
     if 'epub_file' not in request.files:
         return jsonify({"error": "Aucun fichier EPUB n'a été envoyé (champ 'epub_file')"}), 400
@@ -208,18 +561,149 @@ def add_new_epub():
     if not file.filename.lower().endswith('.epub'):
         return jsonify({"error": "Le fichier doit être au format .epub"}), 400
 
-    success, data_or_error = epub_service.add_epub(file, g.user['id'])
+    stream_mode = request.form.get('stream', '').lower()
+    if stream_mode == 'sse' or 'text/event-stream' in request.headers.get('Accept', ''):
+        stream_mode = 'sse'
+    elif stream_mode in ('1', 'true', 'yes', 'ndjson'):
+        stream_mode = 'ndjson'
+    else:
+        stream_mode = None
+
+    if stream_mode or _wants_async():
+        # Le flux de la requête est fermé à la fin de celle-ci : on garde le fichier en mémoire
+        file = FileStorage(stream=io.BytesIO(file.read()), filename=file.filename, content_type=file.content_type)
+
+    if stream_mode:
+        # Le générateur ne démarre qu'à l'envoi de la réponse
+        events = epub_service.stream_epub(file, g.user['id'])
+        headers = {"Cache-Control": "no-store", "X-Accel-Buffering": "no"}
+        if stream_mode == 'sse':
+            sse = (f"event: {event['event']}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n" for event in events)
+            return Response(sse, mimetype='text/event-stream', headers=headers)
+        ndjson = (json.dumps(event, ensure_ascii=False) + "\n" for event in events)
+        return Response(ndjson, mimetype='application/x-ndjson', headers=headers)
+
+    return _dispatch('epub', _run_add_epub, file, g.user['id'])
+
+def _run_add_epub(file_storage, user_id):
+    """Traite un EPUB et retourne (données de réponse, code HTTP)."""
+    success, data_or_error = epub_service.add_epub(file_storage, user_id)
 
     if success:
-        return jsonify({"status": "success", "data": data_or_error})
+        return {"status": "success", "data": data_or_error}, 200
     else:
-        return jsonify({"error": "Le traitement de l'EPUB a échoué", "details": data_or_error}), 500
+        return {"error": "Le traitement de l'EPUB a échoué", "details": data_or_error}, 500
+
+@app.route('/library/books')
+@api_key_required
+def list_library_books():
+    """
+    Liste les livres de la bibliothèque de l'utilisateur (métadonnées seulement).
+    """
+
+    return jsonify({"status": "success", "books": library_service.list_books(g.user['id'])})
+
+@app.route('/library/books/<int:book_id>', methods=['GET', 'DELETE'])
+@api_key_required
+def library_book(book_id):
+    """
+    Retourne un livre et la liste de ses chapitres, ou le supprime (DELETE).
+    """
+
+    if request.method == 'DELETE':
+        if not library_service.delete_book(g.user['id'], book_id):
+            return jsonify({"error": "Livre introuvable"}), 404
+        return jsonify({"status": "success"})
+
+    book = library_service.get_book(g.user['id'], book_id)
+    if book is None:
+        return jsonify({"error": "Livre introuvable"}), 404
+    return jsonify({"status": "success", "book": book})
+
+@app.route('/library/books/<int:book_id>/chapters/<int:chapter_idx>')
+@api_key_required
+def library_chapter(book_id, chapter_idx):
+    """
+    Retourne le texte d'un chapitre d'un livre.
+    """
+
+    chapter = library_service.get_chapter(g.user['id'], book_id, chapter_idx)
+    if chapter is None:
+        return jsonify({"error": "Chapitre introuvable"}), 404
+    return jsonify({"status": "success", "chapter": chapter})
+
+@app.route('/library/search')
+@api_key_required
+def library_search():
+    """
+    Recherche plein texte (paramètre 'q') dans tous les livres de l'utilisateur,
+    ou dans un seul livre (paramètre 'book_id'). Retourne des extraits classés.
+    """
+
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({"error": "Le paramètre 'q' est manquant"}), 400
+
+    book_id = request.args.get('book_id', type=int)
+    limit = min(request.args.get('limit', 20, type=int), 100)
+    results = library_service.search(g.user['id'], query, book_id=book_id, limit=limit)
+    return jsonify({"status": "success", "query": query, "results": results})
+
+@app.route('/jobs/<job_id>')
+@api_key_required
+def get_job(job_id):
+    """
+    Retourne l'état d'un travail asynchrone et, s'il est terminé, son résultat.
+    """
+
+    job = job_service.get_job(job_id, user_id=g.user['id'])
+    if job is None:
+        return jsonify({"error": "Travail introuvable"}), 404
+    return jsonify(_job_view(job))
+
+@app.route('/jobs/<job_id>/events')
+@api_key_required
+def job_events(job_id):
+    """
+    Flux SSE (text/event-stream) signalant l'état d'un travail jusqu'à sa fin.
+    """
+
+    user_id = g.user['id']
+    if job_service.get_job(job_id, user_id=user_id) is None:
+        return jsonify({"error": "Travail introuvable"}), 404
+
+    def events():
+        while True:
+            finished = job_service.wait_for_job(job_id, timeout=15)
+            job = job_service.get_job(job_id, user_id=user_id)
+            if job is None:
+                yield "event: error\ndata: {}\n\n"
+                return
+            event = 'done' if finished else 'status'
+            yield f"event: {event}\ndata: {json.dumps(_job_view(job), ensure_ascii=False)}\n\n"
+            if finished:
+                return
+
+    return Response(events(), mimetype='text/event-stream', headers={"Cache-Control": "no-store", "X-Accel-Buffering": "no"})
+
+@app.route('/jobs/stats')
+@api_key_required
+def jobs_stats():
+    """
+    Profondeur des files et temps d'attente des travaux, par type.
+    """
+
+    return jsonify(job_service.queue_stats())
 
 # Lancement du serveur de production Waitress sur toutes les interfaces (0.0.0.0)
 if __name__ == '__main__':
     BigTitle("Serveur Lutrin démarré")
-    ocr_service.init_ocr_engine()
+    # En premier : les pools Piper et EPUB sont créés par fork, avant les threads du moteur OCR
     tts_service.init_tts_engine()
+    epub_service.init_epub_parser()
+    ocr_service.init_ocr_engine()
+    library_service.init_library_db()
+    artifact_service.init_artifact_store()
 
-    print(f"INFO: Démarrage du serveur API en HTTP sur le port {FLASK_PORT} (derrière le reverse proxy)")
-    serve(app, host='127.0.0.1', port=FLASK_PORT, threads=6)
+    print(f"INFO: Démarrage du serveur API en HTTP sur le port {FLASK_PORT} (derrière le reverse proxy, {WAITRESS_THREADS} threads)")
+    serve(app, host='127.0.0.1', port=FLASK_PORT, threads=WAITRESS_THREADS)
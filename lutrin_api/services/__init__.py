@@ -1,6 +1,6 @@
-from . import ocr_service, tts_service, auth_service, epub_service
-from .ocr_service import ocr_image, init_ocr_engine
+from . import ocr_service, tts_service, auth_service, epub_service, job_service, library_service, http_service, audio_service, artifact_service, metrics_service, logger_service
+from .ocr_service import ocr_image, ocr_image_bytes, init_ocr_engine
 from .tts_service import generate_tts, init_tts_engine
-from .logger_service import BigTitle, Title, Line, Error, Warning, Success, Info, Log
+from .logger_service import BigTitle, Title, Line, Error, Warning, Success, Info, Log, Debug
 from .auth_service import get_user_by_api_key, authenticate_user, count_users, init_db, add_user, get_api_key_by_username
 from .epub_service import add_epub
@@ -0,0 +1,196 @@
+# lutrin_api/services/artifact_service.py
+import os
+import time
+import uuid
+import threading
+from collections import Counter
+from .logger_service import Log, Error
+from ..config import UPLOAD_FOLDER, ARTIFACT_FOLDER, ARTIFACT_TTL, ARTIFACT_USER_MAX_MB, ARTIFACT_JANITOR_INTERVAL
+
+# --- Fichiers produits pour les utilisateurs (captures, textes OCR) ---
+# Chaque utilisateur a son dossier (ARTIFACT_FOLDER/<id>) et les fichiers vivants sont indexés
+# en mémoire : aucune requête ne parcourt plus le dossier partagé. Un nettoyage en tâche de fond
+# supprime les fichiers non consultés depuis ARTIFACT_TTL et applique le quota de chaque
+# utilisateur, sans jamais toucher un fichier en cours d'utilisation (voir pin).
+# Seuls les fichiers indexés sont supprimés : un audio en cours de synthèse ne l'est jamais.
+
+# Préfixes des fichiers déposés à la racine de UPLOAD_FOLDER avant les dossiers par utilisateur
+LEGACY_PREFIXES = ('capture_', 'ocr_result_', 'audio_')
+
+class Artifact:
+    """Fichier indexé : propriétaire, taille et date du dernier accès."""
+
+    __slots__ = ('path', 'user_id', 'size', 'last_access')
+
+    def __init__(self, path, user_id, size, last_access):
+        self.path = path
+        self.user_id = user_id
+        self.size = size
+        self.last_access = last_access
+
+_artifacts = {}
+_pins = Counter()
+_lock = threading.Lock()
+_janitor = None
+_stats = {"deleted_expired": 0, "deleted_quota": 0, "deleted_bytes": 0, "sweeps": 0}
+
+def user_folder(user_id):
+    """Dossier des fichiers d'un utilisateur (créé au besoin)."""
+    folder = os.path.join(ARTIFACT_FOLDER, str(user_id))
+    os.makedirs(folder, exist_ok=True)
+    return folder
+
+def new_artifact(user_id, prefix, extension):
+    """
+    Réserve un nom de fichier unique dans le dossier de l'utilisateur.
+    Retourne (nom relatif à UPLOAD_FOLDER, tel que servi par /file ; chemin absolu).
+    """
+
+    filename = f"{prefix}_{uuid.uuid4().hex[:6]}_{int(time.time())}{extension}"
+    path = os.path.join(user_folder(user_id), filename)
+    return os.path.relpath(path, UPLOAD_FOLDER).replace(os.sep, '/'), path
+
+def _owner(path):
+    """Identifiant du propriétaire d'un fichier rangé dans ARTIFACT_FOLDER, ou None."""
+    folder = os.path.dirname(path)
+    if os.path.dirname(folder) == os.path.abspath(ARTIFACT_FOLDER):
+        return os.path.basename(folder)
+    return None
+
+def register(path, user_id=None, last_access=None):
+    """Indexe un fichier qui vient d'être écrit : il est dès lors soumis au nettoyage."""
+    path = os.path.abspath(path)
+    try:
+        size = os.path.getsize(path)
+    except OSError:
+        return
+    user_id = _owner(path) if user_id is None else str(user_id)
+    with _lock:
+        _artifacts[path] = Artifact(path, user_id, size, last_access or time.time())
+
+def touch(path):
+    """Rafraîchit la date du dernier accès à un fichier (lecture, téléchargement)."""
+    with _lock:
+        artifact = _artifacts.get(os.path.abspath(path))
+        if artifact:
+            artifact.last_access = time.time()
+
+def pin(path):
+    """
+    Protège un fichier du nettoyage jusqu'à l'appel correspondant à unpin(),
+    éventuellement depuis un autre thread (ex: capture en attente dans la file OCR).
+    """
+    with _lock:
+        _pins[os.path.abspath(path)] += 1
+
+def unpin(path):
+    """Libère une protection posée par pin() ; le fichier compte comme consulté à cet instant."""
+    path = os.path.abspath(path)
+    with _lock:
+        _pins[path] -= 1
+        if _pins[path] <= 0:
+            del _pins[path]
+        artifact = _artifacts.get(path)
+        if artifact:
+            artifact.last_access = time.time()
+
+def _select_victims(now):
+    """
+    Fichiers à supprimer (appelé sous le verrou) : ceux non consultés depuis ARTIFACT_TTL,
+    puis, pour chaque utilisateur au-delà de son quota, les moins récemment consultés.
+    """
+
+    expired = []
+    remaining = {}
+    for artifact in _artifacts.values():
+        if artifact.path in _pins:
+            remaining.setdefault(artifact.user_id, []).append(artifact)
+        elif now - artifact.last_access > ARTIFACT_TTL:
+            expired.append(artifact)
+        else:
+            remaining.setdefault(artifact.user_id, []).append(artifact)
+
+    over_quota = []
+    quota = ARTIFACT_USER_MAX_MB * 1024 * 1024
+    for artifacts in remaining.values():
+        total = sum(artifact.size for artifact in artifacts)
+        for artifact in sorted(artifacts, key=lambda a: a.last_access):
+            if total <= quota:
+                break
+            if artifact.path not in _pins:
+                over_quota.append(artifact)
+                total -= artifact.size
+    return expired, over_quota
+
+def sweep(now=None):
+    """Passage du nettoyage. Retourne le nombre de fichiers supprimés."""
+    now = now or time.time()
+    deleted, deleted_bytes = 0, 0
+    with _lock:
+        expired, over_quota = _select_victims(now)
+        # Suppression sous le verrou : un fichier ne peut pas être protégé entre sa sélection et sa suppression
+        for reason, victims in (("deleted_expired", expired), ("deleted_quota", over_quota)):
+            for artifact in victims:
+                del _artifacts[artifact.path]
+                try:
+                    os.remove(artifact.path)
+                except FileNotFoundError:
+                    pass
+                except OSError as e:
+                    Error(f"Suppression du fichier impossible {artifact.path} = {e}")
+                    continue
+                _stats[reason] += 1
+                deleted += 1
+                deleted_bytes += artifact.size
+        _stats["deleted_bytes"] += deleted_bytes
+        _stats["sweeps"] += 1
+    if deleted:
+        Log(f"Nettoyage des fichiers utilisateurs : {deleted} supprimés ({deleted_bytes / (1024 * 1024):.1f} Mo)")
+    return deleted
+
+def _scan():
+    """Indexe les fichiers présents au démarrage (dossiers par utilisateur et anciens fichiers à la racine)."""
+    os.makedirs(ARTIFACT_FOLDER, exist_ok=True)
+    for user_id in os.listdir(ARTIFACT_FOLDER):
+        folder = os.path.join(ARTIFACT_FOLDER, user_id)
+        if os.path.isdir(folder):
+            for entry in os.scandir(folder):
+                if entry.is_file() and not entry.name.startswith('.'):
+                    register(entry.path, user_id, entry.stat().st_mtime)
+
+    for entry in os.scandir(UPLOAD_FOLDER):
+        prefix = next((p for p in LEGACY_PREFIXES if entry.name.startswith(p)), None)
+        if prefix and entry.is_file():
+            register(entry.path, entry.name[len(prefix):].split('_')[0], entry.stat().st_mtime)
+
+def _janitor_loop():
+    while True:
+        time.sleep(ARTIFACT_JANITOR_INTERVAL)
+        try:
+            sweep()
+        except Exception as e:
+            Error(f"Erreur pendant le nettoyage des fichiers utilisateurs : {repr(e)}")
+
+def init_artifact_store():
+    """Indexe les fichiers existants et démarre le nettoyage en tâche de fond. Appelé au démarrage du serveur."""
+    global _janitor
+    if _janitor is not None:
+        return
+    _scan()
+    with _lock:
+        count, size = len(_artifacts), sum(artifact.size for artifact in _artifacts.values())
+    Log(f"Fichiers utilisateurs : {count} fichiers, {size / (1024 * 1024):.1f} Mo "
+        f"(conservation {ARTIFACT_TTL}s, quota {ARTIFACT_USER_MAX_MB} Mo par utilisateur)")
+    _janitor = threading.Thread(target=_janitor_loop, name="artifact-janitor", daemon=True)
+    _janitor.start()
+
+def stats():
+    """Nombre et taille des fichiers indexés, fichiers protégés et suppressions effectuées."""
+    with _lock:
+        return {
+            "artifacts": len(_artifacts),
+            "size_bytes": sum(artifact.size for artifact in _artifacts.values()),
+            "users": len({artifact.user_id for artifact in _artifacts.values()}),
+            "in_use": len(_pins),
+            **_stats,
+        }
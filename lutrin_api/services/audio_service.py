@@ -0,0 +1,137 @@
+# lutrin_api/services/audio_service.py
+import os
+import shutil
+import mimetypes
+import threading
+import subprocess
+from .logger_service import Log, Error, Warning
+from ..config import AUDIO_FORMAT, FFMPEG_PATH
+
+# --- Encodage de l'audio (ffmpeg) ---
+# Les synthèses sont produites en WAV (PCM 16 bits) puis, si le format demandé est compressé,
+# encodées par ffmpeg : d'un fichier à l'autre, ou en flux pendant la synthèse Piper.
+# Pour de la voix mono, MP3 48 kbit/s et Opus 24 kbit/s divisent la taille par 7 à 15.
+
+AUDIO_FORMATS = {
+    'wav': {"extension": '.wav', "mimetype": 'audio/wav', "ffmpeg": None},
+    'mp3': {"extension": '.mp3', "mimetype": 'audio/mpeg', "ffmpeg": ['-c:a', 'libmp3lame', '-b:a', '48k', '-f', 'mp3']},
+    'opus': {"extension": '.opus', "mimetype": 'audio/ogg', "ffmpeg": ['-c:a', 'libopus', '-b:a', '24k', '-application', 'voip', '-f', 'ogg']},
+}
+
+# Types MIME acceptés par un client (en-tête Accept) -> format
+_ACCEPT_TYPES = {
+    'audio/mpeg': 'mp3',
+    'audio/mp3': 'mp3',
+    'audio/ogg': 'opus',
+    'audio/opus': 'opus',
+    'audio/wav': 'wav',
+    'audio/x-wav': 'wav',
+    'audio/wave': 'wav',
+}
+
+# Taille des blocs lus sur la sortie de ffmpeg en flux
+STREAM_BLOCK_SIZE = 16 * 1024
+
+mimetypes.add_type('audio/ogg', '.opus')
+
+_ffmpeg = None
+_ffmpeg_checked = False
+
+def encoder_path():
+    """Chemin de ffmpeg, ou None s'il est introuvable (l'audio reste alors en WAV)."""
+    global _ffmpeg, _ffmpeg_checked
+    if not _ffmpeg_checked:
+        _ffmpeg = shutil.which(FFMPEG_PATH)
+        _ffmpeg_checked = True
+        if _ffmpeg:
+            Log(f"Encodeur audio : {_ffmpeg}")
+        else:
+            Warning(f"ffmpeg introuvable ({FFMPEG_PATH}) : l'audio sera servi en WAV.")
+    return _ffmpeg
+
+def negotiate_format(requested=None, accept=None):
+    """
+    Choisit le format de sortie : format demandé explicitement, sinon premier type audio
+    connu de l'en-tête Accept (hors joker), sinon AUDIO_FORMAT. WAV si ffmpeg est absent.
+    """
+
+    audio_format = (requested or '').lower()
+    if audio_format not in AUDIO_FORMATS and accept:
+        for media_range in accept.split(','):
+            audio_format = _ACCEPT_TYPES.get(media_range.split(';')[0].strip().lower(), '')
+            if audio_format:
+                break
+    if audio_format not in AUDIO_FORMATS:
+        audio_format = AUDIO_FORMAT if AUDIO_FORMAT in AUDIO_FORMATS else 'wav'
+    if audio_format != 'wav' and not encoder_path():
+        return 'wav'
+    return audio_format
+
+def mimetype(audio_format):
+    """Type MIME d'un format audio."""
+    return AUDIO_FORMATS[audio_format]["mimetype"]
+
+def encode_file(source_path, audio_format):
+    """
+    Encode un fichier WAV dans le format demandé, à côté de la source (même nom,
+    extension du format). Retourne le chemin produit. Lève une exception en cas d'échec.
+    """
+
+    if audio_format == 'wav':
+        return source_path
+    output_path = os.path.splitext(source_path)[0] + AUDIO_FORMATS[audio_format]["extension"]
+    command = [encoder_path(), '-nostdin', '-loglevel', 'error', '-y', '-i', source_path,
+               *AUDIO_FORMATS[audio_format]["ffmpeg"], output_path]
+    result = subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    if result.returncode != 0:
+        raise RuntimeError(f"ffmpeg a échoué ({result.returncode}) : {result.stderr.decode('utf-8', 'replace').strip()}")
+    return output_path
+
+def encode_stream(chunks, audio_format):
+    """
+    Générateur encodant en flux des morceaux PCM (sample_rate, sample_width, channels, pcm),
+    au fur et à mesure de leur production : un thread alimente ffmpeg pendant que les
+    blocs encodés sont produits. ffmpeg est arrêté si le client se déconnecte.
+    """
+
+    chunks = iter(chunks)
+    first = next(chunks, None)
+    if first is None:
+        return
+    sample_rate, sample_width, channels, _ = first
+    command = [encoder_path(), '-nostdin', '-loglevel', 'error',
+               '-probesize', '32', '-f', f's{8 * sample_width}le', '-ar', str(sample_rate), '-ac', str(channels), '-i', 'pipe:0',
+               *AUDIO_FORMATS[audio_format]["ffmpeg"], '-flush_packets', '1', 'pipe:1']
+    process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+
+    def feed():
+        try:
+            process.stdin.write(first[3])
+            for _, _, _, pcm in chunks:
+                process.stdin.write(pcm)
+        except (BrokenPipeError, ValueError):
+            pass # ffmpeg arrêté (client déconnecté)
+        except Exception as e:
+            Error(f"Erreur pendant l'alimentation de l'encodeur audio : {repr(e)}")
+        finally:
+            try:
+                process.stdin.close()
+            except OSError:
+                pass
+
+    feeder = threading.Thread(target=feed, name="audio-encode", daemon=True)
+    feeder.start()
+    completed = False
+    try:
+        while True:
+            block = process.stdout.read1(STREAM_BLOCK_SIZE)
+            if not block:
+                break
+            yield block
+        completed = True
+    finally:
+        if not completed:
+            process.kill()
+        process.wait()
+        process.stdout.close()
+        feeder.join()
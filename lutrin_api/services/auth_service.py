@@ -1,16 +1,47 @@
 # lutrin_api/services/auth_service.py
+import time
 import sqlite3
 import secrets
+import threading
 from werkzeug.security import generate_password_hash, check_password_hash
-from ..config import DATABASE_PATH
+from ..config import DATABASE_PATH, AUTH_CACHE_TTL
 from .logger_service import Log, Error, Success, Title
+from . import metrics_service
+
+# Connexion SQLite persistante, une par thread (sqlite3 interdit le partage entre threads)
+_local = threading.local()
+
+# Cache en mémoire clé d'API -> (utilisateur, date d'expiration)
+_user_cache = {}
+_user_cache_lock = threading.Lock()
 
 def get_db_connection():
-    """Crée une connexion à la base de données SQLite."""
-    conn = sqlite3.connect(DATABASE_PATH)
-    conn.row_factory = sqlite3.Row
+    """
+    Retourne la connexion SQLite du thread courant, créée au premier appel.
+    La base est en mode WAL : les lectures ne sont pas bloquées par les écritures.
+    """
+    conn = getattr(_local, 'conn', None)
+    if conn is None:
+        conn = sqlite3.connect(DATABASE_PATH, timeout=10)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        _local.conn = conn
     return conn
 
+def invalidate_user_cache(api_key=None):
+    """
+    Invalide le cache d'authentification, pour une clé d'API ou en totalité.
+    À appeler après toute modification d'un utilisateur faite dans ce processus. Le cache
+    n'est pas partagé : une modification faite par un autre processus (ex: la commande
+    add_user, lancée par `make add-user`) n'est vue par le serveur qu'après AUTH_CACHE_TTL.
+    """
+    with _user_cache_lock:
+        if api_key is None:
+            _user_cache.clear()
+        else:
+            _user_cache.pop(api_key, None)
+
 def init_db():
     """Initialise la base de données et crée la table des utilisateurs si elle n'existe pas."""
     Title("Initialisation de la base de données d'authentification")
@@ -28,7 +59,6 @@ def init_db():
             )
         ''')
         conn.commit()
-        conn.close()
         Success("Base de données initialisée avec succès.")
     except Exception as e:
         # Gérer l'ajout de colonnes à une table existante
@@ -40,7 +70,6 @@ def init_db():
                 cursor.execute("ALTER TABLE users ADD COLUMN email TEXT UNIQUE")
                 cursor.execute("ALTER TABLE users ADD COLUMN role TEXT NOT NULL CHECK(role IN ('USER', 'ADMIN')) DEFAULT 'USER'")
                 conn.commit()
-                conn.close()
                 Success("Table 'users' mise à jour avec les colonnes 'email' et 'role'.")
             except Exception as alter_e:
                 Error(f"Erreur lors de la mise à jour de la table 'users': {alter_e}")
@@ -59,12 +88,10 @@ def add_user(username, password, email, role='USER'):
         cursor.execute("SELECT * FROM users WHERE username = ?", (username,))
         if cursor.fetchone():
             Error(f"L'utilisateur '{username}' existe déjà.")
-            conn.close()
             return False
         cursor.execute("SELECT * FROM users WHERE email = ?", (email,))
         if cursor.fetchone():
             Error(f"L'email '{email}' est déjà utilisé.")
-            conn.close()
             return False
 
         password_hash = generate_password_hash(password)
@@ -75,24 +102,39 @@ def add_user(username, password, email, role='USER'):
             (username, email, password_hash, api_key, role.upper())
         )
         conn.commit()
-        conn.close()
+        invalidate_user_cache()
         Success(f"Utilisateur '{username}' ajouté avec succès.")
         Log(f"Clé d'API pour {username}: {api_key}")
         return True
     except Exception as e:
         Error(f"Erreur lors de l'ajout de l'utilisateur : {e}")
+        get_db_connection().rollback() # La connexion est persistante : ne pas laisser de transaction ouverte
         return False
 
+@metrics_service.timed('auth_lookup')
 def get_user_by_api_key(api_key):
-    """Récupère un utilisateur par sa clé d'API."""
+    """
+    Récupère un utilisateur par sa clé d'API.
+    Les utilisateurs trouvés sont gardés en cache AUTH_CACHE_TTL secondes.
+    """
     if not api_key:
         return None
+
+    now = time.monotonic()
+    with _user_cache_lock:
+        cached = _user_cache.get(api_key)
+    if cached and cached[1] > now:
+        return cached[0]
+
     try:
         conn = get_db_connection()
         cursor = conn.cursor()
-        cursor.execute("SELECT * FROM users WHERE api_key = ?", (api_key,))
+        cursor.execute("SELECT id, username, email, api_key, role FROM users WHERE api_key = ?", (api_key,))
         user = cursor.fetchone()
-        conn.close()
+        if user is not None:
+            user = dict(user)
+            with _user_cache_lock:
+                _user_cache[api_key] = (user, now + AUTH_CACHE_TTL)
         return user
     except Exception as e:
         Error(f"Erreur lors de la recherche de l'utilisateur par clé d'API : {e}")
@@ -105,7 +147,6 @@ def authenticate_user(username, password):
         cursor = conn.cursor()
         cursor.execute("SELECT * FROM users WHERE username = ?", (username,))
         user = cursor.fetchone()
-        conn.close()
 
         if user and check_password_hash(user['password_hash'], password):
             Success(f"Authentification réussie pour l'utilisateur '{username}'.")
@@ -124,7 +165,6 @@ def count_users():
         cursor = conn.cursor()
         cursor.execute("SELECT COUNT(*) FROM users")
         count = cursor.fetchone()[0]
-        conn.close()
         return count
     except Exception as e:
         Error(f"Erreur lors du comptage des utilisateurs : {e}")
@@ -139,7 +179,6 @@ def get_api_key_by_username(username):
         cursor = conn.cursor()
         cursor.execute("SELECT api_key FROM users WHERE username = ?", (username,))
         result = cursor.fetchone()
-        conn.close()
         return result['api_key'] if result else None
     except Exception as e:
         Error(f"Erreur lors de la recherche de la clé d'API pour l'utilisateur '{username}': {e}")
@@ -0,0 +1,194 @@
+# lutrin_api/services/cache_service.py
+import os
+import gzip
+import json
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
+from .logger_service import Log, Error
+
+def make_key(*parts):
+    """
+    Construit une clé de cache (SHA-256 hexadécimal) à partir de plusieurs éléments.
+    """
+
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(str(part).encode('utf-8'))
+        digest.update(b'\0') # Séparateur pour éviter les collisions ("ab","c" vs "a","bc")
+    return digest.hexdigest()
+
+class CacheBudget:
+    """
+    Taille maximale partagée par plusieurs FileCache (par exemple un cache par format de fichier).
+    L'index LRU est commun : l'éviction retire l'entrée la moins récemment utilisée,
+    quel que soit le cache qui la contient.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.index = OrderedDict() # (cache, clé) -> taille, du moins au plus récemment utilisé
+        self.total_bytes = 0
+
+class FileCache:
+    """
+    Cache de fichiers sur disque adressé par contenu, borné en taille, avec éviction LRU.
+    L'index (clé -> taille) est tenu en mémoire ; l'ordre LRU est persisté via la date
+    de modification des fichiers pour survivre aux redémarrages.
+    Avec `budget`, la taille maximale est partagée avec les autres caches du même CacheBudget.
+    """
+
+    def __init__(self, directory, max_bytes=None, extension='', budget=None):
+        self.directory = directory
+        self.extension = extension
+        self.budget = budget if budget is not None else CacheBudget(max_bytes)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = 0
+        self._total_bytes = 0
+
+        os.makedirs(directory, exist_ok=True)
+        self._load_index()
+
+    def _load_index(self):
+        """
+        Reconstruit l'index depuis le disque, du moins au plus récemment utilisé.
+        Les entrées déjà chargées par les autres caches du budget sont réordonnées avec les nouvelles.
+        """
+        entries = []
+        for filename in os.listdir(self.directory):
+            if not filename.endswith(self.extension) or filename.startswith('.'):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.directory, filename))
+            except OSError:
+                continue
+            key = filename[:len(filename) - len(self.extension)] if self.extension else filename
+            entries.append((stat.st_mtime, self, key, stat.st_size))
+
+        budget = self.budget
+        with budget.lock:
+            for (cache, key), size in budget.index.items():
+                try:
+                    entries.append((os.stat(cache.path_for(key)).st_mtime, cache, key, size))
+                except OSError:
+                    entries.append((0.0, cache, key, size))
+            budget.index.clear()
+            for _, cache, key, size in sorted(entries, key=lambda entry: entry[0]):
+                budget.index[(cache, key)] = size
+            self._entries = sum(1 for cache, _ in budget.index if cache is self)
+            self._total_bytes = sum(size for (cache, _), size in budget.index.items() if cache is self)
+            budget.total_bytes = sum(budget.index.values())
+        Log(f"Cache {self.directory} : {self._entries} entrées, {self._total_bytes / 1_048_576:.1f} Mo")
+
+    @property
+    def max_bytes(self):
+        return self.budget.max_bytes
+
+    def path_for(self, key):
+        """Chemin du fichier associé à une clé (qu'il existe ou non)."""
+        return os.path.join(self.directory, f"{key}{self.extension}")
+
+    def _forget(self, cache, key):
+        """Retire une entrée de l'index partagé (verrou du budget tenu) et retourne sa taille."""
+        size = self.budget.index.pop((cache, key))
+        self.budget.total_bytes -= size
+        cache._entries -= 1
+        cache._total_bytes -= size
+        return size
+
+    def get(self, key):
+        """
+        Retourne le chemin du fichier en cache pour cette clé, ou None (absent).
+        Un accès réussi rafraîchit la position LRU de l'entrée.
+        """
+
+        path = self.path_for(key)
+        with self.budget.lock:
+            if (self, key) not in self.budget.index:
+                self.misses += 1
+                return None
+            if not os.path.exists(path):
+                # Fichier supprimé hors du cache : on corrige l'index
+                self._forget(self, key)
+                self.misses += 1
+                return None
+            self.budget.index.move_to_end((self, key))
+            self.hits += 1
+
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return path
+
+    def put(self, key, source_path):
+        """
+        Déplace `source_path` dans le cache sous cette clé et retourne le chemin final.
+        Évince les entrées les moins récemment utilisées (de ce cache ou des autres caches
+        du budget) si la taille maximale est dépassée.
+        """
+
+        path = self.path_for(key)
+        os.replace(source_path, path)
+        size = os.path.getsize(path)
+
+        budget = self.budget
+        with budget.lock:
+            if (self, key) in budget.index:
+                self._forget(self, key)
+            budget.index[(self, key)] = size
+            budget.total_bytes += size
+            self._entries += 1
+            self._total_bytes += size
+
+            while budget.total_bytes > budget.max_bytes and len(budget.index) > 1:
+                old_cache, old_key = next(iter(budget.index))
+                self._forget(old_cache, old_key)
+                old_cache.evictions += 1
+                try:
+                    os.remove(old_cache.path_for(old_key))
+                except OSError as e:
+                    Error(f"Suppression impossible de l'entrée de cache {old_key} = {e}")
+        return path
+
+    def get_json(self, key):
+        """Retourne la valeur JSON (compressée gzip) en cache pour cette clé, ou None."""
+        path = self.get(key)
+        if path is None:
+            return None
+        try:
+            with gzip.open(path, 'rt', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            # Entrée évincée entre-temps ou fichier corrompu
+            Error(f"Lecture impossible de l'entrée de cache {key} = {e}")
+            return None
+
+    def put_json(self, key, value):
+        """Enregistre une valeur sérialisable en JSON (compressée gzip) sous cette clé."""
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix='.tmp_')
+        try:
+            with gzip.open(os.fdopen(fd, 'wb'), 'wt', encoding='utf-8', compresslevel=1) as f:
+                json.dump(value, f, ensure_ascii=False)
+        except Exception:
+            os.remove(tmp_path)
+            raise
+        return self.put(key, tmp_path)
+
+    def stats(self):
+        """Compteurs du cache (taille, entrées, succès, échecs, évictions)."""
+        with self.budget.lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": self._entries,
+                "size_bytes": self._total_bytes,
+                "max_bytes": self.budget.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": round(self.hits / lookups, 3) if lookups else 0.0,
+            }
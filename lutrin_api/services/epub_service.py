@@ -1,14 +1,79 @@
 # lutrin_api/services/epub_service.py
 import os
-import base64
+import io
 import json
+import time
+import hashlib
+import mimetypes
+import tempfile
 from ebooklib import epub, ITEM_DOCUMENT, ITEM_COVER
 import re
-import requests
+import multiprocessing
 from bs4 import BeautifulSoup
-from groq import Groq
+from lxml import html as lxml_html
+from lxml import etree
+from lxml.etree import ParserError
+from PIL import Image
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, TimeoutError as FutureTimeoutError, wait
 from .logger_service import *
-from ..config import UPLOAD_FOLDER, GROQ_TOKEN
+from . import library_service, http_service, metrics_service
+from .cache_service import FileCache, make_key
+from ..config import (
+    UPLOAD_FOLDER, GROQ_TOKEN, GOOGLE_BOOKS_URL, EPUB_PARSE_WORKERS, COVER_FOLDER, COVER_SIZES, ENRICHMENT_SOURCE_TIMEOUT, ENRICHMENT_DEADLINE,
+    EPUB_CACHE_FOLDER, EPUB_CACHE_MAX_MB, ENRICHMENT_CACHE_FOLDER, ENRICHMENT_CACHE_MAX_MB, WAITRESS_THREADS
+)
+
+# --- Extraction du texte (lxml, éventuellement répartie sur un pool de processus) ---
+epub_pool = None
+
+# Taille totale (en octets) des documents à partir de laquelle l'extraction est parallélisée
+EPUB_PARALLEL_MIN_BYTES = 512 * 1024
+
+PARAGRAPH_TAGS = ("p", "h1", "h2", "h3", "h4", "h5", "h6", "pre")
+CHAPTER_TITLE_TAGS = ("h1", "h2", "h3")
+# Mêmes balises, avec ou sans espace de noms XHTML
+_PARAGRAPH_SELECTORS = tuple(f"{{*}}{tag}" for tag in PARAGRAPH_TAGS)
+# Balises dont le contenu n'est pas du texte lisible (BeautifulSoup l'ignorait dans get_text)
+_NON_TEXT_SELECTORS = ("{*}script", "{*}style")
+# L'enrichissement des métadonnées tourne pendant l'extraction du texte (import en flux),
+# et ses sources (Groq, Google Books) sont interrogées en parallèle. Un import occupe un thread
+# de requête : avec un worker par thread, un enrichissement n'attend jamais son tour.
+_enrichment_pool = ThreadPoolExecutor(max_workers=WAITRESS_THREADS, thread_name_prefix="epub-enrich")
+_lookup_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="epub-lookup")
+
+# --- Caches persistants ---
+# Versions à incrémenter dès que l'extraction (texte, chapitres, couverture) ou les sources
+# d'enrichissement changent : les anciennes entrées ne sont plus lues et finissent évincées.
+EXTRACTOR_VERSION = 3
+ENRICHMENT_VERSION = 1
+# Résultat de l'extraction, par empreinte SHA-256 du fichier EPUB
+book_cache = FileCache(EPUB_CACHE_FOLDER, EPUB_CACHE_MAX_MB * 1024 * 1024, extension='.json.gz')
+# Champs apportés par l'enrichissement, par (titre, premier auteur) : partagé entre éditions
+enrichment_cache = FileCache(ENRICHMENT_CACHE_FOLDER, ENRICHMENT_CACHE_MAX_MB * 1024 * 1024, extension='.json.gz')
+_CONTROL_WHITESPACE = str.maketrans('\r\n\t', '   ')
+# Les documents XHTML bien formés (le cas normal dans un EPUB) sont lus tels qu'écrits, comme
+# le faisait html.parser ; le parseur HTML, qui restructure l'arbre, ne sert qu'en secours.
+# Les entités externes ne sont jamais résolues (fichier EPUB fourni par l'utilisateur).
+_XML_PARSER = etree.XMLParser(encoding='utf-8', resolve_entities=False, no_network=True)
+_HTML_PARSER = lxml_html.HTMLParser(encoding='utf-8')
+
+def init_epub_parser():
+    """
+    Démarre le pool de processus d'extraction du texte des EPUB (si EPUB_PARSE_WORKERS > 1).
+    Appelé au démarrage du serveur, avant la création des threads de requête.
+    """
+    global epub_pool
+    if epub_pool is None and EPUB_PARSE_WORKERS > 1:
+        Log(f"Initialisation du pool d'extraction EPUB ({EPUB_PARSE_WORKERS} processus)...")
+        epub_pool = ProcessPoolExecutor(max_workers=EPUB_PARSE_WORKERS, mp_context=multiprocessing.get_context('fork'))
+        list(epub_pool.map(_extract_paragraphs, [b"<p></p>"] * EPUB_PARSE_WORKERS))
+
+def _get_groq_client():
+    """
+    Client Groq partagé, borné par ENRICHMENT_SOURCE_TIMEOUT et sans nouvelle tentative :
+    le délai global de l'enrichissement ne laisserait pas le temps de réessayer.
+    """
+    return http_service.groq_client().with_options(timeout=ENRICHMENT_SOURCE_TIMEOUT, max_retries=0)
 
 def _enhance_with_groq(metadata):
     """
@@ -20,10 +85,10 @@ def _enhance_with_groq(metadata):
 
     Title("Étape 1: Enrichissement des métadonnées avec Groq")
     try:
-        client = Groq(api_key=GROQ_TOKEN)
+        client = _get_groq_client()
         metadata_str = json.dumps(metadata, indent=2, ensure_ascii=False)
 
-        chat_completion = client.chat.completions.create(
+        chat_completion = http_service.call('groq', client.chat.completions.create,
             messages=[
                 {"role": "system", "content": "Tu es un expert bibliothécaire. Analyse les métadonnées fournies. Ton but est de nettoyer le titre et d'extraire les informations de série. Retourne UNIQUEMENT un objet JSON valide avec les champs 'title' (le titre propre du livre, sans la série), 'style' (le genre principal, ex: 'Science-Fiction'), 'series' (le nom de la série, ou null), et 'series_number' (le numéro dans la série, ou null). N'invente AUCUNE information, surtout pas de description."},
                 {"role": "user", "content": f"Analyse ces métadonnées et retourne les champs demandés : \n\n{metadata_str}"}
@@ -59,7 +124,7 @@ def _pick_best_google_result(metadata, google_results):
     Title("Étape 2: Désambiguïsation avec Groq (Google Books)")
 
     try:
-        client = Groq(api_key=GROQ_TOKEN)
+        client = _get_groq_client()
 
         # On simplifie les résultats Google Books pour éviter les JSON trop longs
         simplified_results = []
@@ -113,7 +178,7 @@ Réponds STRICTEMENT au format JSON :
 ⚠️ Si aucun résultat n'est fiable, renvoie "index": -1 et "confidence": 0.
 """
 
-        chat_completion = client.chat.completions.create(
+        chat_completion = http_service.call('groq', client.chat.completions.create,
             messages=[
                 {"role": "system", "content": "Tu es un expert bibliothécaire et documentaliste spécialisé en métadonnées de livres."},
                 {"role": "user", "content": prompt}
@@ -151,11 +216,11 @@ def _enhance_with_google_books(metadata):
     try:
         # Construction de la requête
         query = f"intitle:{title} inauthor:{authors[0]}"
-        url = f"https://www.googleapis.com/books/v1/volumes?q={query}&maxResults=10&langRestrict=fr&country=FR"
+        url = f"{GOOGLE_BOOKS_URL}/volumes?q={query}&maxResults=10&langRestrict=fr&country=FR"
         Log(f"Interrogation de Google Books avec la requête : {query}")
 
         # Requête API
-        response = requests.get(url)
+        response = http_service.get('google_books', url)
         response.raise_for_status()
         data = response.json()
 
@@ -172,11 +237,11 @@ def _enhance_with_google_books(metadata):
             return metadata, None
 
         # Extraction des métadonnées
-        Log(choice)
+        Debug(choice)
         book_info = google_results[best_index]["volumeInfo"]
         book_info["description"] = choice["description_fr"]
         Success(f"Résultat choisi par Groq : #{best_index} ({choice.get('reason', '')})")
-        Log(book_info)
+        Debug(book_info)
 
         # Extraction et enrichissement des métadonnées
         isbn = None
@@ -232,10 +297,10 @@ def _enhance_with_open_library(metadata, isbn=None):
     try:
         url = f"https://openlibrary.org/api/books?bibkeys=ISBN:{isbn}&format=json&jscmd=data"
         Log(f"Interrogation de Open Library avec l'ISBN : {isbn}")
-        response = requests.get(url)
+        response = http_service.get('open_library', url)
         response.raise_for_status()
         data = response.json()
-        Log(data)
+        Debug(data)
 
         book_key = f"ISBN:{isbn}"
         if book_key in data and data[book_key]:
@@ -299,111 +364,427 @@ def _clean_paragraph(text: str) -> str:
     # Strip en début/fin
     return text.strip()
 
+def _normalize_text_piece(text: str) -> str:
+    """
+    Normalise un nœud texte comme le faisait _compact_html avant BeautifulSoup :
+    retours à la ligne et tabulations deviennent des espaces, les espaces multiples sont réduits.
+    """
+    text = text.translate(_CONTROL_WHITESPACE)
+    if '  ' in text:
+        text = ' '.join(part for part in text.split(' ') if part)
+    return text.strip()
+
+def _parse_document(content: bytes):
+    """
+    Construit l'arbre d'un document : parseur XML si le document est bien formé, sinon
+    parseur HTML (qui referme par exemple un <p> avant un <div>, contrairement à html.parser).
+    Comme l'ancienne chaîne, le contenu est lu en UTF-8 et les octets invalides sont ignorés.
+    """
+    try:
+        content.decode('utf-8')
+    except UnicodeDecodeError:
+        content = content.decode('utf-8', errors='ignore').encode('utf-8')
+    try:
+        return etree.fromstring(content, parser=_XML_PARSER)
+    except etree.XMLSyntaxError:
+        pass
+    try:
+        return lxml_html.document_fromstring(content, parser=_HTML_PARSER)
+    except (ParserError, ValueError):
+        return None # Document vide ou illisible
+
+def _extract_paragraphs(content: bytes):
+    """
+    Extrait le titre et les paragraphes (<p>, <h1-h6>, <pre>) d'un document XHTML
+    avec les parseurs C de lxml. Pour un document bien formé, produit les mêmes paragraphes
+    que l'ancienne chaîne _compact_html + BeautifulSoup(html.parser) + get_text(separator=" ", strip=True),
+    y compris pour les balises imbriquées (un paragraphe dans un titre est extrait deux fois).
+    Les documents mal formés passent par le parseur HTML et peuvent différer quand des blocs
+    sont imbriqués dans un paragraphe.
+    Retourne (titre du chapitre ou None, liste des paragraphes).
+    """
+    root = _parse_document(content)
+    if root is None:
+        return None, []
+    # Les balises sont vidées plutôt que retirées : le texte qui les suit fait partie du
+    # paragraphe, et reste un morceau séparé de celui qui les précède ("z<style/>w" donne "z w")
+    for element in list(root.iter(*_NON_TEXT_SELECTORS)):
+        element.clear(keep_tail=True)
+
+    paragraphs = []
+    chapter_title = None
+    for element in root.iter(*_PARAGRAPH_SELECTORS):
+        # itertext() saute le texte des commentaires mais pas leur suite : "x<!-- -->y" donne "x y"
+        pieces = [_normalize_text_piece(piece) for piece in element.itertext()]
+        # Les morceaux étant déjà normalisés, le résultat est identique à _clean_paragraph(raw)
+        cleaned = " ".join(piece for piece in pieces if piece)
+        if cleaned:
+            paragraphs.append(cleaned)
+            # Le premier titre du document sert de titre de chapitre
+            if chapter_title is None and etree.QName(element).localname in CHAPTER_TITLE_TAGS:
+                chapter_title = cleaned
+    return chapter_title, paragraphs
+
+def _extract_documents(documents):
+    """
+    Extrait (titre, paragraphes) de chaque document, dans l'ordre et au fil de l'eau :
+    le premier document est disponible sans attendre les suivants. Les gros livres
+    sont répartis sur le pool de processus, les autres traités dans le thread courant.
+    """
+    total_bytes = sum(len(content) for content in documents)
+    if epub_pool and len(documents) > 1 and total_bytes >= EPUB_PARALLEL_MIN_BYTES:
+        Log(f"Extraction parallèle de {len(documents)} documents ({total_bytes / 1024:.0f} Ko)")
+        return epub_pool.map(_extract_paragraphs, documents)
+    return map(_extract_paragraphs, documents)
+
+def _toc_titles(book):
+    """Associe le chemin de chaque document (sans ancre) au premier titre qui le désigne dans la table des matières."""
+    titles = {}
+    pending = list(book.toc)
+    while pending:
+        entry = pending.pop(0)
+        if isinstance(entry, tuple): # (Section, [enfants])
+            section, children = entry
+            pending[:0] = [section, *children]
+            continue
+        href = getattr(entry, 'href', None)
+        title = (getattr(entry, 'title', None) or '').strip()
+        if href and title:
+            titles.setdefault(href.split('#', 1)[0], title)
+    return titles
+
+def _spine_documents(book):
+    """
+    Retourne les documents du livre dans l'ordre de lecture (spine), sous forme de
+    liste (chemin, contenu). Le document de navigation est ignoré. Si le spine est
+    vide ou inexploitable, on retombe sur l'ordre du manifeste.
+    """
+    items = []
+    for entry in book.spine:
+        idref = entry[0] if isinstance(entry, tuple) else entry
+        item = book.get_item_with_id(idref)
+        if item is not None and item.get_type() == ITEM_DOCUMENT and not isinstance(item, epub.EpubNav):
+            items.append(item)
+    if not items:
+        items = [item for item in book.get_items_of_type(ITEM_DOCUMENT) if not isinstance(item, epub.EpubNav)]
+    return [(item.get_name(), item.get_content()) for item in items]
+
+def _iter_chapters(book, documents):
+    """
+    Produit les chapitres non vides parmi les documents (chemin, contenu) du livre :
+    {'title': titre de la table des matières, sinon premier titre du document, 'paragraphs': [...]}.
+    """
+    toc_titles = _toc_titles(book)
+    extracted = _extract_documents([content for _, content in documents])
+    for (name, _), (heading, paragraphs) in zip(documents, extracted):
+        if paragraphs:
+            yield {'title': toc_titles.get(name) or heading, 'paragraphs': paragraphs}
+
+def _read_metadata(book):
+    """Extrait les métadonnées Dublin Core brutes du livre."""
+    return {
+        'title': book.get_metadata('DC', 'title')[0][0] if book.get_metadata('DC', 'title') else "Titre inconnu",
+        'authors': [author[0] for author in book.get_metadata('DC', 'creator')] if book.get_metadata('DC', 'creator') else [],
+        'language': book.get_metadata('DC', 'language')[0][0] if book.get_metadata('DC', 'language') else "Langue inconnue",
+        'publisher': book.get_metadata('DC', 'publisher')[0][0] if book.get_metadata('DC', 'publisher') else None,
+        'publication_date': book.get_metadata('DC', 'date')[0][0] if book.get_metadata('DC', 'date') else None,
+    }
+
+def _lookup_google_books(metadata):
+    """Source Google Books : recherche, désambiguïsation par Groq, puis (éventuellement) Open Library."""
+    enhanced, isbn = _enhance_with_google_books(metadata)
+    # enhanced = _enhance_with_open_library(enhanced, isbn)
+    return enhanced
+
+# Sources d'enrichissement indépendantes, par priorité croissante lors de la fusion
+ENRICHMENT_SOURCES = (
+    ("Groq", _enhance_with_groq),
+    ("Google Books", _lookup_google_books),
+)
+
+def _enrichment_key(metadata):
+    """Clé du cache d'enrichissement : (titre, premier auteur) normalisés, ou None s'ils sont inconnus."""
+    title = metadata.get('title')
+    authors = metadata.get('authors') or []
+    if not title or title == "Titre inconnu" or not authors:
+        return None
+    normalize = lambda value: ' '.join(str(value).casefold().split())
+    return make_key(ENRICHMENT_VERSION, normalize(title), normalize(authors[0]))
+
+def _enrich_metadata(metadata, deadline=None):
+    """
+    Enrichit les métadonnées en interrogeant toutes les sources en parallèle.
+    Chaque appel réseau est borné par ENRICHMENT_SOURCE_TIMEOUT ; à l'échéance `deadline`
+    (time.monotonic(), par défaut ENRICHMENT_DEADLINE après l'appel), on fusionne les résultats
+    déjà disponibles et on abandonne les autres.
+    Un enrichissement complet (toutes les sources ont répondu) est mis en cache par (titre, auteur).
+    """
+    cache_key = _enrichment_key(metadata)
+    cached = enrichment_cache.get_json(cache_key) if cache_key else None
+    if cached is not None:
+        Success("Enrichissement des métadonnées repris du cache (titre, auteur).")
+        return {**metadata, **cached}
+
+    start = time.monotonic()
+    if deadline is None:
+        deadline = start + ENRICHMENT_DEADLINE
+    futures = [(name, _lookup_pool.submit(source, metadata)) for name, source in ENRICHMENT_SOURCES]
+    done, _ = wait([future for _, future in futures], timeout=max(0.0, deadline - start))
+
+    changes = {}
+    complete = True
+    for name, future in futures:
+        if future not in done:
+            Warning(f"Enrichissement {name} abandonné : délai global de {ENRICHMENT_DEADLINE:g}s dépassé.")
+            complete = False
+            continue
+        try:
+            result = future.result()
+        except Exception as e:
+            Error(f"Erreur lors de l'enrichissement {name} : {e}")
+            complete = False
+            continue
+        # Seuls les champs modifiés par la source sont fusionnés
+        source_changes = {key: value for key, value in result.items() if metadata.get(key) != value}
+        # Une source qui n'apporte rien a probablement échoué (erreur réseau, jeton absent) : on ne fige pas ce résultat
+        complete = complete and bool(source_changes)
+        changes.update(source_changes)
+
+    metrics_service.observe_stage('epub_enrichment', time.monotonic() - start)
+    Log(f"Enrichissement des métadonnées terminé en {time.monotonic() - start:.2f}s")
+    if cache_key and complete:
+        try:
+            enrichment_cache.put_json(cache_key, changes)
+        except Exception as e:
+            Error(f"Mise en cache de l'enrichissement impossible : {e}")
+    return {**metadata, **changes}
+
+def _find_cover(book):
+    """
+    Recherche l'image de couverture du livre. Retourne (contenu, type MIME) ou None.
+    """
+    cover_item = None
+
+    Title("Traitement de l'image de couverture")
+
+    # Méthode 1: Chercher un item de type ITEM_COVER
+    cover_items = list(book.get_items_of_type(ITEM_COVER))
+    if cover_items:
+        cover_item = cover_items[0]
+        Log("Image de couverture trouvée via ITEM_COVER.")
+
+    # Méthode 2: Si non trouvée, chercher dans le guide EPUB
+    if not cover_item:
+        for item in book.guide:
+            if item.get('type') == 'cover':
+                cover_item = book.get_item_with_href(item.get('href'))
+                Log("Image de couverture trouvée via le guide EPUB.")
+                break
+
+    # Méthode 3: Si toujours non trouvée, chercher dans les métadonnées
+    if not cover_item:
+        for meta in book.get_metadata('OPF', 'meta'):
+            if meta[1].get('name') == 'cover':
+                cover_item = book.get_item_with_id(meta[1].get('content'))
+                Log("Image de couverture trouvée via les métadonnées OPF.")
+                break
+
+    if not cover_item:
+        return None
+
+    # Si l'item de couverture est un document HTML, il faut trouver l'image à l'intérieur.
+    if cover_item.get_type() == ITEM_DOCUMENT:
+        Log("L'item de couverture est un document HTML, recherche de la balise <img>.")
+        soup = BeautifulSoup(cover_item.get_content(), 'html.parser')
+        img_tag = soup.find('img')
+        if img_tag and img_tag.get('src'):
+            # On récupère le vrai item image via son href
+            img_href = img_tag.get('src')
+            cover_item = book.get_item_with_href(img_href)
+            Log(f"Image réelle trouvée avec href: {img_href}")
+
+    # Maintenant, on traite l'item qui est (on l'espère) une vraie image
+    if cover_item and cover_item.get_type() != ITEM_DOCUMENT:
+        return cover_item.get_content(), cover_item.media_type
+    return None
+
+def _cover_url(filename):
+    """URL (servie par la route /file du serveur) d'un fichier du dossier des couvertures."""
+    return "/file/" + os.path.relpath(os.path.join(COVER_FOLDER, filename), UPLOAD_FOLDER).replace(os.sep, '/')
+
+def _write_atomic(path, data):
+    """Écrit un fichier via un fichier temporaire renommé : jamais de fichier partiel servi."""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp_')
+    with os.fdopen(fd, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+def _store_cover(image_bytes, media_type):
+    """
+    Enregistre la couverture dans COVER_FOLDER sous un nom dérivé de son contenu (SHA-256),
+    avec une miniature JPEG par largeur de COVER_SIZES. Une couverture déjà connue n'est
+    ni réécrite ni redimensionnée. Retourne {'cover_image': URL, 'cover_thumbnail': URL}.
+    """
+    digest = hashlib.sha256(image_bytes).hexdigest()[:32]
+    extension = mimetypes.guess_extension(media_type or '') or '.img'
+    if extension == '.jpe':
+        extension = '.jpg'
+
+    os.makedirs(COVER_FOLDER, exist_ok=True)
+    original = f"{digest}{extension}"
+    if not os.path.exists(os.path.join(COVER_FOLDER, original)):
+        _write_atomic(os.path.join(COVER_FOLDER, original), image_bytes)
+
+    thumbnails = {}
+    try:
+        image = None
+        for width in COVER_SIZES:
+            filename = f"{digest}_{width}.jpg"
+            path = os.path.join(COVER_FOLDER, filename)
+            if not os.path.exists(path):
+                if image is None:
+                    image = Image.open(io.BytesIO(image_bytes))
+                    image.draft('RGB', (COVER_SIZES[-1], COVER_SIZES[-1] * 2)) # Décodage JPEG réduit, bien plus rapide
+                    image = image.convert('RGB')
+                thumbnail = image.copy()
+                thumbnail.thumbnail((width, width * 2), Image.LANCZOS)
+                buffer = io.BytesIO()
+                thumbnail.save(buffer, 'JPEG', quality=85, optimize=True, progressive=True)
+                _write_atomic(path, buffer.getvalue())
+            thumbnails[width] = filename
+    except Exception as e:
+        # Format non pris en charge par Pillow (SVG...) : on sert l'original
+        thumbnails = {}
+        Warning(f"Impossible de générer les miniatures de la couverture : {e}")
+
+    Success(f"Couverture enregistrée ({len(image_bytes) / 1024:.0f} Ko, {len(thumbnails)} miniatures).")
+    return {
+        "cover_image": _cover_url(thumbnails[COVER_SIZES[-1]] if thumbnails else original),
+        "cover_thumbnail": _cover_url(thumbnails[COVER_SIZES[0]] if thumbnails else original),
+    }
+
+def _extract_cover(book):
+    """
+    Extrait et enregistre l'image de couverture du livre.
+    Retourne {'cover_image': URL, 'cover_thumbnail': URL} (valeurs None si le livre n'en a pas).
+    """
+    cover = _find_cover(book)
+    if cover is None:
+        return {"cover_image": None, "cover_thumbnail": None}
+    return _store_cover(*cover)
+
 def add_epub(file_storage, user_id):
     """
     Traite un fichier EPUB uploadé, en extrait le texte brut, les métadonnées
     et l'image de couverture, puis retourne le tout.
     """
+    result_data = {"book_id": None, "metadata": None, "cover_image": None, "cover_thumbnail": None}
+    texts = []
+    for event in stream_epub(file_storage, user_id):
+        if event['event'] == 'error':
+            return False, event['details']
+        if event['event'] == 'metadata':
+            result_data.update({key: value for key, value in event.items() if key in result_data})
+        elif event['event'] == 'chapter':
+            texts.extend(event['paragraphs'])
+        elif event['event'] == 'done':
+            result_data['book_id'] = event['book_id']
+
+    # Joindre les fragments avec un double saut de ligne pour simuler des paragraphes.
+    result_data['text'] = "\n\n".join(texts).strip()
+    return True, result_data
+
+def stream_epub(file_storage, user_id):
+    """
+    Traite un fichier EPUB uploadé au fil de l'eau, pour une réponse NDJSON ou SSE.
+    Générateur d'événements (dictionnaires avec une clé 'event') :
+    - 'metadata' : métadonnées brutes, URL de la couverture et nombre de documents, émis en premier ;
+    - 'chapter' : un chapitre (index, titre, paragraphes) dès qu'il est extrait, dans l'ordre de lecture ;
+    - 'metadata' (avec 'enriched': True) : métadonnées enrichies, calculées pendant l'extraction ;
+    - 'done' : identifiant du livre dans la bibliothèque ;
+    - 'error' : le traitement s'arrête.
+    Un fichier déjà importé (même empreinte) est repris du cache sans être relu.
+    """
     BigTitle(f"Traitement d'un nouveau fichier EPUB pour l'utilisateur ID: {user_id}")
     Log(f"Fichier reçu en mémoire : {file_storage.filename}")
 
     try:
-        # EbookLib lit directement depuis l'objet fichier en mémoire
-        book = epub.read_epub(file_storage)
-        
-        # --- Extraction des métadonnées ---
-        metadata = {
-            'title': book.get_metadata('DC', 'title')[0][0] if book.get_metadata('DC', 'title') else "Titre inconnu",
-            'authors': [author[0] for author in book.get_metadata('DC', 'creator')] if book.get_metadata('DC', 'creator') else [],
-            'language': book.get_metadata('DC', 'language')[0][0] if book.get_metadata('DC', 'language') else "Langue inconnue",
-            'publisher': book.get_metadata('DC', 'publisher')[0][0] if book.get_metadata('DC', 'publisher') else None,
-            'publication_date': book.get_metadata('DC', 'date')[0][0] if book.get_metadata('DC', 'date') else None,
-        }
-        Log(f"Métadonnées brutes extraites : {metadata}")
-
-        # Chaînage des enrichissements
-        metadata_pass1 = _enhance_with_groq(metadata)
-        metadata_pass2, isbn = _enhance_with_google_books(metadata_pass1)
-        # metadata_pass3 = _enhance_with_open_library(metadata_pass2, isbn)
-        metadata = metadata_pass2 # Résultat final
-
-        # --- Extraction de l'image de couverture ---
-        cover_image_data = None
-        cover_item = None
-
-        Title("Traitement de l'image de couverture")
-
-        # Méthode 1: Chercher un item de type ITEM_COVER
-        cover_items = list(book.get_items_of_type(ITEM_COVER))
-        if cover_items:
-            cover_item = cover_items[0]
-            Log("Image de couverture trouvée via ITEM_COVER.")
-
-        # Méthode 2: Si non trouvée, chercher dans le guide EPUB
-        if not cover_item:
-            for item in book.guide:
-                if item.get('type') == 'cover':
-                    cover_item = book.get_item_with_href(item.get('href'))
-                    Log("Image de couverture trouvée via le guide EPUB.")
-                    break
-
-        # Méthode 3: Si toujours non trouvée, chercher dans les métadonnées
-        if not cover_item:
-            for meta in book.get_metadata('OPF', 'meta'):
-                if meta[1].get('name') == 'cover':
-                    cover_item = book.get_item_with_id(meta[1].get('content'))
-                    Log("Image de couverture trouvée via les métadonnées OPF.")
-                    break
-
-        if cover_item:
-            # Si l'item de couverture est un document HTML, il faut trouver l'image à l'intérieur.
-            if cover_item.get_type() == ITEM_DOCUMENT:
-                Log("L'item de couverture est un document HTML, recherche de la balise <img>.")
-                soup = BeautifulSoup(cover_item.get_content(), 'html.parser')
-                img_tag = soup.find('img')
-                if img_tag and img_tag.get('src'):
-                    # On récupère le vrai item image via son href
-                    img_href = img_tag.get('src')
-                    cover_item = book.get_item_with_href(img_href)
-                    Log(f"Image réelle trouvée avec href: {img_href}")
-
-            # Maintenant, on traite l'item qui est (on l'espère) une vraie image
-            if cover_item and cover_item.get_type() != ITEM_DOCUMENT:
-                image_bytes = cover_item.get_content()
-                encoded_image = base64.b64encode(image_bytes).decode('utf-8')
-                cover_image_data = f"data:{cover_item.media_type};base64,{encoded_image}"
-                Success("Image de couverture extraite et encodée en Base64.")
+        data = file_storage.read()
+        book_key = make_key(EXTRACTOR_VERSION, hashlib.sha256(data).hexdigest())
+        cached = book_cache.get_json(book_key)
+
+        # Durée de lecture et d'extraction du livre, hors temps passé à émettre les événements
+        parse_time = 0.0
+        if cached is None:
+            parse_start = time.perf_counter()
+            # EbookLib lit directement depuis le contenu en mémoire
+            book = epub.read_epub(io.BytesIO(data))
+            metadata = _read_metadata(book)
+            Log(f"Métadonnées brutes extraites : {metadata}")
+        else:
+            metadata = cached['metadata']
+            Success(f"EPUB déjà importé : extraction reprise du cache ({len(cached['chapters'])} chapitres).")
+
+        # L'enrichissement (appels réseau) démarre tout de suite et se poursuit pendant l'extraction
+        enrichment_deadline = time.monotonic() + ENRICHMENT_DEADLINE
+        enrichment = _enrichment_pool.submit(_enrich_metadata, metadata, enrichment_deadline)
+
+        if cached is None:
+            cover = _extract_cover(book)
+            documents = _spine_documents(book)
+            document_count = len(documents)
+            chapter_source = _iter_chapters(book, documents)
+            parse_time += time.perf_counter() - parse_start
+        else:
+            cover = cached['cover']
+            document_count = cached['document_count']
+            chapter_source = cached['chapters']
 
-        Title("Traitement du texte du livre")
-        texts = []
-
-        # Parcourir tous les documents (chapitres, etc.) du livre
-        for item in book.get_items_of_type(ITEM_DOCUMENT):
-            # Nettoyage du HTML brut
-            cleaned_html = _compact_html(item.get_content())
-            soup = BeautifulSoup(cleaned_html, 'html.parser')
-            
-            # On récupère les paragraphes <p>, <h1‑h6>, <pre>…
-            for tag in soup.find_all(["p", "h1", "h2", "h3", "h4", "h5", "h6", "pre"]):
-                raw = tag.get_text(separator=" ", strip=True)
-                if raw:
-                    cleaned = _clean_paragraph(raw)
-                    if cleaned:
-                        texts.append(cleaned)
-
-        # Joindre les fragments avec un double saut de ligne pour simuler des paragraphes.
-        full_text = "\n\n".join(texts).strip()
-        Success(f"Extraction de {len(full_text)} caractères depuis '{file_storage.filename}'.")
-
-        # --- Assemblage du résultat final ---
-        result_data = {
+        yield {
+            "event": "metadata",
+            "enriched": False,
             "metadata": metadata,
-            "cover_image": cover_image_data,
-            "text": full_text
+            **cover,
+            "document_count": document_count,
         }
-        return True, result_data
+
+        Title("Traitement du texte du livre")
+        chapters = []
+        characters = 0
+        parse_start = time.perf_counter()
+        for chapter in chapter_source:
+            parse_time += time.perf_counter() - parse_start
+            yield {"event": "chapter", "index": len(chapters), **chapter}
+            chapters.append(chapter)
+            characters += sum(len(paragraph) for paragraph in chapter['paragraphs'])
+            parse_start = time.perf_counter()
+        parse_time += time.perf_counter() - parse_start
+        if cached is None:
+            metrics_service.observe_stage('epub_parse', parse_time)
+        Success(f"Extraction de {len(chapters)} chapitres ({characters} caractères) depuis '{file_storage.filename}'.")
+
+        if cached is None:
+            try:
+                book_cache.put_json(book_key, {"metadata": metadata, "cover": cover, "document_count": document_count, "chapters": chapters})
+            except Exception as e:
+                Error(f"Mise en cache de l'EPUB impossible : {e}")
+
+        # L'attente est bornée par le délai global (plus une seconde pour la fusion des résultats
+        # partiels) : au-delà, le livre est enregistré avec ses métadonnées brutes
+        remaining = max(0.0, enrichment_deadline - time.monotonic()) + 1.0
+        try:
+            metadata = enrichment.result(timeout=remaining)
+        except FutureTimeoutError:
+            enrichment.cancel()
+            Warning(f"Enrichissement abandonné : délai global de {ENRICHMENT_DEADLINE:g}s dépassé, métadonnées brutes conservées.")
+        except Exception as e:
+            Error(f"Erreur lors de l'enrichissement des métadonnées : {e}")
+        yield {"event": "metadata", "enriched": True, "metadata": metadata}
+
+        book_id = library_service.add_book(user_id, metadata, cover['cover_image'], chapters)
+        yield {"event": "done", "book_id": book_id, "chapter_count": len(chapters), "characters": characters}
 
     except Exception as e:
         error_msg = f"Erreur lors du traitement du fichier EPUB '{file_storage.filename}': {e}"
         Error(error_msg)
-        return False, error_msg
\ No newline at end of file
+        yield {"event": "error", "error": "Le traitement de l'EPUB a échoué", "details": error_msg}
@@ -0,0 +1,198 @@
+# lutrin_api/services/http_service.py
+import time
+import random
+import threading
+from collections import deque
+import requests
+from requests.adapters import HTTPAdapter
+from groq import Groq
+from .logger_service import Log, Warning, Success
+from ..config import (
+    GROQ_TOKEN, GROQ_BASE_URL, HTTP_POOL_SIZE, HTTP_RETRIES, HTTP_BREAKER_THRESHOLD, HTTP_BREAKER_RESET,
+    HTTP_CONNECT_TIMEOUT, COQUI_TIMEOUT, GROQ_TIMEOUT, ENRICHMENT_SOURCE_TIMEOUT
+)
+
+# --- Appels sortants ---
+# Une seule session requests (connexions keep-alive réutilisées par hôte) et un seul client Groq
+# pour tout le serveur. Chaque service distant a ses délais, ses nouvelles tentatives et son
+# disjoncteur : quand il est en panne, les appels échouent immédiatement au lieu d'immobiliser
+# des threads jusqu'à l'expiration de leur délai.
+
+# Statuts HTTP transitoires pour lesquels une nouvelle tentative a un sens
+RETRY_STATUSES = (429, 502, 503, 504)
+# Attente de base (en secondes) avant une nouvelle tentative, doublée à chaque essai
+RETRY_BACKOFF = 0.25
+
+_session = requests.Session()
+_adapter = HTTPAdapter(pool_connections=8, pool_maxsize=HTTP_POOL_SIZE, max_retries=0)
+_session.mount('http://', _adapter)
+_session.mount('https://', _adapter)
+
+_groq_client = None
+_groq_lock = threading.Lock()
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """Levée sans appel réseau quand le disjoncteur d'un service distant est ouvert."""
+
+class Upstream:
+    """
+    Service distant : délai par défaut, nombre de nouvelles tentatives, disjoncteur
+    (fermé, ouvert, semi-ouvert) et statistiques de latence et d'erreurs.
+    """
+
+    def __init__(self, name, timeout, retries=HTTP_RETRIES):
+        self.name = name
+        self.timeout = timeout
+        self.retries = retries
+        self.state = 'closed'
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.trial_in_flight = False
+        self.calls = 0
+        self.failures = 0
+        self.retried = 0
+        self.short_circuited = 0
+        self.latencies = deque(maxlen=200)
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Vérifie le disjoncteur avant un appel. Lève CircuitOpenError s'il est ouvert."""
+        with self._lock:
+            if self.state == 'open' and time.monotonic() - self.opened_at >= HTTP_BREAKER_RESET:
+                # Délai écoulé : un seul appel d'essai est autorisé
+                self.state = 'half_open'
+            if self.state == 'open' or (self.state == 'half_open' and self.trial_in_flight):
+                self.short_circuited += 1
+                raise CircuitOpenError(f"Service '{self.name}' indisponible (disjoncteur ouvert)")
+            if self.state == 'half_open':
+                self.trial_in_flight = True
+            self.calls += 1
+
+    def record(self, latency, failure):
+        """Enregistre le résultat d'un appel et met à jour l'état du disjoncteur."""
+        with self._lock:
+            self.latencies.append(latency)
+            self.trial_in_flight = False
+            if not failure:
+                self.consecutive_failures = 0
+                if self.state != 'closed':
+                    self.state = 'closed'
+                    Success(f"Service '{self.name}' rétabli, disjoncteur refermé.")
+                return
+
+            self.failures += 1
+            self.consecutive_failures += 1
+            if self.state == 'half_open' or (self.state == 'closed' and self.consecutive_failures >= HTTP_BREAKER_THRESHOLD):
+                self.state = 'open'
+                self.opened_at = time.monotonic()
+                Warning(f"Service '{self.name}' en échec ({self.consecutive_failures} erreurs consécutives) : "
+                        f"disjoncteur ouvert pour {HTTP_BREAKER_RESET:g}s.")
+
+    def stats(self):
+        """Compteurs, état du disjoncteur et latences (moyenne, p95) en secondes."""
+        with self._lock:
+            latencies = sorted(self.latencies)
+            return {
+                "state": self.state,
+                "calls": self.calls,
+                "failures": self.failures,
+                "retries": self.retried,
+                "short_circuited": self.short_circuited,
+                "latency_avg": round(sum(latencies) / len(latencies), 3) if latencies else 0.0,
+                "latency_p95": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))], 3) if latencies else 0.0,
+            }
+
+UPSTREAMS = {
+    'coqui': Upstream('coqui', (HTTP_CONNECT_TIMEOUT, COQUI_TIMEOUT)),
+    'groq': Upstream('groq', GROQ_TIMEOUT, retries=0), # Le SDK Groq gère lui-même ses nouvelles tentatives
+    'google_books': Upstream('google_books', (HTTP_CONNECT_TIMEOUT, ENRICHMENT_SOURCE_TIMEOUT)),
+    'open_library': Upstream('open_library', (HTTP_CONNECT_TIMEOUT, ENRICHMENT_SOURCE_TIMEOUT)),
+}
+
+def _status_code(error):
+    """Code HTTP porté par une exception (requests ou SDK Groq), ou None."""
+    status = getattr(error, 'status_code', None)
+    if status is None:
+        status = getattr(getattr(error, 'response', None), 'status_code', None)
+    return status
+
+def _is_upstream_failure(error):
+    """Une erreur 4xx est imputable à la requête ; erreurs 5xx, 429, délais et connexions au service."""
+    status = _status_code(error)
+    return status is None or status >= 500 or status == 429
+
+def _is_retryable(error):
+    """
+    Nouvelle tentative après un échec de connexion ou un statut transitoire. Un délai de
+    réponse dépassé n'est pas retenté : le service est lent, insister l'aggraverait.
+    """
+    if isinstance(error, requests.exceptions.ConnectionError):
+        return True
+    return _status_code(error) in RETRY_STATUSES
+
+def call(upstream_name, func, *args, **kwargs):
+    """
+    Exécute un appel vers un service distant (disjoncteur, statistiques, nouvelles
+    tentatives avec attente exponentielle aléatoire). Lève l'exception du dernier essai.
+    """
+
+    upstream = UPSTREAMS[upstream_name]
+    for attempt in range(upstream.retries + 1):
+        upstream.acquire()
+        start = time.perf_counter()
+        try:
+            result = func(*args, **kwargs)
+        except Exception as e:
+            upstream.record(time.perf_counter() - start, _is_upstream_failure(e))
+            # Pas de nouvelle tentative si cet échec vient d'ouvrir le disjoncteur
+            if attempt == upstream.retries or not _is_retryable(e) or upstream.state == 'open':
+                raise
+            upstream.retried += 1
+            delay = random.uniform(0, RETRY_BACKOFF * 2 ** attempt)
+            Log(f"Nouvelle tentative vers '{upstream_name}' dans {delay:.2f}s ({e})")
+            time.sleep(delay)
+            continue
+        upstream.record(time.perf_counter() - start, False)
+        return result
+
+def request(upstream_name, method, url, **kwargs):
+    """
+    Requête HTTP via la session partagée. Le délai par défaut est celui du service ;
+    les statuts 5xx et 429 lèvent requests.HTTPError (et sont retentés si transitoires).
+    """
+
+    kwargs.setdefault('timeout', UPSTREAMS[upstream_name].timeout)
+
+    def send():
+        response = _session.request(method, url, **kwargs)
+        if response.status_code >= 500 or response.status_code == 429:
+            # Avec stream=True, le corps n'est jamais lu : sans close(), la connexion
+            # resterait prise au pool jusqu'au passage du ramasse-miettes
+            response.close()
+            response.raise_for_status()
+        return response
+
+    return call(upstream_name, send)
+
+def get(upstream_name, url, **kwargs):
+    """Requête GET vers un service distant (voir request)."""
+    return request(upstream_name, 'GET', url, **kwargs)
+
+def post(upstream_name, url, **kwargs):
+    """Requête POST vers un service distant (voir request)."""
+    return request(upstream_name, 'POST', url, **kwargs)
+
+def groq_client():
+    """
+    Client Groq partagé par l'OCR et l'enrichissement des EPUB (pool de connexions réutilisé).
+    Utiliser client.with_options(...) pour d'autres délais : la copie partage les connexions.
+    """
+    global _groq_client
+    with _groq_lock:
+        if _groq_client is None:
+            _groq_client = Groq(api_key=GROQ_TOKEN, base_url=GROQ_BASE_URL, timeout=GROQ_TIMEOUT, max_retries=HTTP_RETRIES)
+        return _groq_client
+
+def upstream_stats():
+    """Statistiques de latence, d'erreurs et état du disjoncteur de chaque service distant."""
+    return {name: upstream.stats() for name, upstream in UPSTREAMS.items()}
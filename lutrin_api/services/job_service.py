@@ -0,0 +1,143 @@
+# lutrin_api/services/job_service.py
+import time
+import uuid
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from .logger_service import Log, Error, Success
+from . import metrics_service
+from ..config import JOB_WORKERS, JOB_QUEUE_MAX, JOB_RETENTION
+
+# --- Files de travaux asynchrones (OCR, TTS, EPUB) ---
+# Chaque type de travail dispose de son propre pool borné : un afflux de synthèses Coqui
+# ne peut pas priver l'OCR ou l'import d'EPUB de travailleurs, et les threads de requête
+# de waitress restent libres pour les vérifications de statut et les connexions.
+
+_jobs = {}
+_jobs_lock = threading.Lock()
+_pools = {}
+_stats = {}
+
+class QueueFullError(Exception):
+    """Levée quand la file d'un type de travail a atteint sa profondeur maximale."""
+
+def _get_pool(job_type):
+    """Retourne (en le créant au besoin) le pool de travailleurs d'un type de travail."""
+    pool = _pools.get(job_type)
+    if pool is None:
+        workers = JOB_WORKERS.get(job_type, 1)
+        pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"job-{job_type}")
+        _pools[job_type] = pool
+        _stats[job_type] = {
+            "workers": workers,
+            "queued": 0,
+            "running": 0,
+            "completed": 0,
+            "failed": 0,
+            "rejected": 0,
+            "wait_times": deque(maxlen=100),
+        }
+    return pool
+
+def _purge_finished(now):
+    """Oublie les travaux terminés depuis plus de JOB_RETENTION secondes."""
+    expired = [job_id for job_id, job in _jobs.items()
+               if job['finished_at'] and now - job['finished_at'] > JOB_RETENTION]
+    for job_id in expired:
+        del _jobs[job_id]
+
+def _run_job(job_id, func, args, kwargs):
+    """Exécute un travail dans un thread du pool et enregistre son résultat."""
+    with _jobs_lock:
+        job = _jobs[job_id]
+        stats = _stats[job['type']]
+        job['status'] = 'running'
+        job['started_at'] = time.time()
+        stats['queued'] -= 1
+        stats['running'] += 1
+        stats['wait_times'].append(job['started_at'] - job['submitted_at'])
+    metrics_service.observe('lutrin_job_wait_seconds', job['started_at'] - job['submitted_at'], type=job['type'])
+
+    try:
+        result = func(*args, **kwargs)
+        status, error = 'done', None
+    except Exception as e:
+        result, status, error = None, 'error', repr(e)
+        Error(f"Le travail {job['type']} {job_id} a échoué : {error}")
+
+    with _jobs_lock:
+        job['status'] = status
+        job['result'] = result
+        job['error'] = error
+        job['finished_at'] = time.time()
+        stats['running'] -= 1
+        stats['completed' if status == 'done' else 'failed'] += 1
+    job['event'].set()
+
+    if status == 'done':
+        Success("Travail %s %s terminé en %.2fs", job['type'], job_id, job['finished_at'] - job['started_at'])
+
+def submit_job(job_type, func, *args, user_id=None, **kwargs):
+    """
+    Soumet un travail et retourne immédiatement son identifiant.
+    Lève QueueFullError si la file de ce type est pleine.
+    """
+
+    now = time.time()
+    with _jobs_lock:
+        pool = _get_pool(job_type)
+        stats = _stats[job_type]
+        if stats['queued'] >= JOB_QUEUE_MAX:
+            stats['rejected'] += 1
+            raise QueueFullError(f"File '{job_type}' pleine ({JOB_QUEUE_MAX} travaux en attente)")
+
+        _purge_finished(now)
+        job_id = uuid.uuid4().hex
+        _jobs[job_id] = {
+            "id": job_id,
+            "type": job_type,
+            "user_id": user_id,
+            "status": 'queued',
+            "submitted_at": now,
+            "started_at": None,
+            "finished_at": None,
+            "result": None,
+            "error": None,
+            "event": threading.Event(),
+        }
+        stats['queued'] += 1
+
+    pool.submit(_run_job, job_id, func, args, kwargs)
+    Log("Travail %s %s soumis (file: %d)", job_type, job_id, stats['queued'])
+    return job_id
+
+def get_job(job_id, user_id=None):
+    """
+    Retourne une vue sérialisable d'un travail, ou None s'il est inconnu
+    (ou appartient à un autre utilisateur).
+    """
+
+    with _jobs_lock:
+        job = _jobs.get(job_id)
+        if job is None or (user_id is not None and job['user_id'] != user_id):
+            return None
+        return {key: value for key, value in job.items() if key not in ('event', 'user_id')}
+
+def wait_for_job(job_id, timeout):
+    """Attend la fin d'un travail au plus `timeout` secondes. Retourne True s'il est terminé."""
+    with _jobs_lock:
+        job = _jobs.get(job_id)
+    return job is not None and job['event'].wait(timeout)
+
+def queue_stats():
+    """Profondeur des files, travaux en cours et temps d'attente par type de travail."""
+    with _jobs_lock:
+        result = {}
+        for job_type, stats in _stats.items():
+            waits = sorted(stats['wait_times'])
+            result[job_type] = {
+                **{key: value for key, value in stats.items() if key != 'wait_times'},
+                "wait_avg": round(sum(waits) / len(waits), 3) if waits else 0.0,
+                "wait_max": round(waits[-1], 3) if waits else 0.0,
+            }
+        return result
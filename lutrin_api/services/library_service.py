@@ -0,0 +1,204 @@
+# lutrin_api/services/library_service.py
+import re
+import json
+import time
+from .auth_service import get_db_connection
+from .logger_service import Log, Error, Success, Title
+
+def init_library_db():
+    """
+    Initialise les tables de la bibliothèque : livres, chapitres et index plein texte
+    (FTS5) des paragraphes.
+    """
+    Title("Initialisation de la bibliothèque EPUB")
+    try:
+        conn = get_db_connection()
+        conn.executescript('''
+            CREATE TABLE IF NOT EXISTS books (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id INTEGER NOT NULL,
+                title TEXT NOT NULL,
+                authors TEXT NOT NULL DEFAULT '[]',
+                metadata TEXT NOT NULL DEFAULT '{}',
+                cover_image TEXT,
+                chapter_count INTEGER NOT NULL DEFAULT 0,
+                created_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS books_user_idx ON books(user_id);
+
+            CREATE TABLE IF NOT EXISTS chapters (
+                book_id INTEGER NOT NULL REFERENCES books(id) ON DELETE CASCADE,
+                idx INTEGER NOT NULL,
+                title TEXT,
+                text TEXT NOT NULL,
+                paragraph_count INTEGER NOT NULL,
+                PRIMARY KEY (book_id, idx)
+            );
+
+            CREATE VIRTUAL TABLE IF NOT EXISTS paragraphs_fts USING fts5(
+                text,
+                book_id UNINDEXED,
+                chapter_idx UNINDEXED,
+                paragraph_idx UNINDEXED,
+                tokenize = 'unicode61 remove_diacritics 2'
+            );
+        ''')
+        conn.commit()
+        Success("Bibliothèque initialisée avec succès.")
+    except Exception as e:
+        Error(f"Erreur lors de l'initialisation de la bibliothèque : {e}")
+
+def add_book(user_id, metadata, cover_image, chapters):
+    """
+    Enregistre un livre, ses chapitres et l'index plein texte de ses paragraphes.
+    `chapters` est une liste de dictionnaires {'title': str|None, 'paragraphs': [str]}.
+    Retourne l'identifiant du livre, ou None en cas d'erreur.
+    """
+    conn = get_db_connection()
+    try:
+        cursor = conn.execute(
+            "INSERT INTO books (user_id, title, authors, metadata, cover_image, chapter_count, created_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (
+                user_id,
+                metadata.get('title') or "Titre inconnu",
+                json.dumps(metadata.get('authors') or [], ensure_ascii=False),
+                json.dumps(metadata, ensure_ascii=False),
+                cover_image,
+                len(chapters),
+                time.time(),
+            )
+        )
+        book_id = cursor.lastrowid
+
+        conn.executemany(
+            "INSERT INTO chapters (book_id, idx, title, text, paragraph_count) VALUES (?, ?, ?, ?, ?)",
+            [(book_id, idx, chapter.get('title'), "\n\n".join(chapter['paragraphs']), len(chapter['paragraphs']))
+             for idx, chapter in enumerate(chapters)]
+        )
+        conn.executemany(
+            "INSERT INTO paragraphs_fts (text, book_id, chapter_idx, paragraph_idx) VALUES (?, ?, ?, ?)",
+            [(paragraph, book_id, chapter_idx, paragraph_idx)
+             for chapter_idx, chapter in enumerate(chapters)
+             for paragraph_idx, paragraph in enumerate(chapter['paragraphs'])]
+        )
+        conn.commit()
+        Success(f"Livre #{book_id} enregistré dans la bibliothèque ({len(chapters)} chapitres).")
+        return book_id
+    except Exception as e:
+        conn.rollback()
+        Error(f"Erreur lors de l'enregistrement du livre dans la bibliothèque : {e}")
+        return None
+
+def _book_row_to_dict(row):
+    """Convertit une ligne de la table books en dictionnaire sérialisable."""
+    return {
+        "id": row['id'],
+        "title": row['title'],
+        "authors": json.loads(row['authors']),
+        "metadata": json.loads(row['metadata']),
+        "cover_image": row['cover_image'],
+        "chapter_count": row['chapter_count'],
+        "created_at": row['created_at'],
+    }
+
+def list_books(user_id):
+    """Liste les livres d'un utilisateur (sans leur texte)."""
+    rows = get_db_connection().execute(
+        "SELECT * FROM books WHERE user_id = ? ORDER BY title COLLATE NOCASE", (user_id,)
+    ).fetchall()
+    return [_book_row_to_dict(row) for row in rows]
+
+def get_book(user_id, book_id):
+    """Retourne un livre et la liste de ses chapitres (titres et tailles), ou None."""
+    conn = get_db_connection()
+    row = conn.execute("SELECT * FROM books WHERE id = ? AND user_id = ?", (book_id, user_id)).fetchone()
+    if row is None:
+        return None
+    book = _book_row_to_dict(row)
+    book['chapters'] = [
+        {"index": chapter['idx'], "title": chapter['title'], "paragraph_count": chapter['paragraph_count']}
+        for chapter in conn.execute(
+            "SELECT idx, title, paragraph_count FROM chapters WHERE book_id = ? ORDER BY idx", (book_id,)
+        )
+    ]
+    return book
+
+def get_chapter(user_id, book_id, chapter_idx):
+    """Retourne le texte d'un chapitre (et ses paragraphes), ou None."""
+    row = get_db_connection().execute(
+        '''SELECT c.idx, c.title, c.text FROM chapters c JOIN books b ON b.id = c.book_id
+           WHERE c.book_id = ? AND c.idx = ? AND b.user_id = ?''',
+        (book_id, chapter_idx, user_id)
+    ).fetchone()
+    if row is None:
+        return None
+    return {
+        "book_id": book_id,
+        "index": row['idx'],
+        "title": row['title'],
+        "text": row['text'],
+        "paragraphs": row['text'].split("\n\n") if row['text'] else [],
+    }
+
+def delete_book(user_id, book_id):
+    """Supprime un livre de la bibliothèque. Retourne True s'il existait."""
+    conn = get_db_connection()
+    try:
+        cursor = conn.execute("DELETE FROM books WHERE id = ? AND user_id = ?", (book_id, user_id))
+        if cursor.rowcount == 0:
+            conn.rollback()
+            return False
+        conn.execute("DELETE FROM chapters WHERE book_id = ?", (book_id,))
+        conn.execute("DELETE FROM paragraphs_fts WHERE book_id = ?", (book_id,))
+        conn.commit()
+        Log(f"Livre #{book_id} supprimé de la bibliothèque.")
+        return True
+    except Exception as e:
+        conn.rollback()
+        Error(f"Erreur lors de la suppression du livre #{book_id} : {e}")
+        return False
+
+def _fts_query(query):
+    """
+    Transforme une saisie libre en requête FTS5 sûre : chaque mot est cité (pas de
+    syntaxe FTS interprétée), le dernier est un préfixe pour la recherche à la frappe.
+    """
+    words = re.findall(r'\w+', query)
+    if not words:
+        return None
+    terms = [f'"{word}"' for word in words]
+    terms[-1] += '*'
+    return ' '.join(terms)
+
+def search(user_id, query, book_id=None, limit=20):
+    """
+    Recherche plein texte dans les livres d'un utilisateur (ou dans un seul livre).
+    Retourne les paragraphes les plus pertinents (BM25) avec un extrait surligné.
+    """
+    fts_query = _fts_query(query)
+    if not fts_query:
+        return []
+
+    sql = '''SELECT p.book_id, p.chapter_idx, p.paragraph_idx, b.title,
+                    snippet(paragraphs_fts, 0, '[', ']', '…', 16) AS snippet,
+                    bm25(paragraphs_fts) AS score
+             FROM paragraphs_fts p JOIN books b ON b.id = p.book_id
+             WHERE paragraphs_fts MATCH ? AND b.user_id = ?'''
+    params = [fts_query, user_id]
+    if book_id is not None:
+        sql += " AND p.book_id = ?"
+        params.append(book_id)
+    sql += " ORDER BY score LIMIT ?"
+    params.append(limit)
+
+    return [
+        {
+            "book_id": row['book_id'],
+            "book_title": row['title'],
+            "chapter_index": row['chapter_idx'],
+            "paragraph_index": row['paragraph_idx'],
+            "snippet": row['snippet'],
+            "score": round(-row['score'], 4),
+        }
+        for row in get_db_connection().execute(sql, params)
+    ]
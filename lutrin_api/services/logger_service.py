@@ -1,4 +1,23 @@
 import os
+import sys
+import json
+import time
+import queue
+import atexit
+import threading
+from datetime import datetime, timezone
+from ..config import LOG_LEVEL, LOG_FORMAT, LOG_MAX_CHARS, LOG_QUEUE_SIZE, LOG_RATE_LIMIT, LOG_RATE_WINDOW
+
+__all__ = ['BigTitle', 'Title', 'Line', 'Error', 'Warning', 'Success', 'Info', 'Log', 'Debug', 'stats', 'flush']
+
+# --- Journalisation asynchrone ---
+# Les fonctions ci-dessous ne font que déposer un enregistrement dans une file : la mise en forme
+# (y compris celle des arguments différés, ex: Log("Lot de %d images", n)), la troncature et
+# l'écriture sur stdout sont faites par un thread dédié. Un stdout lent ou redirigé ne bloque donc
+# jamais une requête ; si la file est pleine, le message est perdu et compté.
+# Un même appel (fichier et ligne) est limité à LOG_RATE_LIMIT messages par LOG_RATE_WINDOW
+# secondes ; le nombre de messages ignorés est indiqué avec le suivant.
+# LOG_FORMAT=json produit une ligne JSON par message (niveau, type, horodatage, thread, champs).
 
 COLOR_RESET = "\033[0m"
 COLOR_RED = "\033[91m"
@@ -7,58 +26,233 @@ COLOR_YELLOW = "\033[93m"
 COLOR_BLUE = "\033[94m"
 COLOR_CYAN = "\033[96m"
 
+DEBUG, INFO, WARNING, ERROR = 10, 20, 30, 40
+LEVELS = {'debug': DEBUG, 'info': INFO, 'warning': WARNING, 'error': ERROR}
+_LEVEL_NAMES = {value: name for name, value in LEVELS.items()}
+
+# Nombre maximal d'enregistrements écrits en une fois par le thread d'écriture
+WRITE_BATCH_SIZE = 256
+
+_level = LEVELS.get(LOG_LEVEL.lower(), INFO)
+_json = LOG_FORMAT.lower() == 'json'
+_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+_lock = threading.Lock()
+_writer = None
+_rates = {} # (fichier, ligne) -> [début de la fenêtre, messages émis, messages ignorés]
+_stats = {"written": 0, "dropped": 0, "suppressed": 0}
+_dropped_reported = 0
+_terminal_width = None
+
 def _get_terminal_width(default=150):
     """
-    Gets terminal width, with a fallback.
+    Gets terminal width (once), with a fallback.
+    """
+
+    global _terminal_width
+    if _terminal_width is None:
+        try:
+            _terminal_width = os.get_terminal_size().columns
+        except OSError:
+            _terminal_width = default
+    return _terminal_width
+
+def _sample(key, now):
+    """
+    Applies the rate limit of a call site (called under the lock).
+    Returns None if the message must be ignored, else the number of messages ignored before it.
     """
-    
+
+    rate = _rates.get(key)
+    if rate is None or now - rate[0] >= LOG_RATE_WINDOW:
+        suppressed = rate[2] if rate else 0
+        _rates[key] = [now, 1, 0]
+        return suppressed
+    if rate[1] >= LOG_RATE_LIMIT:
+        rate[2] += 1
+        _stats["suppressed"] += 1
+        return None
+    rate[1] += 1
+    return 0
+
+def _emit(level, kind, message, args, fields):
+    """Queues a record without formatting it. Never blocks the caller."""
+    if level < _level:
+        return
+    now = time.time()
+    suppressed = 0
+    if LOG_RATE_LIMIT > 0 and kind not in ('title', 'bigtitle', 'line'):
+        caller = sys._getframe(2)
+        with _lock:
+            suppressed = _sample((caller.f_code.co_filename, caller.f_lineno), now)
+        if suppressed is None:
+            return
+    if _writer is None:
+        _start_writer()
+    try:
+        _queue.put_nowait((now, level, kind, message, args, fields, suppressed, threading.current_thread().name))
+    except queue.Full:
+        with _lock:
+            _stats["dropped"] += 1
+
+def _truncate(text):
+    if LOG_MAX_CHARS and len(text) > LOG_MAX_CHARS:
+        return f"{text[:LOG_MAX_CHARS]}… ({len(text) - LOG_MAX_CHARS} caractères tronqués)"
+    return text
+
+def _message_text(message, args):
+    """Formats the message (deferred arguments in the % style), whatever its type."""
+    try:
+        text = message if isinstance(message, str) else repr(message)
+        if args:
+            text = text % args
+    except Exception as e:
+        text = f"{message!r} {args!r} (mise en forme impossible : {e!r})"
+    return _truncate(text)
+
+def _format_text(record):
+    """Colored line(s) for a terminal, as printed before the logs became asynchronous."""
+    _, level, kind, message, args, fields, suppressed, _ = record
+    if kind == 'line':
+        return message
+    text = _message_text(message, args)
+    if fields:
+        text += " " + " ".join(f"{key}={_truncate(str(value))}" for key, value in fields.items())
+    if suppressed:
+        text += f" ({suppressed} messages similaires ignorés)"
+    if kind == 'bigtitle':
+        width = _get_terminal_width()
+        line = "=" * width
+        title_text = f"== {text.upper()} "
+        padding = "=" * (width - len(title_text))
+        return f"{COLOR_GREEN}\n\n{line}\n{title_text}{padding}\n{line}{COLOR_RESET}"
+    if kind == 'title':
+        title_text = f"== {text.upper()} "
+        padding = "=" * (_get_terminal_width() - len(title_text))
+        return f"{COLOR_CYAN}\n{title_text}{padding}\n{COLOR_RESET}"
+    prefix, color = {
+        'error': ("ERREUR = ", COLOR_RED),
+        'warning': ("AVERTISSEMENT = ", COLOR_YELLOW),
+        'success': ("SUCCÈS = ", COLOR_GREEN),
+        'info': ("INFO = ", COLOR_BLUE),
+    }.get(kind, ("", None))
+    return f"{color}{prefix}{text}{COLOR_RESET}" if color else text
+
+def _format_json(record):
+    """One JSON object per line, for log collectors."""
+    created, level, kind, message, args, fields, suppressed, thread = record
+    if kind == 'line':
+        return None # Séparateur purement visuel
+    entry = {
+        "ts": datetime.fromtimestamp(created, timezone.utc).isoformat(timespec='milliseconds'),
+        "level": _LEVEL_NAMES[level],
+        "kind": kind,
+        "msg": _message_text(message, args),
+        "thread": thread,
+    }
+    for key, value in (fields or {}).items():
+        entry.setdefault(key, value if isinstance(value, (int, float, bool)) or value is None else _truncate(str(value)))
+    if suppressed:
+        entry["suppressed"] = suppressed
+    return json.dumps(entry, ensure_ascii=False)
+
+def _write(records):
+    global _dropped_reported
+    lines = []
+    for record in records:
+        try:
+            line = _format_json(record) if _json else _format_text(record)
+        except Exception as e:
+            line = f"Message de journal illisible : {e!r}"
+        if line is not None:
+            lines.append(line)
+    with _lock:
+        dropped, _dropped_reported = _stats["dropped"] - _dropped_reported, _stats["dropped"]
+        _stats["written"] += len(lines)
+    if dropped:
+        record = (time.time(), WARNING, 'warning', "%d messages perdus (file de journalisation pleine)", (dropped,), None, 0, 'logger')
+        lines.append(_format_json(record) if _json else _format_text(record))
+    if not lines:
+        return
     try:
-        return os.get_terminal_size().columns
-    except OSError:
-        return default
+        sys.stdout.write("\n".join(lines) + "\n")
+        sys.stdout.flush()
+    except (OSError, ValueError):
+        pass # stdout fermé ou pipe rompu : le journal est perdu, pas le serveur
 
-def _print_colored(message, color, prefix=""):
-    """Helper function to print a colored message."""
-    print(f"{color}{prefix}{message}{COLOR_RESET}")
+def _writer_loop():
+    while True:
+        records = [_queue.get()]
+        # Regroupe les enregistrements déjà en attente : une seule écriture pour tout le lot
+        while len(records) < WRITE_BATCH_SIZE:
+            try:
+                records.append(_queue.get_nowait())
+            except queue.Empty:
+                break
+        _write(records)
+        for _ in records:
+            _queue.task_done()
 
-def BigTitle(message):
+def _start_writer():
+    global _writer
+    with _lock:
+        if _writer is None:
+            _writer = threading.Thread(target=_writer_loop, name="logger", daemon=True)
+            _writer.start()
+
+def flush(timeout=2):
+    """Waits (at most `timeout` seconds) until the queued messages are written."""
+    if _writer is None:
+        return
+    deadline = time.monotonic() + timeout
+    while _queue.unfinished_tasks and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+def stats():
+    """Messages written, waiting, dropped (queue full) and ignored by the rate limit."""
+    with _lock:
+        return {
+            "level": _LEVEL_NAMES[_level],
+            "format": 'json' if _json else 'text',
+            "queued": _queue.qsize(),
+            "written": _stats["written"],
+            "dropped": _stats["dropped"],
+            "suppressed": _stats["suppressed"],
+        }
+
+atexit.register(flush)
+
+def BigTitle(message, *args, **fields):
     """Prints a large, formatted title that adapts to terminal width (in green)."""
-    width = _get_terminal_width()
-    line = "=" * width
-    
-    # Prépare le message et calcule le remplissage
-    title_text = f"== {message.upper()} "
-    padding = "=" * (width - len(title_text))
-    
-    _print_colored(f"\n\n{line}\n{title_text}{padding}\n{line}", COLOR_GREEN)
-
-def Title(message):
+    _emit(INFO, 'bigtitle', message, args, fields)
+
+def Title(message, *args, **fields):
     """Prints a regular, formatted title that adapts to terminal width (in cyan)."""
-    width = _get_terminal_width()
-    title_text = f"== {message.upper()} "
-    padding = "=" * (width - len(title_text))
-    _print_colored(f"\n{title_text}{padding}\n", COLOR_CYAN)
+    _emit(INFO, 'title', message, args, fields)
 
 def Line(character='-', length=70):
     """Prints a separator line."""
-    print(character * length)
+    _emit(INFO, 'line', character * length, (), None)
 
-def Error(message):
+def Error(message, *args, **fields):
     """Prints an error message in red."""
-    _print_colored(f"ERREUR = {message}", COLOR_RED)
+    _emit(ERROR, 'error', message, args, fields)
 
-def Warning(message):
+def Warning(message, *args, **fields):
     """Prints a warning message in yellow."""
-    _print_colored(f"AVERTISSEMENT = {message}", COLOR_YELLOW)
+    _emit(WARNING, 'warning', message, args, fields)
 
-def Success(message):
+def Success(message, *args, **fields):
     """Prints a success message in green."""
-    _print_colored(f"SUCCÈS = {message}", COLOR_GREEN)
+    _emit(INFO, 'success', message, args, fields)
 
-def Info(message):
+def Info(message, *args, **fields):
     """Prints an informational message in blue."""
-    _print_colored(f"INFO = {message}", COLOR_BLUE)
+    _emit(INFO, 'info', message, args, fields)
 
-def Log(message):
+def Log(message, *args, **fields):
     """Prints a standard log message without special formatting."""
-    print(message)
\ No newline at end of file
+    _emit(INFO, 'log', message, args, fields)
+
+def Debug(message, *args, **fields):
+    """Prints a detail message (payloads, intermediate results), only if LOG_LEVEL=debug."""
+    _emit(DEBUG, 'debug', message, args, fields)
@@ -0,0 +1,168 @@
+# lutrin_api/services/metrics_service.py
+import time
+import bisect
+import threading
+from contextlib import contextmanager
+
+# --- Métriques (format texte Prometheus, exposé par /metrics) ---
+# Compteurs et histogrammes en mémoire, alimentés par les services à chaque étape coûteuse
+# (upload, OCR Paddle et Groq, remise en ordre des pages, synthèses Piper et Coqui, EPUB,
+# authentification). Les quantiles (p50, p99) se calculent à partir des histogrammes :
+# histogram_quantile() côté Prometheus, ou stage_quantiles() pour /status.
+
+# Bornes (en secondes) des histogrammes de durée : de 1 ms à 5 min
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+# Bornes (en octets) des histogrammes de taille : de 16 Ko à 256 Mo
+SIZE_BUCKETS = tuple(16 * 1024 * 4 ** n for n in range(8))
+
+# Nom -> (type, description, bornes des histogrammes)
+METRICS = {
+    'lutrin_stage_duration_seconds': ('histogram', "Durée des étapes de traitement, par étape", LATENCY_BUCKETS),
+    'lutrin_stage_errors_total': ('counter', "Étapes terminées par une exception, par étape", None),
+    'lutrin_http_request_duration_seconds': ('histogram', "Durée des requêtes HTTP jusqu'à l'envoi des en-têtes, par route", LATENCY_BUCKETS),
+    'lutrin_http_requests_total': ('counter', "Requêtes HTTP, par route et code de statut", None),
+    'lutrin_upload_size_bytes': ('histogram', "Taille des fichiers envoyés, par route", SIZE_BUCKETS),
+    'lutrin_ocr_images_total': ('counter', "Images traitées par PaddleOCR", None),
+    'lutrin_ocr_batches_total': ('counter', "Lots d'images soumis à PaddleOCR", None),
+    'lutrin_job_wait_seconds': ('histogram', "Attente des travaux asynchrones dans leur file, par type", LATENCY_BUCKETS),
+}
+
+class Histogram:
+    """Histogramme à bornes fixes (comptes par intervalle, somme et nombre d'observations)."""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1) # Dernier intervalle : au-delà de la plus grande borne
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q):
+        """Quantile estimé par interpolation linéaire dans l'intervalle qui le contient."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        cumulative = 0
+        for index, count in enumerate(self.counts):
+            if cumulative + count >= rank and count:
+                lower = self.buckets[index - 1] if index > 0 else 0.0
+                if index == len(self.buckets):
+                    return lower # Au-delà de la plus grande borne : on ne peut que la donner
+                return lower + (self.buckets[index] - lower) * (rank - cumulative) / count
+            cumulative += count
+        return self.buckets[-1]
+
+_lock = threading.Lock()
+_histograms = {} # (nom, étiquettes) -> Histogram
+_counters = {} # (nom, étiquettes) -> valeur
+
+def _labels_key(labels):
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+def observe(name, value, **labels):
+    """Ajoute une observation à l'histogramme `name` (déclaré dans METRICS)."""
+    key = (name, _labels_key(labels))
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = Histogram(METRICS[name][2])
+        histogram.observe(value)
+
+def inc(name, value=1, **labels):
+    """Incrémente le compteur `name` (déclaré dans METRICS)."""
+    key = (name, _labels_key(labels))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+def observe_stage(stage, seconds):
+    """Enregistre la durée d'une étape de traitement."""
+    observe('lutrin_stage_duration_seconds', seconds, stage=stage)
+
+@contextmanager
+def timed(stage):
+    """
+    Mesure la durée d'une étape (bloc `with` ou décorateur de fonction).
+    Une exception est comptée dans lutrin_stage_errors_total puis propagée.
+    """
+
+    start = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        inc('lutrin_stage_errors_total', stage=stage)
+        raise
+    finally:
+        observe_stage(stage, time.perf_counter() - start)
+
+def stage_quantiles():
+    """Nombre d'observations, moyenne, p50 et p99 (en secondes) de chaque étape."""
+    with _lock:
+        return {
+            dict(labels)['stage']: {
+                "count": histogram.count,
+                "avg": round(histogram.sum / histogram.count, 4) if histogram.count else 0.0,
+                "p50": round(histogram.quantile(0.5), 4),
+                "p99": round(histogram.quantile(0.99), 4),
+            }
+            for (name, labels), histogram in sorted(_histograms.items())
+            if name == 'lutrin_stage_duration_seconds'
+        }
+
+def _escape(value):
+    """Échappe une valeur d'étiquette (barres obliques inverses, guillemets, sauts de ligne)."""
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (f'{key}="{_escape(value)}"' for key, value in pairs)
+    return '{' + ','.join(escaped) + '}'
+
+def _format_value(value):
+    if isinstance(value, bool):
+        return '1' if value else '0'
+    if isinstance(value, float):
+        return repr(value)
+    return str(value)
+
+def render(families=()):
+    """
+    Texte au format d'exposition Prometheus : métriques enregistrées, puis familles
+    calculées à la demande, sous la forme (nom, type, description, [(étiquettes, valeur)]).
+    """
+
+    with _lock:
+        histograms = {key: (list(h.counts), h.sum, h.count) for key, h in _histograms.items()}
+        counters = dict(_counters)
+
+    lines = []
+    for name, (metric_type, description, buckets) in METRICS.items():
+        lines.append(f"# HELP {name} {description}")
+        lines.append(f"# TYPE {name} {metric_type}")
+        if metric_type == 'histogram':
+            for (metric, labels), (counts, total, count) in sorted(histograms.items()):
+                if metric != name:
+                    continue
+                cumulative = 0
+                for bound, bucket_count in zip(buckets, counts):
+                    cumulative += bucket_count
+                    lines.append(f"{name}_bucket{_format_labels(labels, [('le', _format_value(float(bound)))])} {cumulative}")
+                lines.append(f"{name}_bucket{_format_labels(labels, [('le', '+Inf')])} {count}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(float(total))}")
+                lines.append(f"{name}_count{_format_labels(labels)} {count}")
+        else:
+            for (metric, labels), value in sorted(counters.items()):
+                if metric == name:
+                    lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+
+    for name, metric_type, description, samples in families:
+        lines.append(f"# HELP {name} {description}")
+        lines.append(f"# TYPE {name} {metric_type}")
+        for labels, value in samples:
+            lines.append(f"{name}{_format_labels(_labels_key(labels))} {_format_value(value)}")
+    return "\n".join(lines) + "\n"
@@ -1,16 +1,29 @@
 # lutrin_api/services/ocr_service.py
 import os
+import time
+import queue
+import io
 import base64
+import threading
+import numpy as np
 import onnxruntime
-import requests
-from groq import Groq
+from PIL import Image
 from paddleocr import PaddleOCR
+from concurrent.futures import Future
 from .logger_service import *
-from ..config import UPLOAD_FOLDER, GROQ_TOKEN
+from . import http_service, artifact_service, metrics_service
+from ..config import UPLOAD_FOLDER, GROQ_TOKEN, OCR_BATCH_MAX_SIZE, OCR_BATCH_MAX_WAIT_MS
 
 # --- Initialisation des moteurs OCR (chargés une seule fois au démarrage) ---
 ocr_engine = None
 
+# --- Répartiteur PaddleOCR ---
+# Un seul thread utilise le moteur : les requêtes concurrentes sont regroupées en lots
+# (au plus OCR_BATCH_MAX_SIZE images, attente d'au plus OCR_BATCH_MAX_WAIT_MS) passés en
+# un seul appel à predict(), puis les résultats sont redistribués à chaque appelant.
+_ocr_queue = queue.Queue()
+_dispatcher_thread = None
+
 def init_ocr_engine():
     """Initialise le moteur PaddleOCR. Appelé au démarrage du serveur."""
     global ocr_engine
@@ -24,10 +37,159 @@ def init_ocr_engine():
         except Exception as e:
             Error(f"Impossible de charger le moteur PaddleOCR. Détails: {e}. Le moteur Paddle sera indisponible.")
 
+    global _dispatcher_thread
+    if ocr_engine is not None and _dispatcher_thread is None:
+        _dispatcher_thread = threading.Thread(target=_dispatch_ocr_batches, name="ocr-dispatcher", daemon=True)
+        _dispatcher_thread.start()
+
+def _collect_batch():
+    """
+    Attend une première requête, puis regroupe celles qui arrivent dans la fenêtre
+    d'attente, dans la limite de la taille maximale d'un lot.
+    """
+
+    batch = [_ocr_queue.get()]
+    deadline = time.monotonic() + OCR_BATCH_MAX_WAIT_MS / 1000
+    while len(batch) < OCR_BATCH_MAX_SIZE:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        try:
+            batch.append(_ocr_queue.get(timeout=remaining))
+        except queue.Empty:
+            break
+    return batch
+
+def _dispatch_ocr_batches():
+    """Boucle du thread répartiteur : seul ce thread appelle ocr_engine.predict()."""
+    while True:
+        batch = _collect_batch()
+        inputs = [image for image, _ in batch]
+        try:
+            with metrics_service.timed('paddle_predict'):
+                results = list(ocr_engine.predict(inputs))
+            metrics_service.inc('lutrin_ocr_batches_total')
+            metrics_service.inc('lutrin_ocr_images_total', len(batch))
+            if len(results) != len(batch):
+                raise RuntimeError(f"{len(results)} résultats pour un lot de {len(batch)} images")
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
+        except Exception as e:
+            if len(batch) == 1:
+                batch[0][1].set_exception(e)
+                continue
+            # Échec du lot : on reprend image par image pour isoler l'image fautive
+            Warning(f"Échec du lot OCR ({len(batch)} images), traitement individuel : {e}")
+            for image, future in batch:
+                try:
+                    with metrics_service.timed('paddle_predict'):
+                        future.set_result(list(ocr_engine.predict(image))[0])
+                    metrics_service.inc('lutrin_ocr_batches_total')
+                    metrics_service.inc('lutrin_ocr_images_total')
+                except Exception as single_e:
+                    future.set_exception(single_e)
+
+def queue_depth():
+    """Nombre d'images en attente du répartiteur PaddleOCR."""
+    return _ocr_queue.qsize()
+
+def _predict(image):
+    """
+    Soumet une image (chemin ou tableau NumPy) au répartiteur et attend son résultat.
+    Retourne une liste d'un résultat, au format attendu par _reordonner_double_page.
+    """
+
+    future = Future()
+    _ocr_queue.put((image, future))
+    return [future.result()]
+
+# Paramètres de reconstruction de la mise en page
+GUTTER_BINS = 200               # Résolution de l'histogramme de couverture horizontale
+GUTTER_SEARCH_ZONE = (0.3, 0.7) # Zone (fraction de la largeur du texte) où chercher la gouttière
+GUTTER_MAX_COVERAGE = 0.15      # Couverture maximale de la gouttière, relative à celle des pages
+GUTTER_MIN_BOXES = 3            # Boîtes minimales de chaque côté de la gouttière (sinon page simple)
+PARAGRAPH_GAP_RATIO = 0.8       # Interligne (en hauteur de ligne médiane) marquant un nouveau paragraphe
+TALL_BOX_RATIO = 1.5            # Hauteur (en hauteur de boîte médiane) au-delà de laquelle une boîte est ramenée à sa première ligne
+
+def _boxes_from_polys(polys):
+    """
+    Empile les polygones en un tableau (n, 4) de boîtes englobantes [x0, y0, x1, y1].
+    """
+
+    try:
+        points = np.asarray(polys, dtype=np.float32)
+        if points.ndim == 3:
+            return np.concatenate([points.min(axis=1), points.max(axis=1)], axis=1)
+    except ValueError:
+        pass
+    # Polygones de tailles différentes : calcul boîte par boîte
+    return np.array([[p[:, 0].min(), p[:, 1].min(), p[:, 0].max(), p[:, 1].max()] for p in polys], dtype=np.float32)
+
+def _find_gutter(x0, x1):
+    """
+    Cherche la gouttière d'une double page dans l'histogramme de couverture horizontale
+    des boîtes : une vallée (quasi) vide dans la partie centrale du texte.
+    Retourne sa position X, ou None s'il s'agit d'une page simple.
+    """
+
+    left, right = x0.min(), x1.max()
+    width = right - left
+    if width <= 0 or len(x0) < 2 * GUTTER_MIN_BOXES:
+        return None
+
+    # Couverture : nombre de boîtes recouvrant chaque tranche verticale de l'image
+    scale = GUTTER_BINS / width
+    starts = np.clip(((x0 - left) * scale).astype(np.int64), 0, GUTTER_BINS - 1)
+    ends = np.clip(((x1 - left) * scale).astype(np.int64), 0, GUTTER_BINS - 1)
+    delta = np.zeros(GUTTER_BINS + 1, dtype=np.int64)
+    np.add.at(delta, starts, 1)
+    np.add.at(delta, ends + 1, -1)
+    coverage = np.cumsum(delta[:-1])
+
+    lo, hi = int(GUTTER_SEARCH_ZONE[0] * GUTTER_BINS), int(GUTTER_SEARCH_ZONE[1] * GUTTER_BINS)
+    zone = coverage[lo:hi]
+    valley = zone.min()
+    reference = np.median(coverage[coverage > 0])
+    if valley > GUTTER_MAX_COVERAGE * reference:
+        return None
+
+    # Centre de la plus longue suite de tranches au minimum de couverture
+    is_min = np.concatenate(([0], (zone == valley).astype(np.int8), [0]))
+    edges = np.flatnonzero(np.diff(is_min))
+    run_starts, run_ends = edges[::2], edges[1::2]
+    longest = np.argmax(run_ends - run_starts)
+    gutter_bin = lo + (run_starts[longest] + run_ends[longest]) / 2
+    gutter = left + gutter_bin / scale
+
+    # Une vallée entre quelques boîtes isolées (ex: deux mots sur une ligne) n'est pas une gouttière
+    centers = (x0 + x1) / 2
+    left_count = int(np.count_nonzero(centers < gutter))
+    if min(left_count, len(centers) - left_count) < GUTTER_MIN_BOXES:
+        return None
+    return gutter
+
+def _join_lines(lines):
+    """
+    Joint les lignes d'un paragraphe par des espaces, en recollant les mots coupés
+    en fin de ligne ("débar-" + "rasse" -> "débarrasse").
+    """
+
+    text = ""
+    for line in lines:
+        if text.endswith('-') and line[:1].islower():
+            text = text[:-1] + line
+        else:
+            text = f"{text} {line}" if text else line
+    return text
+
+@metrics_service.timed('ocr_reorder')
 def _reordonner_double_page(resultat_ocr):
     """
-    Réorganise le texte d'une double page scannée en supposant un milieu
-    horizontal de l'image (l'axe Y) comme séparateur de page.
+    Reconstruit l'ordre de lecture d'une page ou d'une double page scannée.
+    Les boîtes sont traitées en bloc (NumPy) : la gouttière est détectée dans
+    l'histogramme de couverture horizontale (livre pas forcément centré), puis les
+    boîtes sont regroupées en lignes par recouvrement vertical et les lignes en
+    paragraphes selon l'interligne. Les paragraphes sont séparés par des sauts de ligne.
     """
 
     if not resultat_ocr:
@@ -40,63 +202,96 @@ def _reordonner_double_page(resultat_ocr):
     textes = res.get('rec_texts', [])
     polys = res.get('rec_polys', [])
     
-    if not textes or not polys:
+    if len(textes) == 0 or len(polys) == 0:
         return "Aucun texte trouvé."
 
-    # 1. Calculer la largeur maximale de l'image pour déterminer le milieu
-    # On prend la coordonnée X maximale parmi toutes les boîtes (approximatif mais suffisant)
-    max_x = max(p[:, 0].max() for p in polys)
-    
-    # Déterminer la position centrale de l'image (la "gouttière")
-    centre_x = max_x / 2
-
-    # 2. Préparer les données
-    fragments = []
-    for texte, poly in zip(textes, polys):
-        # Calculer le centre horizontal (x_centre) et la coordonnée verticale supérieure (y_top)
-        x_centre = poly[:, 0].mean()
-        y_top = poly[:, 1].min()
-        
-        # Déterminer la page (0 pour gauche, 1 pour droite)
-        page = 1 if x_centre > centre_x else 0
-        
-        fragments.append({
-            'texte': texte,
-            'page': page,
-            'y_top': y_top
-        })
-
-    # 3. Trier les fragments : d'abord par page (0 puis 1), puis par position verticale (y_top croissant)
-    fragments_tries = sorted(fragments, key=lambda f: (f['page'], f['y_top']))
-
-    # 4. Concaténer le texte
-    texte_final = ' '.join(f['texte'] for f in fragments_tries)
-    
-    return texte_final
-
-def _delete_old_files(user_id):
+    # 1. Boîtes englobantes de tous les fragments en un seul tableau
+    boxes = _boxes_from_polys(polys)
+    x0, y0, x1, y1 = boxes.T
+    x_centre = (x0 + x1) / 2
+
+    # Une boîte haute (lettrine, image légendée) couvre plusieurs lignes : pour le regroupement,
+    # elle est ramenée à une boîte de hauteur médiane alignée sur son haut (sa première ligne),
+    # sinon son bas absorberait toutes les lignes qu'elle recouvre
+    median_box_height = np.median(y1 - y0)
+    y1 = np.where(y1 - y0 > TALL_BOX_RATIO * median_box_height, y0 + median_box_height, y1)
+    y_centre = (y0 + y1) / 2
+
+    # 2. Page de chaque fragment (0 pour gauche, 1 pour droite), selon la gouttière détectée
+    gutter = _find_gutter(x0, x1)
+    page = (x_centre > gutter).astype(np.int64) if gutter is not None else np.zeros(len(boxes), dtype=np.int64)
+
+    # 3. Lignes : par page, on trie par centre vertical ; une boîte ouvre une nouvelle ligne
+    #    si son centre est sous le bas de toutes les boîtes précédentes. Les pages sont
+    #    décalées verticalement pour que le maximum cumulé ne déborde pas d'une page à l'autre.
+    page_offset = page * 2 * (y1.max() - y0.min() + 1)
+    order = np.lexsort((y_centre, page))
+    shifted_centre = (y_centre + page_offset)[order]
+    shifted_bottom = (y1 + page_offset)[order]
+    new_line = np.r_[True, shifted_centre[1:] > np.maximum.accumulate(shifted_bottom)[:-1]]
+    line_id = np.empty(len(order), dtype=np.int64)
+    line_id[order] = np.cumsum(new_line) - 1
+
+    # 4. Ordre de lecture : page, ligne, puis position horizontale dans la ligne
+    reading_order = np.lexsort((x0, line_id))
+
+    # 5. Paragraphes : un interligne nettement supérieur à la hauteur médiane d'une ligne
+    #    (ou un changement de page) ouvre un nouveau paragraphe
+    n_lines = line_id.max() + 1
+    line_top = np.full(n_lines, np.inf)
+    line_bottom = np.full(n_lines, -np.inf)
+    np.minimum.at(line_top, line_id, y0)
+    np.maximum.at(line_bottom, line_id, y1)
+    line_page = np.zeros(n_lines, dtype=np.int64)
+    line_page[line_id] = page
+    median_height = np.median(line_bottom - line_top)
+    gaps = line_top[1:] - line_bottom[:-1]
+    new_paragraph = np.r_[True, (gaps > PARAGRAPH_GAP_RATIO * median_height) | (line_page[1:] != line_page[:-1])]
+
+    # 6. Assemblage du texte
+    lines = [[] for _ in range(n_lines)]
+    for i in reading_order:
+        lines[line_id[i]].append(textes[i])
+
+    paragraphs = []
+    for index, fragments in enumerate(lines):
+        line = ' '.join(fragments)
+        if new_paragraph[index] or not paragraphs:
+            paragraphs.append([line])
+        else:
+            paragraphs[-1].append(line)
+
+    return '\n'.join(_join_lines(paragraph) for paragraph in paragraphs)
+
+def _save_text(output_filename, text):
     """
-    Supprime les anciens fichiers de résultat OCR pour un utilisateur spécifique.
+    Écrit le texte dans UPLOAD_FOLDER et retourne son chemin.
+    Ne fait rien (et retourne None) si aucun nom de fichier n'est fourni.
     """
 
-    Title(f"Nettoyage des anciens fichiers OCR pour l'utilisateur ID: {user_id}")
+    if not output_filename:
+        return None
+    text_output_path = os.path.join(UPLOAD_FOLDER, output_filename)
+    with open(text_output_path, 'w', encoding='utf-8') as f:
+        f.write(text)
+    artifact_service.register(text_output_path)
+    return text_output_path
 
-    # On parcourt tous les fichiers dans le dossier UPLOAD_FOLDER
-    ocr_prefix_to_delete = f"ocr_result_{user_id}_"
-
-    for filename in os.listdir(UPLOAD_FOLDER):
-        if filename.startswith(ocr_prefix_to_delete):
-            try:
-                file_path_to_delete = os.path.join(UPLOAD_FOLDER, filename)
-                os.remove(file_path_to_delete)
-                Log(f"Suppression = {file_path_to_delete}")
-            except OSError as e:
-                Error(f"Suppression du fichier impossible {filename} = {e}")
+def _decode_image(image_bytes):
+    """
+    Décode une image (JPEG, PNG...) en mémoire vers un tableau NumPy BGR,
+    le format attendu par PaddleOCR.
+    """
 
+    with Image.open(io.BytesIO(image_bytes)) as image:
+        rgb = np.asarray(image.convert('RGB'))
+    return np.ascontiguousarray(rgb[:, :, ::-1])
 
-def _ocr_image_groq(filepath, output_filename): # Renommé de ocr_image_ia à _ocr_image_groq
+def _ocr_image_groq(image_bytes, output_filename=None): # Renommé de ocr_image_ia à _ocr_image_groq
     """
     Point d'entrée pour l'OCR via une API externe (Groq).
+    Prend le contenu de l'image en mémoire ; le texte n'est écrit sur disque que si
+    un nom de fichier de sortie est fourni.
     """
 
     # Tester la présence du tocken
@@ -104,25 +299,22 @@ def _ocr_image_groq(filepath, output_filename): # Renommé de ocr_image_ia à _o
     if not GROQ_TOKEN:
         error_msg = "Le jeton d'API Groq est manquant dans la configuration."
         Error(error_msg)
-        text_output_path = os.path.join(UPLOAD_FOLDER, output_filename)
-        with open(text_output_path, 'w', encoding='utf-8') as f:
-            f.write(error_msg)
-        return error_msg, text_output_path
+        return error_msg, _save_text(output_filename, error_msg)
 
     # Traitement l'image par Groq
     try:
         Title("Traitement de l'image par Groq")
-        client = Groq(api_key=GROQ_TOKEN)
+        client = http_service.groq_client()
 
-        # Lire l'image et l'encoder en base64
-        with open(filepath, "rb") as image_file:
-            encoded_image = base64.b64encode(image_file.read()).decode('utf-8')
+        # Encoder l'image en base64
+        encoded_image = base64.b64encode(image_bytes).decode('utf-8')
         image_data_url = f"data:image/jpeg;base64,{encoded_image}"
-        Log(f"Image encodée en base64 (taille: {len(encoded_image)}).")
+        Log("Image encodée en base64 (taille: %d).", len(encoded_image))
 
         # Envoyer la requête à Groq via la librairie Python
         Log("Envoi de la requête à l'API Groq")
-        chat_completion = client.chat.completions.create(
+        groq_start = time.perf_counter()
+        chat_completion = http_service.call('groq', client.chat.completions.create,
             messages=[
                  {
                      "role": "user",
@@ -152,6 +344,7 @@ Retourne uniquement le texte extrait, propre et lisible."""
             temperature=0.2,
             max_tokens=4000
         )
+        metrics_service.observe_stage('groq_ocr', time.perf_counter() - groq_start)
         Log("Réponse Groq reçue.")
 
         # Extraire le texte
@@ -161,12 +354,10 @@ Retourne uniquement le texte extrait, propre et lisible."""
         if not extracted_text or not extracted_text.strip():
             extracted_text = "Aucun texte trouvé"
 
-        Log(f"Texte extrait = {extracted_text[:300]}...")
-        text_output_path = os.path.join(UPLOAD_FOLDER, output_filename)
-        with open(text_output_path, 'w', encoding='utf-8') as f:
-            f.write(extracted_text)
-
-        Success(f"Texte OCR sauvegardé dans = {text_output_path}")
+        Log("Texte extrait = %s...", extracted_text[:300])
+        text_output_path = _save_text(output_filename, extracted_text)
+        if text_output_path:
+            Success(f"Texte OCR sauvegardé dans = {text_output_path}")
         return extracted_text, text_output_path
 
     except Exception as e:
@@ -174,27 +365,26 @@ Retourne uniquement le texte extrait, propre et lisible."""
         Error(f"{error_msg}")
         return "", error_msg
 
-def _ocr_image_paddle(filepath, output_filename): 
+def _ocr_image_paddle(image, output_filename=None):
     """
     Exécute la reconnaissance de caractères (OCR) sur l'image fournie avec PaddleOCR.
-    Écrit le texte reconnu dans un fichier et retourne le texte et le chemin du fichier.
+    L'image est un chemin de fichier ou un tableau NumPy (BGR) déjà décodé en mémoire.
+    Écrit le texte reconnu dans un fichier si un nom est fourni, et retourne le texte
+    et le chemin du fichier (ou None).
     """
 
     # Tester la précence de paddle
     if not ocr_engine:
         error_msg = "Le moteur PaddleOCR) n'est pas initialisé"
         Error(f"{error_msg}")
-        text_output_path = os.path.join(UPLOAD_FOLDER, output_filename)
-        with open(text_output_path, 'w', encoding='utf-8') as f:
-            f.write(error_msg)
-        return error_msg, text_output_path
+        return error_msg, _save_text(output_filename, error_msg)
 
 
     # Traitement l'image par Paddle
     Title("Traitement de l'image par Paddle")
     try:
-        # Exécution de PaddleOCR sur le fichier image qui retourne un objet plus structuré.
-        result = ocr_engine.predict(filepath)
+        # Exécution de PaddleOCR (via le répartiteur par lots) qui retourne un objet structuré.
+        result = _predict(image)
 
         # Déterminer les textes de pages gauche et droite
         full_text=_reordonner_double_page(result)
@@ -203,15 +393,13 @@ def _ocr_image_paddle(filepath, output_filename):
         if not full_text or not full_text.strip():
             full_text = "Aucun texte trouvée"
         
-        Log(f"Texte extrait = {full_text[:300]}...")
+        Log("Texte extrait = %s...", full_text[:300])
 
         # Écrire le texte reconnu dans le fichier spécifié
-        text_output_path = os.path.join(UPLOAD_FOLDER, output_filename)
-        with open(text_output_path, 'w', encoding='utf-8') as f:
-            f.write(full_text)
+        text_output_path = _save_text(output_filename, full_text)
+        if text_output_path:
+            Success(f"Texte OCR sauvegardé dans = {text_output_path}")
 
-        Success(f"Texte OCR sauvegardé dans = {text_output_path}")
-       
         # Retourner le texte et le chemin du fichier
         return full_text, text_output_path
     except Exception as e:
@@ -219,18 +407,35 @@ def _ocr_image_paddle(filepath, output_filename):
         Error(error_msg)
         return "", error_msg
 
-def ocr_image(filepath, output_filename, ocr_engine_choice='paddle', user_id=None):
+def ocr_image(filepath, output_filename, ocr_engine_choice='paddle'):
     """
     Aiguilleur principal pour le service OCR.
     Appelle le moteur local (PaddleOCR) ou une API externe en fonction de la configuration.
     """
 
     BigTitle(f"Traitement OCR avec le moteur : {ocr_engine_choice.upper()}")
-    if user_id:
-        # Suppression des anciens fichiers de l'utilisateur
-        _delete_old_files(user_id)
-    
     if ocr_engine_choice == 'groq':
-        return _ocr_image_groq(filepath, output_filename)
+        with open(filepath, "rb") as image_file:
+            return _ocr_image_groq(image_file.read(), output_filename)
     else:
         return _ocr_image_paddle(filepath, output_filename)
+
+def ocr_image_bytes(image_bytes, ocr_engine_choice='paddle', output_filename=None):
+    """
+    OCR d'une image reçue en mémoire, sans passage par le disque : l'image est décodée
+    en tableau NumPy et transmise directement au moteur. Le texte n'est écrit dans
+    UPLOAD_FOLDER que si `output_filename` est fourni.
+    """
+
+    BigTitle(f"Traitement OCR en mémoire avec le moteur : {ocr_engine_choice.upper()}")
+
+    if ocr_engine_choice == 'groq':
+        return _ocr_image_groq(image_bytes, output_filename)
+
+    try:
+        image = _decode_image(image_bytes)
+    except Exception as e:
+        error_msg = f"Image illisible: {e}"
+        Error(error_msg)
+        return "", error_msg
+    return _ocr_image_paddle(image, output_filename)
@@ -1,18 +1,135 @@
 import os
+import re
 import wave
+import time
+import queue
+import struct
+import secrets
+import tempfile
+import threading
+import multiprocessing
 import onnxruntime
 import requests
 
 from piper.voice import PiperVoice
-from .logger_service import BigTitle, Title, Error, Success, Log
-from ..config import UPLOAD_FOLDER, PIPER_MODEL, COQUI_TTS_URL
+from .logger_service import BigTitle, Title, Error, Warning, Success, Log
+from .cache_service import CacheBudget, FileCache, make_key
+from . import http_service, audio_service, metrics_service
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait
+from ..config import (
+    UPLOAD_FOLDER, PIPER_MODEL, PIPER_WORKERS, TTS_CACHE_FOLDER, TTS_CACHE_MAX_MB,
+    COQUI_TTS_URLS, COQUI_SPEAKER, COQUI_LANGUAGE, COQUI_CHUNK_CHARS, COQUI_WORKERS
+)
 
 # --- Initialisation des modèles TTS (chargés une seule fois au démarrage) ---
 voice = None
+piper_pool = None
+
+# Budget disque commun à tous les formats : l'éviction retire le fichier le moins récemment
+# utilisé, qu'il soit en WAV, en MP3 ou en Opus
+audio_cache_budget = CacheBudget(TTS_CACHE_MAX_MB * 1024 * 1024)
+
+# Cache des fichiers audio générés, adressé par (texte normalisé, moteur, voix, version du modèle)
+audio_cache = FileCache(TTS_CACHE_FOLDER, extension='.wav', budget=audio_cache_budget)
+
+# Versions compressées (MP3, Opus), même clé, dans un sous-dossier du cache par format
+encoded_caches = {
+    audio_format: FileCache(os.path.join(TTS_CACHE_FOLDER, audio_format), extension=spec["extension"], budget=audio_cache_budget)
+    for audio_format, spec in audio_service.AUDIO_FORMATS.items() if audio_format != 'wav'
+}
+
+# Modèle utilisé par le serveur Coqui (voir lutrin_coqui/docker-compose.yml)
+COQUI_MODEL = "xtts_v2"
+
+# Requêtes Coqui simultanées (morceaux d'un même texte, toutes requêtes confondues)
+_coqui_pool = ThreadPoolExecutor(max_workers=max(1, COQUI_WORKERS), thread_name_prefix="coqui")
+
+# Taille minimale (en caractères) d'un segment envoyé à un processus Piper
+PIPER_SEGMENT_MIN_CHARS = 200
+
+# Voix Piper propre à chaque processus du pool (initialisée par _init_piper_worker)
+_worker_voice = None
+
+# --- Flux audio en attente (jeton à usage unique -> texte à synthétiser) ---
+STREAM_TOKEN_TTL = 300 # Durée de validité d'un jeton de flux, en secondes
+_pending_streams = {}
+_pending_streams_lock = threading.Lock()
+
+# Taille annoncée dans l'en-tête d'un WAV diffusé en flux, dont la longueur réelle est inconnue
+_WAV_STREAM_DATA_SIZE = 0x7FFFFFFF - 36
+
+def _init_piper_worker(model_path):
+    """
+    Initialise un processus du pool : charge sa propre voix Piper, limitée à un thread
+    ONNX pour que les processus se répartissent les cœurs sans se concurrencer.
+    """
+
+    global _worker_voice
+    onnxruntime.set_default_logger_severity(3) # 3 = ERROR
+    _worker_voice = PiperVoice.load(model_path)
+    options = onnxruntime.SessionOptions()
+    options.intra_op_num_threads = 1
+    options.inter_op_num_threads = 1
+    _worker_voice.session = onnxruntime.InferenceSession(
+        model_path, sess_options=options, providers=["CPUExecutionProvider"]
+    )
+
+def _piper_worker_ready(_):
+    """Tâche vide permettant de démarrer (et préchauffer) tous les processus du pool."""
+    return _worker_voice is not None
+
+def _synthesize_piper_segment(text):
+    """
+    Synthétise un segment de texte dans un processus du pool.
+    Retourne le format audio (fréquence, largeur d'échantillon, canaux) et le PCM brut.
+    """
+
+    sample_rate, sample_width, channels = _worker_voice.config.sample_rate, 2, 1
+    pcm = bytearray()
+    for chunk in _worker_voice.synthesize(text):
+        sample_rate, sample_width, channels = chunk.sample_rate, chunk.sample_width, chunk.sample_channels
+        pcm.extend(chunk.audio_int16_bytes)
+    return (sample_rate, sample_width, channels), bytes(pcm)
+
+def _split_sentences(text, min_chars=PIPER_SEGMENT_MIN_CHARS):
+    """
+    Découpe le texte en phrases, puis regroupe les phrases courtes en segments
+    d'au moins `min_chars` caractères pour limiter le coût de répartition.
+    """
+
+    sentences = [s.strip() for s in re.split(r'(?<=[.!?…])\s+|\n+', text) if s.strip()]
+    segments = []
+    current = ""
+    for sentence in sentences:
+        current = f"{current} {sentence}" if current else sentence
+        if len(current) >= min_chars:
+            segments.append(current)
+            current = ""
+    if current:
+        segments.append(current)
+    return segments
 
 def init_tts_engine():
     """Initialise le moteur Piper TTS. Appelé au démarrage du serveur."""
-    global voice
+    global voice, piper_pool
+    if piper_pool is None and PIPER_WORKERS > 1 and os.path.exists(PIPER_MODEL):
+        # Les processus sont créés par fork et démarrés tout de suite, avant le répartiteur OCR et les
+        # threads de travail (voir l'ordre d'initialisation dans server.py) : seul le thread d'écriture
+        # du journal existe déjà, et les processus Piper n'écrivent jamais dans le journal
+        Log(f"Initialisation du pool Piper ({PIPER_WORKERS} processus)...")
+        try:
+            piper_pool = ProcessPoolExecutor(
+                max_workers=PIPER_WORKERS,
+                mp_context=multiprocessing.get_context('fork'),
+                initializer=_init_piper_worker,
+                initargs=(PIPER_MODEL,)
+            )
+            list(piper_pool.map(_piper_worker_ready, range(PIPER_WORKERS)))
+            Log("Pool Piper chargé avec succès.")
+        except Exception as e:
+            piper_pool = None
+            Error(f"Impossible de démarrer le pool Piper, synthèse série utilisée. Détails: {e}")
+
     if voice is None and os.path.exists(PIPER_MODEL):
         # Masquer les avertissements de ONNX Runtime concernant l'absence de GPU
         onnxruntime.set_default_logger_severity(3) # 3 = ERROR
@@ -23,26 +140,25 @@ def init_tts_engine():
         except Exception as e:
             Error(f"Impossible de charger le modèle TTS Piper. Détails: {e}")
 
-def _delete_old_files(user_id):
+def _synthesize_piper_parallel(segments, audio_path):
     """
-    Supprime les anciens fichiers audio et capture pour un utilisateur spécifique.
+    Synthétise les segments en parallèle dans le pool Piper et les réassemble,
+    dans l'ordre, en un unique fichier WAV.
     """
 
-    Title(f"Nettoyage des anciens fichiers Audio pour l'utilisateur ID: {user_id}")
-
-    # On parcourt tous les fichiers dans le dossier UPLOAD_FOLDER
-    audio_prefix_to_delete = f"audio_{user_id}_"
-    capture_prefix_to_delete = f"capture_{user_id}_"
-
-    for filename in os.listdir(UPLOAD_FOLDER):
-        if filename.startswith(audio_prefix_to_delete) or filename.startswith(capture_prefix_to_delete):
-            try:
-                file_path_to_delete = os.path.join(UPLOAD_FOLDER, filename)
-                os.remove(file_path_to_delete)
-                Log(f"Suppression = {file_path_to_delete}")
-            except OSError as e:
-                Error(f"Suppression du fichier impossible {filename} = {e}")
+    Log(f"Synthèse parallèle de {len(segments)} segments sur {PIPER_WORKERS} processus")
+    with wave.open(audio_path, "wb") as wav_file:
+        params_set = False
+        # map() conserve l'ordre des segments quel que soit l'ordre de fin des processus
+        for (sample_rate, sample_width, channels), pcm in piper_pool.map(_synthesize_piper_segment, segments):
+            if not params_set:
+                wav_file.setframerate(sample_rate)
+                wav_file.setsampwidth(sample_width)
+                wav_file.setnchannels(channels)
+                params_set = True
+            wav_file.writeframes(pcm)
 
+@metrics_service.timed('piper_synthesis')
 def _generate_tts_piper(text, audio_filename):
     """
     Génère un fichier audio .wav à partir du texte en utilisant Piper TTS.
@@ -55,8 +171,12 @@ def _generate_tts_piper(text, audio_filename):
     Title("Traitement du texte par Piper")
     try:
         audio_path = os.path.join(UPLOAD_FOLDER, audio_filename)
-        with wave.open(audio_path, "wb") as wav_file:
-            voice.synthesize_wav(text, wav_file)
+        segments = _split_sentences(text) if piper_pool else []
+        if len(segments) > 1:
+            _synthesize_piper_parallel(segments, audio_path)
+        else:
+            with wave.open(audio_path, "wb") as wav_file:
+                voice.synthesize_wav(text, wav_file)
 
         Success(f"Fichier audio généré = {audio_path}")
         return True, audio_path
@@ -65,25 +185,222 @@ def _generate_tts_piper(text, audio_filename):
         Error(error_msg)
         return False, error_msg
 
+def _wav_header(sample_rate, sample_width=2, channels=1, data_size=_WAV_STREAM_DATA_SIZE):
+    """
+    Construit un en-tête WAV (PCM) de 44 octets.
+    """
+
+    block_align = channels * sample_width
+    return struct.pack(
+        '<4sI4s4sIHHIIHH4sI',
+        b'RIFF', 36 + data_size, b'WAVE',
+        b'fmt ', 16, 1, channels, sample_rate, sample_rate * block_align, block_align, sample_width * 8,
+        b'data', data_size
+    )
+
+class PrefetchedPiper:
+    """
+    Synthèse Piper démarrée à l'avance dans un thread, avant que le client n'ouvre le flux :
+    les segments PCM produits sont conservés jusqu'à leur lecture (un seul lecteur).
+    `first_segment` est levé dès que le premier segment est prêt (ou que la synthèse a échoué).
+    """
+
+    def __init__(self, text):
+        self._segments = queue.Queue()
+        self.first_segment = threading.Event()
+        threading.Thread(target=self._run, args=(text,), name="piper-prefetch", daemon=True).start()
+
+    def _run(self, text):
+        try:
+            for segment in _iter_piper_pcm(text):
+                self._segments.put(segment)
+                self.first_segment.set()
+        finally:
+            self._segments.put(None) # Fin de la synthèse
+            self.first_segment.set()
+
+    def __iter__(self):
+        while True:
+            segment = self._segments.get()
+            if segment is None:
+                return
+            yield segment
+
+def register_tts_stream(text, user_id=None, pcm=None):
+    """
+    Enregistre un texte à synthétiser en flux et retourne le jeton à usage unique
+    permettant de récupérer l'audio (utilisable directement comme source d'un <audio>).
+    `pcm` : synthèse déjà lancée (PrefetchedPiper), relayée à l'ouverture du flux.
+    """
+
+    now = time.time()
+    token = secrets.token_urlsafe(16)
+    with _pending_streams_lock:
+        # Purge des jetons expirés
+        for expired in [t for t, (_, _, created, _) in _pending_streams.items() if now - created > STREAM_TOKEN_TTL]:
+            del _pending_streams[expired]
+        _pending_streams[token] = (text, user_id, now, pcm)
+    return token
+
+def pop_tts_stream(token):
+    """
+    Retire et retourne (texte, synthèse déjà lancée ou None) associés à un jeton de flux,
+    ou None si le jeton est inconnu ou expiré.
+    """
+
+    with _pending_streams_lock:
+        entry = _pending_streams.pop(token, None)
+    if not entry or time.time() - entry[2] > STREAM_TOKEN_TTL:
+        return None
+    return entry[0], entry[3]
+
+def _iter_piper_pcm(text):
+    """
+    Générateur des segments PCM (fréquence, largeur d'échantillon, canaux, données)
+    de chaque phrase, dès que Piper l'a synthétisée.
+    """
+
+    Title("Traitement du texte par Piper (flux)")
+    start = time.perf_counter()
+    first = True
+    try:
+        for chunk in voice.synthesize(text):
+            if first:
+                metrics_service.observe_stage('piper_first_segment', time.perf_counter() - start)
+                Log(f"Premier segment audio prêt en {time.perf_counter() - start:.3f}s")
+                first = False
+            yield chunk.sample_rate, chunk.sample_width, chunk.sample_channels, chunk.audio_int16_bytes
+    except Exception as e:
+        Error(f"Erreur lors de la génération TTS en flux avec Piper: {repr(e)}")
+        return
+    metrics_service.observe_stage('piper_stream', time.perf_counter() - start)
+    Success(f"Flux audio terminé en {time.perf_counter() - start:.3f}s")
+
+def stream_tts_piper(text, audio_format='wav', pcm=None):
+    """
+    Générateur produisant l'audio en flux, phrase par phrase : un WAV (l'en-tête puis le PCM),
+    ou un MP3/Opus encodé à la volée par ffmpeg. La lecture peut ainsi démarrer avant la fin
+    de la synthèse. `pcm` : segments d'une synthèse déjà lancée (sinon, elle démarre ici).
+    """
+
+    segments = pcm if pcm is not None else _iter_piper_pcm(text)
+    if audio_format != 'wav':
+        yield from audio_service.encode_stream(segments, audio_format)
+        return
+
+    header_sent = False
+    for sample_rate, sample_width, channels, pcm in segments:
+        if not header_sent:
+            yield _wav_header(sample_rate, sample_width, channels)
+            header_sent = True
+        yield pcm
+
+    if not header_sent:
+        # Aucun segment produit : on renvoie tout de même un WAV vide valide
+        yield _wav_header(voice.config.sample_rate, data_size=0)
+
+def _split_chunks(text, max_chars):
+    """
+    Découpe le texte en morceaux d'au plus `max_chars` caractères alignés sur les phrases.
+    Les phrases courtes sont regroupées ; une phrase trop longue est coupée aux virgules,
+    puis aux espaces.
+    """
+
+    pieces = []
+    for sentence in (s.strip() for s in re.split(r'(?<=[.!?…])\s+|\n+', text)):
+        if len(sentence) <= max_chars:
+            pieces.append(sentence)
+            continue
+        for clause in re.split(r'(?<=[,;:])\s+', sentence):
+            while len(clause) > max_chars:
+                cut = clause.rfind(' ', 0, max_chars)
+                cut = cut if cut > 0 else max_chars
+                pieces.append(clause[:cut].strip())
+                clause = clause[cut:].strip()
+            pieces.append(clause)
+
+    chunks = []
+    current = ""
+    for piece in pieces:
+        if not piece:
+            continue
+        if current and len(current) + 1 + len(piece) > max_chars:
+            chunks.append(current)
+            current = piece
+        else:
+            current = f"{current} {piece}" if current else piece
+    if current:
+        chunks.append(current)
+    return chunks
+
+@metrics_service.timed('coqui_chunk')
+def _synthesize_coqui_chunk(index, text, part_path):
+    """
+    Synthétise un morceau sur un des serveurs Coqui (à tour de rôle) et écrit
+    la réponse WAV sur disque au fil de sa réception.
+    """
+
+    url = COQUI_TTS_URLS[index % len(COQUI_TTS_URLS)]
+    payload = {
+        "text": text,
+        "speaker_id": COQUI_SPEAKER,
+        "language_id": COQUI_LANGUAGE
+    }
+    with http_service.post('coqui', f"{url}/api/tts", data=payload, stream=True) as response:
+        response.raise_for_status() # Lève une exception si le statut est une erreur (4xx ou 5xx)
+        with open(part_path, 'wb') as f:
+            for block in response.iter_content(chunk_size=64 * 1024):
+                f.write(block)
+    return part_path
+
+def _concatenate_wav(part_paths, audio_path):
+    """Réassemble, dans l'ordre, des fichiers WAV de même format en un seul fichier."""
+    with wave.open(audio_path, 'wb') as output:
+        params = None
+        for part_path in part_paths:
+            with wave.open(part_path, 'rb') as part:
+                part_params = (part.getnchannels(), part.getsampwidth(), part.getframerate())
+                if params is None:
+                    params = part_params
+                    output.setnchannels(params[0])
+                    output.setsampwidth(params[1])
+                    output.setframerate(params[2])
+                elif part_params != params:
+                    raise ValueError(f"Format audio incohérent entre les morceaux : {part_params} != {params}")
+                while True:
+                    frames = part.readframes(64 * 1024)
+                    if not frames:
+                        break
+                    output.writeframes(frames)
+
+@metrics_service.timed('coqui_synthesis')
 def _generate_tts_coqui(text, audio_filename):
     """
     Génère un fichier audio .wav à partir du texte en utilisant l'API Coqui TTS.
+    Le texte est découpé en morceaux alignés sur les phrases (COQUI_CHUNK_CHARS), synthétisés
+    en parallèle (COQUI_WORKERS) sur le ou les serveurs Coqui, puis réassemblés dans l'ordre.
     """
 
     Title("Traitement du texte par Coqui TTS")
+    chunks = _split_chunks(text, COQUI_CHUNK_CHARS)
+    Log(f"Synthèse Coqui de {len(chunks)} morceaux ({COQUI_WORKERS} requêtes simultanées, {len(COQUI_TTS_URLS)} serveur(s))")
     try:
-        payload = {
-            "text": text,
-            "speaker_id": "Viktor Eka",
-            "language_id": "fr"
-        }
-        response = requests.post(f"{COQUI_TTS_URL}/api/tts", data=payload)
-        response.raise_for_status() # Lève une exception si le statut est une erreur (4xx ou 5xx)
-        
         audio_path = os.path.join(UPLOAD_FOLDER, audio_filename)
-        with open(audio_path, 'wb') as f:
-            f.write(response.content)
-            
+        with tempfile.TemporaryDirectory(dir=UPLOAD_FOLDER, prefix='.coqui_') as parts_dir:
+            futures = [
+                _coqui_pool.submit(_synthesize_coqui_chunk, index, chunk, os.path.join(parts_dir, f"{index:05d}.wav"))
+                for index, chunk in enumerate(chunks)
+            ]
+            try:
+                part_paths = [future.result() for future in futures]
+            except Exception:
+                # Inutile de synthétiser le reste : le fichier final ne pourra pas être produit
+                for future in futures:
+                    future.cancel()
+                wait(futures) # Les morceaux en cours écrivent encore dans le dossier temporaire
+                raise
+            _concatenate_wav(part_paths, audio_path)
+
         Success(f"Fichier audio généré = {audio_path}")
         return True, audio_path
     except requests.exceptions.RequestException as e:
@@ -94,21 +411,92 @@ def _generate_tts_coqui(text, audio_filename):
         error_msg = f"Erreur lors de la génération TTS avec Coqui: {repr(e)}"
         Error(error_msg)
         return False, error_msg
-    
-def generate_tts(text, audio_filename, tts_engine='piper', user_id=None):
+
+def cache_stats():
+    """Statistiques du cache audio, par format."""
+    return {"wav": audio_cache.stats(), **{audio_format: cache.stats() for audio_format, cache in encoded_caches.items()}}
+
+def _normalize_text(text):
+    """Normalise le texte pour le calcul de la clé de cache (espaces multiples, sauts de ligne)."""
+    return re.sub(r'\s+', ' ', text).strip()
+
+def _audio_cache_key(text, tts_engine):
+    """
+    Calcule la clé de cache d'un audio : texte normalisé, moteur, voix et version du modèle.
+    """
+
+    if tts_engine == 'piper':
+        try:
+            stat = os.stat(PIPER_MODEL)
+            model_version = f"{os.path.basename(PIPER_MODEL)}:{stat.st_size}:{int(stat.st_mtime)}"
+        except OSError:
+            model_version = os.path.basename(PIPER_MODEL)
+        return make_key(_normalize_text(text), tts_engine, model_version)
+    return make_key(_normalize_text(text), tts_engine, COQUI_SPEAKER, COQUI_LANGUAGE, COQUI_MODEL)
+
+def _encode_audio(wav_path, cache_key, audio_format):
+    """
+    Encode un WAV dans le format demandé et place le résultat dans le cache de ce format.
+    En cas d'échec, l'audio est servi en WAV.
+    """
+
+    try:
+        start = time.perf_counter()
+        with metrics_service.timed('audio_encode'):
+            encoded_path = audio_service.encode_file(wav_path, audio_format)
+        wav_size, encoded_size = os.path.getsize(wav_path), os.path.getsize(encoded_path)
+        Log(f"Audio encodé en {audio_format} en {time.perf_counter() - start:.3f}s "
+            f"({wav_size // 1024} Ko -> {encoded_size // 1024} Ko)")
+        return encoded_caches[audio_format].put(cache_key, encoded_path)
+    except Exception as e:
+        Warning(f"Encodage {audio_format} impossible, audio servi en WAV : {e}")
+        return None
+
+def generate_tts(text, audio_filename, tts_engine='piper', audio_format='wav'):
     """
     Aiguilleur principal pour le service TTS.
+    L'audio est synthétisé en WAV puis, si `audio_format` est compressé (mp3, opus), encodé :
+    seule la version compressée est alors conservée en cache.
     """
 
     BigTitle(f"Traitement TTS avec le moteur : {tts_engine.upper()}")
-    if user_id:
-        # Suppression des anciens fichiers audio de l'utilisateur
-        _delete_old_files(user_id)
 
     if not text or not text.strip() or len(text.strip()) < 2:
         return False, "Le texte fourni est vide."
     
+    if tts_engine not in ('piper', 'coqui'):
+        return False, f"Moteur TTS inconnu : {tts_engine}"
+
+    if audio_format not in audio_service.AUDIO_FORMATS:
+        return False, f"Format audio inconnu : {audio_format}"
+
+    # Un texte déjà synthétisé (relecture, rechargement, autre utilisateur) est servi depuis le cache
+    cache_key = _audio_cache_key(text, tts_engine)
+    cache = audio_cache if audio_format == 'wav' else encoded_caches[audio_format]
+    cached_path = cache.get(cache_key)
+    if cached_path:
+        Success("Audio trouvé dans le cache = %s", cached_path)
+        return True, cached_path
+
+    # Un WAV déjà en cache (demandé auparavant dans ce format) évite une nouvelle synthèse
+    wav_path = audio_cache.get(cache_key) if audio_format != 'wav' else None
+    if wav_path:
+        return True, _encode_audio(wav_path, cache_key, audio_format) or wav_path
+
     if tts_engine == 'piper':
-        return _generate_tts_piper(text, audio_filename)
-    elif tts_engine == 'coqui':
-        return _generate_tts_coqui(text, audio_filename)
+        success, audio_path_or_error = _generate_tts_piper(text, audio_filename)
+    else:
+        success, audio_path_or_error = _generate_tts_coqui(text, audio_filename)
+
+    if not success:
+        # Fichier partiel laissé par une synthèse interrompue
+        partial_path = os.path.join(UPLOAD_FOLDER, audio_filename)
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+        return success, audio_path_or_error
+    if audio_format != 'wav':
+        encoded_path = _encode_audio(audio_path_or_error, cache_key, audio_format)
+        if encoded_path:
+            os.remove(audio_path_or_error)
+            return True, encoded_path
+    return True, audio_cache.put(cache_key, audio_path_or_error)
@@ -3,12 +3,12 @@ import { getAuthToken } from './auth.js';
 import { API_BASE_URL } from './config.js';
 
 /**
- * Fonction de base pour effectuer les requêtes fetch.
+ * Envoie une requête authentifiée et retourne la réponse brute, après vérification du statut.
  * @param {string} endpoint - Le chemin de l'API (ex: '/login')
  * @param {object} options - Les options de la requête fetch (method, headers, body, etc.)
- * @returns {Promise<any>}
+ * @returns {Promise<Response>}
  */
-async function apiFetch(endpoint, options = {}) {
+async function sendRequest(endpoint, options = {}) {
     const url = `${API_BASE_URL}${endpoint}`;
     const token = getAuthToken();
 
@@ -42,6 +42,18 @@ async function apiFetch(endpoint, options = {}) {
         throw new Error(errorData.message || 'Une erreur API est survenue');
     }
 
+    return response;
+}
+
+/**
+ * Fonction de base pour effectuer les requêtes fetch.
+ * @param {string} endpoint - Le chemin de l'API (ex: '/login')
+ * @param {object} options - Les options de la requête fetch (method, headers, body, etc.)
+ * @returns {Promise<any>}
+ */
+async function apiFetch(endpoint, options = {}) {
+    const response = await sendRequest(endpoint, options);
+
     // Si la réponse n'a pas de contenu (ex: 204 No Content), on retourne null
     if (response.status === 204) {
         return null;
@@ -72,3 +84,35 @@ export const post = (endpoint, body) => apiFetch(endpoint, { method: 'POST', bod
  * @returns {Promise<any>}
  */
 export const postWithFile = (endpoint, formData) => apiFetch(endpoint, { method: 'POST', body: formData });
+
+/**
+ * Effectue une requête POST avec FormData et lit la réponse NDJSON au fil de l'eau.
+ * @param {string} endpoint 
+ * @param {FormData} formData 
+ * @param {function(object): (void|Promise<void>)} onEvent - Appelée pour chaque objet reçu, dans l'ordre ;
+ * la lecture attend la fin de l'appel avant de passer à l'objet suivant.
+ * @returns {Promise<void>}
+ */
+export async function postWithFileStream(endpoint, formData, onEvent) {
+    const response = await sendRequest(endpoint, {
+        method: 'POST',
+        body: formData,
+        headers: { 'Accept': 'application/x-ndjson' },
+    });
+
+    const reader = response.body.pipeThrough(new TextDecoderStream()).getReader();
+    let buffer = '';
+    while (true) {
+        const { value, done } = await reader.read();
+        if (value) buffer += value;
+        // Une ligne complète = un objet JSON ; la dernière ligne, incomplète, attend la suite
+        const lines = buffer.split('\n');
+        buffer = done ? '' : lines.pop();
+        for (const line of lines) {
+            if (line.trim() !== '') {
+                await onEvent(JSON.parse(line));
+            }
+        }
+        if (done) return;
+    }
+}
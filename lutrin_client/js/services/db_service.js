@@ -104,6 +104,31 @@ export async function updateEpub(epubData) {
     });
 }
 
+/**
+ * Met à jour certains champs d'un EPUB, en une seule transaction : les autres champs
+ * (ex: la progression de lecture, modifiée par la vue de lecture) sont conservés.
+ * @param {number} id - L'ID de l'EPUB à modifier.
+ * @param {object} fields - Les champs à remplacer.
+ * @returns {Promise<void>}
+ */
+export async function updateEpubFields(id, fields) {
+    const db = await openDB();
+    return new Promise((resolve, reject) => {
+        const transaction = db.transaction([EPUB_STORE_NAME], 'readwrite');
+        transaction.oncomplete = () => resolve();
+        transaction.onerror = (event) => reject(event.target.error);
+
+        const store = transaction.objectStore(EPUB_STORE_NAME);
+        const request = store.get(id);
+        request.onsuccess = () => {
+            // Livre supprimé entre-temps : rien à mettre à jour
+            if (request.result) {
+                store.put({ ...request.result, ...fields });
+            }
+        };
+    });
+}
+
 /**
  * Supprime un EPUB de la base de données par son ID.
  * @param {number} id - L'ID de l'EPUB à supprimer.
@@ -0,0 +1,113 @@
+// js/services/epubImport.js
+import { postWithFileStream } from '../api.js';
+import { addEpubToDB, updateEpubFields, deleteEpubFromDB } from './db_service.js';
+
+// Événement émis sur `window` à chaque chapitre reçu, puis à la fin (ou à l'échec) de l'import
+export const EPUB_IMPORT_EVENT = 'lutrin:epub-import';
+
+// Intervalle minimal entre deux enregistrements du texte partiel dans IndexedDB (le texte
+// complet est réécrit à chaque fois : on évite de le faire pour chaque chapitre)
+const SAVE_INTERVAL_MS = 2000;
+
+// Imports en cours, par ID local du livre
+const activeImports = new Map();
+
+/**
+ * Retourne l'état d'un import en cours, ou undefined si le livre n'est pas en cours d'import.
+ * @param {number} id - L'ID local du livre.
+ * @returns {{id: number, paragraphs: string[], chapters: number, documentCount: number, importing: boolean, failed: boolean}|undefined}
+ */
+export function getActiveImport(id) {
+    return activeImports.get(id);
+}
+
+/**
+ * Importe un EPUB en lisant la réponse NDJSON de /epub/add chapitre par chapitre.
+ * Le livre est enregistré dans IndexedDB dès les premières métadonnées, et son premier
+ * chapitre dès qu'il arrive : il peut être ouvert (et écouté) pendant que le serveur
+ * traite la suite. La vue de lecture suit l'import avec getActiveImport et EPUB_IMPORT_EVENT.
+ * @param {File} file - Le fichier EPUB choisi par l'utilisateur.
+ * @param {string} userId - L'utilisateur propriétaire du livre.
+ * @param {{onStart?: function(object), onChapter?: function(object)}} callbacks - Suivi de l'import (état passé en paramètre).
+ * @returns {Promise<number>} L'ID local du livre, une fois l'import terminé.
+ */
+export async function importEpub(file, userId, callbacks = {}) {
+    const formData = new FormData();
+    formData.append('epub_file', file);
+    formData.append('stream', '1');
+
+    let state = null;
+    let lastSave = 0;
+
+    const saveText = async (fields = {}) => {
+        // Les paragraphes sont joints comme dans la réponse non diffusée (un "chapitre" par paragraphe côté client)
+        await updateEpubFields(state.id, {
+            ...fields,
+            text: state.paragraphs.join('\n\n'),
+            totalChapters: state.paragraphs.length,
+        });
+        lastSave = performance.now();
+    };
+    const notify = () => window.dispatchEvent(new CustomEvent(EPUB_IMPORT_EVENT, { detail: state }));
+
+    try {
+        await postWithFileStream('/epub/add', formData, async (event) => {
+            switch (event.event) {
+                case 'metadata':
+                    if (!state) {
+                        const id = await addEpubToDB({
+                            metadata: event.metadata,
+                            cover_image: event.cover_image,
+                            cover_thumbnail: event.cover_thumbnail,
+                            text: '',
+                            userId: userId,
+                            readingProgress: { lastChapterRead: 0 },
+                            totalChapters: 0,
+                        });
+                        state = { id, paragraphs: [], chapters: 0, documentCount: event.document_count, importing: true, failed: false };
+                        activeImports.set(id, state);
+                        callbacks.onStart?.(state);
+                    } else {
+                        // Métadonnées enrichies (Groq, Google Books), calculées pendant l'extraction
+                        await updateEpubFields(state.id, { metadata: event.metadata });
+                    }
+                    break;
+                case 'chapter':
+                    state.paragraphs.push(...event.paragraphs);
+                    state.chapters++;
+                    // Le premier chapitre est enregistré tout de suite : le livre peut être ouvert
+                    if (state.chapters === 1 || performance.now() - lastSave >= SAVE_INTERVAL_MS) {
+                        await saveText();
+                    }
+                    notify();
+                    callbacks.onChapter?.(state);
+                    break;
+                case 'done':
+                    await saveText({ book_id: event.book_id });
+                    state.importing = false;
+                    break;
+                case 'error':
+                    throw new Error(event.details || event.error);
+            }
+        });
+
+        if (!state || state.importing) {
+            throw new Error("La réponse du serveur s'est interrompue avant la fin du traitement.");
+        }
+        notify();
+        return state.id;
+    } catch (error) {
+        // Un livre incomplet n'est pas conservé dans la bibliothèque
+        if (state) {
+            state.importing = false;
+            state.failed = true;
+            await deleteEpubFromDB(state.id).catch(() => {});
+            notify();
+        }
+        throw error;
+    } finally {
+        if (state) {
+            activeImports.delete(state.id);
+        }
+    }
+}
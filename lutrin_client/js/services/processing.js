@@ -1,5 +1,6 @@
 // js/services/processing.js
 import { post, postWithFile } from '../api.js';
+import { API_BASE_URL } from '../config.js';
 
 /**
  * Capture une image à partir d'un élément vidéo et la retourne sous forme de Blob.
@@ -77,12 +78,30 @@ export async function fetchTestTextFile(filename) {
 }
 
 /**
- * Orchestre le cycle complet : capture, upload, OCR, TTS.
+ * Exécute le pipeline serveur (OCR puis TTS) sur un Blob d'image en un seul appel.
+ * @param {Blob} imageBlob - Le Blob de l'image capturée.
+ * Avec Piper, timings.tts est le délai jusqu'au premier segment audio (tts_timing: 'first_audio') :
+ * la synthèse se poursuit pendant la lecture du flux.
+ * @returns {Promise<{text: string, audio_url: string|null, tts_timing?: string, timings: {ocr: number, tts: number, total: number}}>}
+ */
+export async function runPipeline(imageBlob) {
+    const formData = new FormData();
+    formData.append('image', imageBlob, 'capture.jpg');
+    formData.append('ocr_engine', localStorage.getItem('lutrin_ocr_engine') || 'paddle');
+    formData.append('tts_engine', localStorage.getItem('lutrin_tts_engine') || 'piper');
+    const data = await postWithFile('/pipeline', formData);
+    // Avec Piper, l'audio est diffusé en flux par l'API (URL relative à l'API)
+    const audioUrl = data.audio_url || (data.stream_url ? `${API_BASE_URL}${data.stream_url}` : null);
+    return { ...data, audio_url: audioUrl };
+}
+
+/**
+ * Orchestre le cycle complet : capture, puis OCR et TTS enchaînés côté serveur.
  * @param {HTMLVideoElement} videoElement - L'élément vidéo pour la capture.
  * @returns {Promise<{audio_url: string, ocr_text: string, imageDataUrl: string, stats: {capture: number, upload: number, ocr: number, tts: number}}>}
  */
 export async function processFullCycle(videoElement) {
-    let captureStartTime, captureEndTime, uploadStartTime, uploadEndTime, ocrStartTime, ocrEndTime, ttsStartTime, ttsEndTime;
+    let captureStartTime, captureEndTime, pipelineStartTime, pipelineEndTime;
     let captureDuration = null, uploadDuration = null, ocrDuration = null, ttsDuration = null;
     let imageDataUrl = null;
     let ocrText = null;
@@ -96,27 +115,19 @@ export async function processFullCycle(videoElement) {
         captureDuration = captureEndTime - captureStartTime;
         imageDataUrl = capturedDataUrl;
 
-        // 2. Upload de l'image
-        uploadStartTime = performance.now();
-        const captureData = await uploadCapturedImage(blob);
-        uploadEndTime = performance.now();
-        uploadDuration = uploadEndTime - uploadStartTime;
+        // 2. Envoi, OCR et TTS en un seul appel
+        pipelineStartTime = performance.now();
+        const pipelineData = await runPipeline(blob);
+        pipelineEndTime = performance.now();
+        ocrText = pipelineData.text;
+        audioUrl = pipelineData.audio_url;
 
-        // 3. OCR
-        ocrStartTime = performance.now();
-        const ocrData = await runOCR(captureData.image_filename);
-        ocrEndTime = performance.now();
-        ocrDuration = ocrEndTime - ocrStartTime;
-        ocrText = ocrData.text;
+        // Durées : OCR et TTS mesurés par le serveur, le reste (envoi de l'image, réseau) attribué à l'envoi
+        ocrDuration = pipelineData.timings.ocr * 1000;
+        ttsDuration = (pipelineData.timings.tts ?? 0) * 1000;
+        uploadDuration = (pipelineEndTime - pipelineStartTime) - pipelineData.timings.total * 1000;
 
-        // 4. TTS
-        if (ocrText && ocrText.trim() !== "") {
-            ttsStartTime = performance.now();
-            const ttsData = await runTTS(ocrText);
-            ttsEndTime = performance.now();
-            ttsDuration = ttsEndTime - ttsStartTime;
-            audioUrl = ttsData.audio_url;
-        } else {
+        if (!audioUrl) {
             console.warn("Aucun texte détecté, pas de génération audio.");
         }
 
@@ -135,4 +146,4 @@ export async function processFullCycle(videoElement) {
         console.error("Erreur dans le cycle de traitement complet:", error);
         throw error; // Propage l'erreur pour que la vue puisse la gérer
     }
-}
\ No newline at end of file
+}
@@ -2,6 +2,10 @@ import { getEpubById, updateEpub, deleteEpubFromDB } from '../services/db_servic
 import { runTTS } from '../services/processing.js';
 import { startApiCheck, stopApiCheck } from '../services/apiStatus.js';
 import { navigateTo } from '../router.js';
+import { getActiveImport, EPUB_IMPORT_EVENT } from '../services/epubImport.js';
+
+// Arrête le suivi de l'import en cours du livre affiché (voir displayEpubDetails)
+let stopImportTracking = null;
 
 /**
  * Affiche les détails d'un EPUB sur la page.
@@ -318,6 +322,8 @@ function displayEpubDetails(epub) {
     let isPlaying = false;
     let isStopped = true;
     let currentPlaybackIndex = epub.readingProgress?.lastChapterRead || 0;
+    let isImporting = false; // Livre encore en cours d'import : d'autres chapitres vont arriver
+    const importWaiters = []; // Lectures en attente du prochain chapitre importé
     const audioQueue = new Map(); // Pour stocker les URL audio pré-chargées
     const fetchingPromises = new Map(); // Pour suivre les générations audio en cours
 
@@ -442,6 +448,12 @@ function displayEpubDetails(epub) {
     };
 
     const playChapter = async (chapterIndex) => {
+        // Livre en cours d'import : on attend que le chapitre demandé arrive
+        while (chapterIndex >= chapters.length && isImporting) {
+            updateButtonState('loading', 'Import en cours...');
+            await new Promise(resolve => importWaiters.push(resolve));
+        }
+
         if (chapterIndex >= chapters.length) {
             console.log("Fin du livre atteinte.");
             updateButtonState('stopped', 'Terminé');
@@ -640,7 +652,7 @@ function displayEpubDetails(epub) {
         currentPlaybackIndex++;
         let chapterPlayed = false;
         // On continue tant qu'on n'a pas joué un chapitre, qu'on n'est pas à la fin du livre et que l'utilisateur n'a pas stoppé la lecture.
-        while (!chapterPlayed && currentPlaybackIndex < chapters.length && !isStopped) {
+        while (!chapterPlayed && (currentPlaybackIndex < chapters.length || isImporting) && !isStopped) {
             updateNavButtonsState();
             chapterPlayed = await playChapter(currentPlaybackIndex);
             if (!chapterPlayed) {
@@ -649,6 +661,58 @@ function displayEpubDetails(epub) {
         }
     });
 
+    // --- Suivi de l'import : les chapitres reçus après l'ouverture du livre sont ajoutés à la suite ---
+    const syncImportedChapters = (state) => {
+        const newChapters = state.paragraphs.slice(chapters.length);
+        if (newChapters.length > 0) {
+            const textContentDiv = document.getElementById('epub-text-content');
+            if (chapters.length === 0) {
+                textContentDiv.innerHTML = ''; // Retirer "Aucun texte disponible."
+            }
+            textContentDiv.insertAdjacentHTML('beforeend', newChapters.map((chapter, offset) => `
+                <p id="chapter-${chapters.length + offset}" class="mb-4 p-2 rounded-md">
+                    ${chapter.replace(/\n/g, '<br>')}
+                </p>
+            `).join(''));
+            chapters.push(...newChapters);
+            // Garder le texte à jour : la progression est sauvegardée avec l'objet complet
+            epub.text = chapters.join('\n\n');
+            epub.totalChapters = chapters.length;
+            chapterSlider.max = chapters.length - 1;
+            updateSliderAndDisplay(currentPlaybackIndex);
+            updateNavButtonsState();
+            if (isPlaying) {
+                generateAudioForChapter(currentPlaybackIndex + 1);
+            }
+        }
+        isImporting = state.importing;
+        importWaiters.splice(0).forEach(resolve => resolve());
+    };
+
+    const handleImportProgress = (event) => {
+        if (event.detail.id !== epub.id) return;
+        if (event.detail.failed) {
+            stopImportTracking?.();
+            audioPlayer.pause();
+            alert("L'import de ce livre a échoué, il a été retiré de la bibliothèque.");
+            navigateTo('/epubs');
+            return;
+        }
+        syncImportedChapters(event.detail);
+    };
+
+    stopImportTracking?.();
+    stopImportTracking = null;
+    const importState = getActiveImport(epub.id);
+    if (importState) {
+        window.addEventListener(EPUB_IMPORT_EVENT, handleImportProgress);
+        stopImportTracking = () => {
+            window.removeEventListener(EPUB_IMPORT_EVENT, handleImportProgress);
+            stopImportTracking = null;
+        };
+        syncImportedChapters(importState);
+    }
+
     // Initialisation du slider
     chapterSlider.max = chapters.length > 0 ? chapters.length - 1 : 0;
 
@@ -679,6 +743,7 @@ export async function initEpubDetailView(urlParams) {
             // Retourne la fonction de nettoyage pour que le routeur puisse l'utiliser
             return () => {
                 console.log("Nettoyage de la vue EPUB...");
+                stopImportTracking?.();
                 const audioPlayer = document.getElementById('epub-audio-player');
                 if (audioPlayer) {
                     audioPlayer.pause();
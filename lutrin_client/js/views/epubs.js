@@ -1,7 +1,7 @@
 // js/views/epubs.js
-import { postWithFile } from '../api.js';
 import { navigateTo } from '../router.js';
-import { addEpubToDB, getEpubsForUser } from '../services/db_service.js';
+import { getEpubsForUser } from '../services/db_service.js';
+import { importEpub } from '../services/epubImport.js';
 import { getAuthUser } from '../auth.js';
 
 function handleAddEpubClick(fileInput) {
@@ -16,37 +16,38 @@ async function handleFileSelected(event) {
 
     const statusOverlay = document.getElementById('epub-upload-status-overlay');
     const statusText = document.getElementById('epub-upload-status-text');
+    const readButton = document.getElementById('epub-upload-read-button');
 
     try {
         statusText.textContent = `Envoi de "${file.name}"...`;
+        readButton.classList.add('hidden');
         statusOverlay.classList.remove('hidden');
 
-        const formData = new FormData();
-        formData.append('epub_file', file);
-
-        const result = await postWithFile('/epub/add', formData);
-
-        const epubData = result.data;
-        const currentUser = getAuthUser();
-
-        // Calculer le nombre total de chapitres à partir du texte reçu
-        const totalChapters = epubData.text ? epubData.text.split('\n\n').filter(c => c.trim() !== '').length : 0;
-
-        // Enrichir l'objet avec l'ID de l'utilisateur avant de le sauvegarder
-        const dataToStore = {
-            ...epubData,
-            userId: currentUser,
-            readingProgress: { lastChapterRead: 0 }, // Initialiser la progression
-            totalChapters: totalChapters // Sauvegarder le nombre total de chapitres
-        };
-
-        const newId = await addEpubToDB(dataToStore);
+        // Le livre arrive chapitre par chapitre : il peut être ouvert dès le premier
+        const newId = await importEpub(file, getAuthUser(), {
+            onStart: () => {
+                statusText.textContent = `Extraction du texte de "${file.name}"...`;
+            },
+            onChapter: (state) => {
+                statusText.textContent = `Traitement de "${file.name}" : ${state.chapters} chapitre(s) reçu(s)...`;
+                if (state.chapters === 1) {
+                    readButton.onclick = () => navigateTo(`/epub?id=${state.id}`);
+                    readButton.classList.remove('hidden');
+                }
+            },
+        });
         console.log(`EPUB sauvegardé dans la base de données locale avec l'ID: ${newId}`);
 
+        // L'utilisateur a pu ouvrir le livre entre-temps : la bibliothèque n'est plus affichée
+        if (!document.body.contains(statusOverlay)) {
+            return;
+        }
+
         // Rafraîchir l'affichage de la bibliothèque
         await loadAndDisplayEpubs();
 
         statusText.textContent = "Fichier traité avec succès !";
+        readButton.classList.add('hidden');
 
         setTimeout(() => {
             statusOverlay.classList.add('hidden');
@@ -55,6 +56,7 @@ async function handleFileSelected(event) {
     } catch (error) {
         console.error("Erreur lors de l'upload de l'EPUB:", error);
         statusText.textContent = `Erreur: ${error.message}`;
+        readButton.classList.add('hidden');
         // Laisser la modale ouverte en cas d'erreur pour que l'utilisateur voie le message
     } finally {
         // Réinitialiser l'input pour permettre de re-sélectionner le même fichier
@@ -192,7 +194,7 @@ async function loadAndDisplayEpubs() {
                 card.className = 'cursor-pointer group';
                 card.innerHTML = `
                      <div class="aspect-[2/3] bg-gray-200 rounded-lg overflow-hidden shadow-lg transform group-hover:scale-105 transition-transform duration-200">
-                         <img src="${epub.cover_image || 'assets/placeholder-cover.png'}" alt="Couverture de ${epub.metadata.title}" class="w-full h-full object-cover">
+                         <img src="${epub.cover_thumbnail || epub.cover_image || 'assets/placeholder-cover.png'}" alt="Couverture de ${epub.metadata.title}" class="w-full h-full object-cover" loading="lazy">
                      </div>
                      <h3 class="mt-2 text-sm font-bold text-gray-800 truncate">${epub.metadata.title}</h3>
                      <p class="text-xs text-gray-500 truncate">${epub.metadata.authors.join(', ')}</p>
@@ -1,34 +1,147 @@
 import http.server
+import email.utils
+import hashlib
+import gzip
 import ssl
 import sys
 import os
+import threading
 import requests
-from urllib.parse import urlparse
+import urllib3
+from requests.adapters import HTTPAdapter
+
+try:
+    import brotli # Optionnel (paquet python3-brotli) : à défaut, seul gzip est proposé
+except ImportError:
+    brotli = None
+
+# Nombre maximal de connexions navigateur traitées simultanément (valeur par défaut)
+DEFAULT_MAX_CONNECTIONS = 32
+# Taille des blocs relayés entre le navigateur et l'API
+PROXY_BLOCK_SIZE = 64 * 1024
+# Délai (en secondes) au-delà duquel une connexion navigateur inactive est fermée
+CLIENT_IDLE_TIMEOUT = 30
+# Délais de connexion et de lecture vers l'API (la synthèse d'un chapitre peut être longue)
+API_TIMEOUT = (5, 600)
+
+# Fichiers statiques gardés en mémoire, avec leurs versions compressées (taille maximale)
+STATIC_CACHE_MAX_SIZE = 2 * 1024 * 1024
+# Taille minimale d'un fichier statique pour qu'il soit compressé
+STATIC_COMPRESS_MIN_SIZE = 1024
+COMPRESSIBLE_TYPES = ('text/', 'application/javascript', 'application/json', 'image/svg+xml', 'image/x-icon', 'image/vnd.microsoft.icon')
+
+# En-têtes propres à une connexion, qui ne doivent pas être relayés
+HOP_BY_HOP_HEADERS = {
+    'connection', 'keep-alive', 'proxy-authenticate', 'proxy-authorization',
+    'te', 'trailers', 'transfer-encoding', 'upgrade', 'host', 'content-length'
+}
+
+# Session partagée : connexions keep-alive vers l'API réutilisées d'une requête à l'autre
+api_session = requests.Session()
+
+
+class StaticAsset:
+    """
+    Fichier statique du client lu une fois par version (date de modification, taille) :
+    contenu, ETag fort (empreinte du contenu) et variantes compressées gzip et brotli.
+    """
+
+    def __init__(self, path, stat, content_type):
+        with open(path, 'rb') as f:
+            data = f.read()
+        self.version = (stat.st_mtime_ns, stat.st_size)
+        self.last_modified = email.utils.formatdate(stat.st_mtime, usegmt=True)
+        self.mtime = int(stat.st_mtime)
+        self.content_type = content_type
+        self.etag = hashlib.sha256(data).hexdigest()[:32]
+        self.variants = {'identity': data}
+        if len(data) >= STATIC_COMPRESS_MIN_SIZE and content_type.startswith(COMPRESSIBLE_TYPES):
+            compressed = {'gzip': gzip.compress(data, compresslevel=9, mtime=0)}
+            if brotli:
+                compressed['br'] = brotli.compress(data, quality=11)
+            # Une variante n'est conservée que si elle est effectivement plus petite
+            self.variants.update((encoding, body) for encoding, body in compressed.items() if len(body) < len(data))
+
+
+_static_assets = {}
+_static_assets_lock = threading.Lock()
+
+def load_static_asset(path, content_type):
+    """Retourne le StaticAsset à jour pour ce fichier, ou None s'il est trop gros pour la mémoire."""
+    stat = os.stat(path)
+    if stat.st_size > STATIC_CACHE_MAX_SIZE:
+        return None
+    with _static_assets_lock:
+        asset = _static_assets.get(path)
+    if asset is None or asset.version != (stat.st_mtime_ns, stat.st_size):
+        asset = StaticAsset(path, stat, content_type)
+        with _static_assets_lock:
+            _static_assets[path] = asset
+    return asset
+
+def accepted_encodings(header):
+    """Codages acceptés par le navigateur (en-tête Accept-Encoding), hors ceux refusés par q=0."""
+    encodings = set()
+    for item in (header or '').split(','):
+        name, *params = [part.strip() for part in item.split(';')]
+        quality = 1.0
+        for param in params:
+            key, _, value = param.partition('=')
+            if key.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if name and quality > 0:
+            encodings.add(name.lower())
+    return encodings
+
+
+class RequestBody:
+    """
+    Corps de la requête du navigateur, lu au fur et à mesure de son envoi à l'API
+    (longueur connue : requests transmet un Content-Length sans charger le corps en mémoire).
+    """
+
+    def __init__(self, rfile, length):
+        self.rfile = rfile
+        self.remaining = length
+
+    def __len__(self):
+        return self.remaining
+
+    def read(self, size=-1):
+        if self.remaining <= 0:
+            return b''
+        size = self.remaining if size is None or size < 0 else min(size, self.remaining)
+        data = self.rfile.read(size)
+        self.remaining -= len(data)
+        return data
+
 
 class ReverseProxyHandler(http.server.SimpleHTTPRequestHandler):
+    # HTTP/1.1 : connexions keep-alive avec le navigateur, réponses de longueur inconnue en chunked
+    protocol_version = 'HTTP/1.1'
+    timeout = CLIENT_IDLE_TIMEOUT
+
     def __init__(self, *args, **kwargs):
         self.api_base_url = kwargs.pop('api_base_url', 'http://localhost:5000')
         # Définir le répertoire de base pour les fichiers statiques
         # C'est le répertoire où se trouve ce script (lutrin_client)
         self.client_base_dir = os.path.join(os.path.dirname(__file__))
-        super().__init__(*args, **kwargs)
-
-    def translate_path(self, path):
-        # Utilise le répertoire de base du client pour la recherche de fichiers
-        return super().translate_path(path)
+        super().__init__(*args, directory=self.client_base_dir, **kwargs)
 
     def do_GET(self):
         if self.path.startswith('/api/') or self.path.startswith('/file/'):
             self.proxy_request()
         else:
-            # Gérer le fallback pour les routes SPA
-            requested_path = self.path.split('?')[0]
-            file_path = os.path.join(self.client_base_dir, requested_path.lstrip('/'))
-            if os.path.exists(file_path) and os.path.isfile(file_path):
-                super().do_GET() # Servir le fichier statique s'il existe
-            else:
-                self.path = '/index.html' # Sinon, servir index.html
-                super().do_GET()
+            self.serve_static(super().do_GET)
+
+    def do_HEAD(self):
+        if self.path.startswith('/api/') or self.path.startswith('/file/'):
+            self.proxy_request()
+        else:
+            self.serve_static(super().do_HEAD)
 
     def do_POST(self):
         if self.path.startswith('/api/'):
@@ -36,6 +149,66 @@ class ReverseProxyHandler(http.server.SimpleHTTPRequestHandler):
         else:
             self.send_error(404, "File not found")
 
+    def serve_static(self, serve):
+        # Gérer le fallback pour les routes SPA
+        requested_path = self.path.split('?')[0]
+        file_path = os.path.join(self.client_base_dir, requested_path.lstrip('/'))
+        if not (os.path.exists(file_path) and os.path.isfile(file_path)):
+            self.path = '/index.html' # Sinon, servir index.html
+        # Fichiers courants servis depuis la mémoire ; les autres (volumineux, dossiers) depuis le disque
+        file_path = self.translate_path(self.path)
+        if os.path.isfile(file_path) and self.send_static_asset(file_path):
+            return
+        serve()
+
+    def send_static_asset(self, file_path):
+        """
+        Sert un fichier statique depuis la mémoire, dans la meilleure variante acceptée
+        (brotli, gzip ou brute). Le navigateur revalide à chaque chargement : un fichier
+        inchangé coûte une réponse 304 (If-None-Match, sinon If-Modified-Since).
+        Retourne False si le fichier doit être servi depuis le disque.
+        """
+
+        try:
+            asset = load_static_asset(file_path, self.guess_type(file_path))
+        except OSError:
+            return False
+        if asset is None:
+            return False
+
+        accepted = accepted_encodings(self.headers.get('Accept-Encoding'))
+        encoding = next((name for name in ('br', 'gzip') if name in asset.variants and name in accepted), 'identity')
+        # Chaque variante a son propre ETag (le contenu transmis diffère)
+        etag = f'"{asset.etag}"' if encoding == 'identity' else f'"{asset.etag}-{encoding}"'
+
+        if_none_match = self.headers.get('If-None-Match')
+        if if_none_match is not None:
+            candidates = [tag.strip().removeprefix('W/') for tag in if_none_match.split(',')]
+            not_modified = '*' in candidates or etag in candidates
+        else:
+            try:
+                since = email.utils.parsedate_to_datetime(self.headers.get('If-Modified-Since'))
+                not_modified = asset.mtime <= int(since.timestamp())
+            except (TypeError, ValueError, IndexError, OverflowError):
+                not_modified = False
+
+        body = asset.variants[encoding]
+        self.send_response(304 if not_modified else 200)
+        self.send_header('ETag', etag)
+        self.send_header('Last-Modified', asset.last_modified)
+        self.send_header('Cache-Control', 'no-cache')
+        if len(asset.variants) > 1:
+            self.send_header('Vary', 'Accept-Encoding')
+        if not not_modified:
+            self.send_header('Content-Type', asset.content_type)
+            if encoding != 'identity':
+                self.send_header('Content-Encoding', encoding)
+            self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if not not_modified and self.command != 'HEAD':
+            self.wfile.write(body)
+        return True
+
     def proxy_request(self):
         # Supprimer le préfixe '/api' du chemin avant de le transférer
         if self.path.startswith('/api/'):
@@ -43,49 +216,135 @@ class ReverseProxyHandler(http.server.SimpleHTTPRequestHandler):
         else:
             target_path = self.path
         target_url = f"{self.api_base_url}{target_path}"
-        
-        # Lire le corps de la requête originale
+
+        # Un corps en Transfer-Encoding (chunked) n'a pas de longueur connue : il n'est pas relayé,
+        # et la connexion est fermée pour que ce corps ne soit pas lu comme une nouvelle requête
+        if self.headers.get('Transfer-Encoding'):
+            self.close_connection = True
+            self.send_error(411, "Length Required")
+            return
+
+        # Le corps de la requête (ex: image, EPUB) est relayé en flux, sans être chargé en mémoire
         content_length = int(self.headers.get('Content-Length', 0))
-        body = self.rfile.read(content_length) if content_length > 0 else None
+        body = RequestBody(self.rfile, content_length) if content_length > 0 else None
 
-        # Transférer les en-têtes
-        headers = {key: value for key, value in self.headers.items()}
+        # Transférer les en-têtes (hors en-têtes propres à la connexion)
+        headers = {key: value for key, value in self.headers.items() if key.lower() not in HOP_BY_HOP_HEADERS}
 
         try:
             # Envoyer la requête au serveur API
-            resp = requests.request(self.command, target_url, headers=headers, data=body, stream=True, verify=False)
+            resp = api_session.request(self.command, target_url, headers=headers, data=body, stream=True,
+                                       allow_redirects=False, timeout=API_TIMEOUT)
+        except requests.exceptions.RequestException as e:
+            if body is not None and body.remaining:
+                self.close_connection = True # Corps non consommé : la connexion n'est plus réutilisable
+            self.send_error(502, f"Proxy Error: {e}")
+            return
 
-            # Transférer la réponse de l'API au client
+        with resp:
+            # Transférer la réponse de l'API au client, telle quelle (y compris compressée)
             self.send_response(resp.status_code)
             for key, value in resp.headers.items():
-                if key.lower() not in ('content-encoding', 'transfer-encoding', 'content-length'):
+                if key.lower() not in HOP_BY_HOP_HEADERS:
                     self.send_header(key, value)
-            self.send_header('Content-Length', str(len(resp.content)))
+
+            has_body = self.command != 'HEAD' and resp.status_code not in (204, 304)
+            length = resp.headers.get('Content-Length')
+            if length is not None:
+                self.send_header('Content-Length', length)
+            elif has_body:
+                # Réponse diffusée en flux (ex: /tts/stream) : on relaie les segments au fil de l'eau
+                self.send_header('Transfer-Encoding', 'chunked')
             self.end_headers()
-            self.wfile.write(resp.content)
+            if not has_body:
+                return
+
+            try:
+                for block in resp.raw.stream(PROXY_BLOCK_SIZE, decode_content=False):
+                    if length is None:
+                        self.wfile.write(f"{len(block):X}\r\n".encode('ascii') + block + b"\r\n")
+                    else:
+                        self.wfile.write(block)
+                    self.wfile.flush()
+                if length is None:
+                    self.wfile.write(b"0\r\n\r\n")
+            except (BrokenPipeError, ConnectionResetError):
+                # Navigateur déconnecté : la connexion à l'API est fermée avec la réponse
+                self.close_connection = True
+            except (urllib3.exceptions.HTTPError, requests.exceptions.RequestException):
+                # Réponse de l'API interrompue (resp.raw lève les exceptions d'urllib3, ex: ProtocolError,
+                # ReadTimeoutError) : le navigateur ne peut que constater la coupure
+                self.close_connection = True
+
+
+class ProxyServer(http.server.ThreadingHTTPServer):
+    """
+    Serveur multithread (un thread par connexion) limité à `max_connections` connexions
+    simultanées : au-delà, les nouvelles connexions attendent dans la file d'écoute.
+    La poignée de main TLS est faite dans le thread de la connexion, pas dans la boucle d'acceptation.
+    """
+
+    daemon_threads = True
+    request_queue_size = 64
+
+    def __init__(self, server_address, handler, max_connections=DEFAULT_MAX_CONNECTIONS, ssl_context=None):
+        self.slots = threading.BoundedSemaphore(max_connections)
+        self.ssl_context = ssl_context
+        super().__init__(server_address, handler)
+
+    def process_request(self, request, client_address):
+        self.slots.acquire()
+        try:
+            super().process_request(request, client_address)
+        except Exception:
+            self.slots.release()
+            raise
+
+    def process_request_thread(self, request, client_address):
+        try:
+            super().process_request_thread(request, client_address)
+        finally:
+            self.slots.release()
+
+    def finish_request(self, request, client_address):
+        if not self.ssl_context:
+            return super().finish_request(request, client_address)
+        try:
+            request.settimeout(CLIENT_IDLE_TIMEOUT)
+            tls_request = self.ssl_context.wrap_socket(request, server_side=True)
+        except (ssl.SSLError, OSError):
+            return # Poignée de main refusée ou abandonnée par le client
+        try:
+            super().finish_request(tls_request, client_address)
+        finally:
+            # La connexion TLS est fermée ici : shutdown_request ne connaît que le socket d'origine
+            self.shutdown_request(tls_request)
 
-        except requests.exceptions.RequestException as e:
-            self.send_error(502, f"Proxy Error: {e}")
 
 # --- Point d'entrée du script ---
-if len(sys.argv) != 5:
-    print("Usage: python3 https_server.py <client_port> <api_port> <certfile> <keyfile>")
-    sys.exit(1)
+if __name__ == '__main__':
+    if len(sys.argv) not in (5, 6):
+        print("Usage: python3 server.py <client_port> <api_port> <certfile> <keyfile> [max_connections]")
+        sys.exit(1)
+
+    client_port = int(sys.argv[1])
+    api_port = int(sys.argv[2])
+    certfile = sys.argv[3]
+    keyfile = sys.argv[4]
+    max_connections = int(sys.argv[5]) if len(sys.argv) == 6 else DEFAULT_MAX_CONNECTIONS
 
-client_port = int(sys.argv[1])
-api_port = int(sys.argv[2])
-certfile = sys.argv[3]
-keyfile = sys.argv[4]
+    # Autant de connexions keep-alive vers l'API que de connexions navigateur simultanées
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_connections, max_retries=0)
+    api_session.mount('http://', adapter)
 
-api_base_url = f"http://127.0.0.1:{api_port}"
-handler = lambda *args, **kwargs: ReverseProxyHandler(*args, api_base_url=api_base_url, **kwargs)
+    api_base_url = f"http://127.0.0.1:{api_port}"
+    handler = lambda *args, **kwargs: ReverseProxyHandler(*args, api_base_url=api_base_url, **kwargs)
 
-server_address = ('0.0.0.0', client_port)
-httpd = http.server.HTTPServer(server_address, handler)
+    context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+    context.load_cert_chain(certfile=certfile, keyfile=keyfile)
 
-context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
-context.load_cert_chain(certfile=certfile, keyfile=keyfile)
-httpd.socket = context.wrap_socket(httpd.socket, server_side=True)
+    server_address = ('0.0.0.0', client_port)
+    httpd = ProxyServer(server_address, handler, max_connections=max_connections, ssl_context=context)
 
-print(f"Serving client on HTTPS port {client_port} and proxying /api/ to {api_base_url}...")
-httpd.serve_forever()
\ No newline at end of file
+    print(f"Serving client on HTTPS port {client_port} ({max_connections} connexions simultanées) and proxying /api/ to {api_base_url}...")
+    httpd.serve_forever()
@@ -0,0 +1,75 @@
+# lutrin_tools/benchmarks/bench_coqui_chunks.py
+# Compare la synthèse Coqui en une seule requête à la synthèse par morceaux parallèles,
+# contre un ou plusieurs faux serveurs Coqui locaux (lutrin_tools.fakes.coqui_server).
+# Vérifie que l'audio réassemblé a la durée attendue (morceaux complets et dans l'ordre).
+#
+# Usage (depuis la racine du projet) :
+#   python -m lutrin_tools.benchmarks.bench_coqui_chunks [--servers 2] [--workers 4] [--copies 3]
+import argparse
+import os
+import tempfile
+import time
+import wave
+
+from lutrin_api.config import BASE_DIR
+from lutrin_api.services import tts_service
+from lutrin_tools.fakes import coqui_server
+
+SAMPLE_TEXT = os.path.join(BASE_DIR, '../lutrin_data/test01.txt')
+
+
+def _audio_frames(path):
+    with wave.open(path, 'rb') as wav_file:
+        return wav_file.getnframes()
+
+
+def _run(label, text, urls, chunk_chars, workers):
+    """Synthétise `text` avec la configuration donnée et affiche durée et taille de l'audio."""
+    tts_service.COQUI_TTS_URLS = urls
+    tts_service.COQUI_CHUNK_CHARS = chunk_chars
+    tts_service.COQUI_WORKERS = workers
+    tts_service._coqui_pool = tts_service.ThreadPoolExecutor(max_workers=workers)
+    chunks = tts_service._split_chunks(text, chunk_chars)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        tts_service.UPLOAD_FOLDER = tmp_dir
+        start = time.perf_counter()
+        success, audio_path = tts_service._generate_tts_coqui(text, 'bench.wav')
+        elapsed = time.perf_counter() - start
+        if not success:
+            print(f"{label:<34} ÉCHEC : {audio_path}")
+            return None
+        frames = _audio_frames(audio_path)
+    expected = sum(int(len(chunk) * coqui_server.SECONDS_PER_CHAR * coqui_server.SAMPLE_RATE) for chunk in chunks)
+    print(f"{label:<34} {len(chunks):>4} morceaux  {elapsed:7.2f}s  audio={frames / coqui_server.SAMPLE_RATE:7.1f}s  "
+          f"{'complet' if frames == expected else 'INCOMPLET'}")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de la synthèse Coqui par morceaux parallèles")
+    parser.add_argument('--servers', type=int, default=2, help="Nombre de faux serveurs Coqui")
+    parser.add_argument('--workers', type=int, default=4, help="Requêtes simultanées")
+    parser.add_argument('--copies', type=int, default=3, help="Nombre de copies du texte de test")
+    parser.add_argument('--chunk-chars', type=int, default=240, help="Taille maximale d'un morceau")
+    parser.add_argument('--delay-per-char', type=float, default=0.002, help="Temps de synthèse simulé par caractère (s)")
+    args = parser.parse_args()
+
+    with open(SAMPLE_TEXT, encoding='utf-8') as f:
+        text = "\n".join([f.read().strip()] * args.copies)
+    servers = [coqui_server.start(delay_per_char=args.delay_per_char) for _ in range(args.servers)]
+    urls = [server.url for server in servers]
+    print(f"Texte de {len(text)} caractères, {args.servers} faux serveur(s) Coqui")
+
+    single = _run("une requête", text, urls[:1], len(text), 1)
+    _run("morceaux, série", text, urls[:1], args.chunk_chars, 1)
+    chunked = _run(f"morceaux, {args.workers} requêtes, {args.servers} serveurs", text, urls, args.chunk_chars, args.workers)
+    if single and chunked:
+        print(f"Gain : x{single / chunked:.1f}")
+
+    for server in servers:
+        server.shutdown()
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
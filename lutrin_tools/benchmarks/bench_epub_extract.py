@@ -0,0 +1,129 @@
+# lutrin_tools/benchmarks/bench_epub_extract.py
+# Compare l'extraction du texte des EPUB : ancienne chaîne (_compact_html + BeautifulSoup)
+# contre l'extracteur lxml, en série puis réparti sur un pool de processus.
+# Vérifie aussi que les paragraphes produits sont identiques, y compris sur des cas limites
+# (commentaires, blocs imbriqués dans un paragraphe, document qui n'est pas en UTF-8).
+#
+# Usage (depuis la racine du projet) :
+#   python -m lutrin_tools.benchmarks.bench_epub_extract livre1.epub dossier_epubs/ [--workers N] [--repeat R]
+#   python -m lutrin_tools.benchmarks.bench_epub_extract --synthetic 60
+import argparse
+import os
+import time
+
+from bs4 import BeautifulSoup
+from ebooklib import epub, ITEM_DOCUMENT
+
+from lutrin_api.config import BASE_DIR
+from lutrin_api.services import epub_service
+
+SAMPLE_TEXT = os.path.join(BASE_DIR, '../lutrin_data/test01.txt')
+
+
+def _legacy_extract(content):
+    """Extraction telle qu'elle était faite avant lxml (référence)."""
+    soup = BeautifulSoup(epub_service._compact_html(content), 'html.parser')
+    paragraphs = []
+    for tag in soup.find_all(list(epub_service.PARAGRAPH_TAGS)):
+        raw = tag.get_text(separator=" ", strip=True)
+        if raw:
+            cleaned = epub_service._clean_paragraph(raw)
+            if cleaned:
+                paragraphs.append(cleaned)
+    return paragraphs
+
+
+# Documents XHTML bien formés où un parseur HTML classique s'écarte de html.parser
+EDGE_CASES = [
+    b'<html xmlns="http://www.w3.org/1999/xhtml"><body><p>x<!-- note -->y</p><p>a<?pi b?>c</p></body></html>',
+    b'<html xmlns="http://www.w3.org/1999/xhtml"><body><p>a<div>b</div>c</p><p>a<ul><li>b</li></ul></p></body></html>',
+    b'<html xmlns="http://www.w3.org/1999/xhtml"><body><h1><p>Titre</p></h1><p>a<h2>b</h2>c</p><p>a<p>b</p>c</p></body></html>',
+    '<html xmlns="http://www.w3.org/1999/xhtml"><body><p>Caf\xe9 cr\xe8me</p></body></html>'.encode('latin-1'),
+    b'<html xmlns="http://www.w3.org/1999/xhtml"><body><p>x<script>var a=1;</script> y</p><h1>T<style>h1{}</style>U</h1></body></html>',
+    b'<html xmlns="http://www.w3.org/1999/xhtml"><body><p>a<script><![CDATA[if (b<c) {}]]></script>d</p></body></html>',
+]
+
+
+def _load_corpus(paths):
+    """Retourne {nom: [contenu des documents]} pour chaque EPUB trouvé."""
+    corpus = {}
+    for path in paths:
+        files = [os.path.join(path, name) for name in sorted(os.listdir(path))] if os.path.isdir(path) else [path]
+        for file_path in files:
+            if file_path.lower().endswith('.epub'):
+                book = epub.read_epub(file_path)
+                corpus[os.path.basename(file_path)] = [item.get_content() for item in book.get_items_of_type(ITEM_DOCUMENT)]
+    return corpus
+
+
+def _synthetic_book(chapters):
+    """Livre synthétique : `chapters` documents XHTML d'environ 30 Ko chacun."""
+    with open(SAMPLE_TEXT, encoding='utf-8') as f:
+        sentence = f.read().strip()
+    documents = []
+    for index in range(chapters):
+        body = "\n".join(
+            f"  <p class=\"txt\">\n    {sentence} <i>{index}</i>&#160;<span>{n}</span>\n  </p>" for n in range(50)
+        )
+        documents.append(
+            f"<?xml version=\"1.0\" encoding=\"utf-8\"?>\n<html xmlns=\"http://www.w3.org/1999/xhtml\"><head><title>T</title></head>"
+            f"<body>\n<h1>Chapitre {index + 1}</h1>\n{body}\n</body></html>".encode('utf-8')
+        )
+    return documents
+
+
+def _best_time(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de l'extraction du texte des EPUB")
+    parser.add_argument('paths', nargs='*', help="Fichiers .epub ou dossiers en contenant")
+    parser.add_argument('--synthetic', type=int, default=0, help="Ajoute un livre synthétique de N chapitres")
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help="Nombre de processus d'extraction")
+    parser.add_argument('--repeat', type=int, default=3, help="Nombre de répétitions par mesure")
+    args = parser.parse_args()
+
+    corpus = _load_corpus(args.paths)
+    if args.synthetic:
+        corpus[f"synthétique ({args.synthetic} chapitres)"] = _synthetic_book(args.synthetic)
+    if not corpus:
+        parser.error("aucun EPUB fourni (donner des chemins ou --synthetic N)")
+    corpus["cas limites"] = EDGE_CASES
+
+    epub_service.EPUB_PARSE_WORKERS = args.workers
+    epub_service.init_epub_parser()
+    parallel_threshold = epub_service.EPUB_PARALLEL_MIN_BYTES
+
+    totals = {"legacy": 0.0, "lxml": 0.0, "parallel": 0.0}
+    print(f"{'livre':<40} {'Ko':>7} {'ancien':>8} {'lxml':>8} {'pool':>8} {'gain':>6}  identique")
+    for name, documents in corpus.items():
+        legacy_time, legacy = _best_time(lambda: [_legacy_extract(c) for c in documents], args.repeat)
+        lxml_time, fast = _best_time(lambda: [p for _, p in map(epub_service._extract_paragraphs, documents)], args.repeat)
+        # Le pool est forcé pour la mesure, quelle que soit la taille du livre
+        epub_service.EPUB_PARALLEL_MIN_BYTES = 0
+        parallel_time, parallel = _best_time(lambda: [p for _, p in epub_service._extract_documents(documents)], args.repeat)
+        epub_service.EPUB_PARALLEL_MIN_BYTES = parallel_threshold
+
+        identical = legacy == fast == parallel
+        best = min(lxml_time, parallel_time)
+        size = sum(len(c) for c in documents) / 1024
+        print(f"{name[:40]:<40} {size:7.0f} {legacy_time:8.3f} {lxml_time:8.3f} {parallel_time:8.3f} {legacy_time / best:5.1f}x  {'oui' if identical else 'NON'}")
+        totals["legacy"] += legacy_time
+        totals["lxml"] += lxml_time
+        totals["parallel"] += parallel_time
+
+    print(f"Total : ancien {totals['legacy']:.3f}s, lxml {totals['lxml']:.3f}s (x{totals['legacy'] / totals['lxml']:.1f}), "
+          f"pool {totals['parallel']:.3f}s (x{totals['legacy'] / totals['parallel']:.1f})")
+    if epub_service.epub_pool:
+        epub_service.epub_pool.shutdown()
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
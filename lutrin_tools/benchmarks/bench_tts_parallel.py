@@ -0,0 +1,75 @@
+# lutrin_tools/benchmarks/bench_tts_parallel.py
+# Compare la synthèse Piper série (un seul PiperVoice) à la synthèse parallèle par phrases.
+#
+# Usage (depuis la racine du projet) :
+#   python -m lutrin_tools.benchmarks.bench_tts_parallel [--workers N] [--repeat R] [--copies C]
+import argparse
+import os
+import tempfile
+import time
+import wave
+
+from lutrin_api.config import BASE_DIR, PIPER_MODEL
+from lutrin_api.services import tts_service
+
+SAMPLE_TEXT = os.path.join(BASE_DIR, '../lutrin_data/test01.txt')
+
+
+def _audio_duration(path):
+    with wave.open(path, 'rb') as wav_file:
+        return wav_file.getnframes() / wav_file.getframerate()
+
+
+def _bench(label, synthesize, text, repeat):
+    """Exécute `synthesize` `repeat` fois (après un échauffement) et retourne le meilleur temps."""
+    timings = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        audio_path = os.path.join(tmp_dir, 'bench.wav')
+        synthesize(text[:1000], audio_path)
+        for _ in range(repeat):
+            start = time.perf_counter()
+            synthesize(text, audio_path)
+            timings.append(time.perf_counter() - start)
+        duration = _audio_duration(audio_path)
+    best = min(timings)
+    print(f"{label:<10} meilleur={best:7.2f}s  moyen={sum(timings) / len(timings):7.2f}s  audio={duration:7.1f}s  RTF={best / duration:.3f}")
+    return best
+
+
+def _serial(text, audio_path):
+    with wave.open(audio_path, 'wb') as wav_file:
+        tts_service.voice.synthesize_wav(text, wav_file)
+
+
+def _parallel(text, audio_path):
+    tts_service._synthesize_piper_parallel(tts_service._split_sentences(text), audio_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de la synthèse Piper série vs parallèle")
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help="Nombre de processus Piper")
+    parser.add_argument('--repeat', type=int, default=3, help="Nombre de répétitions par mode")
+    parser.add_argument('--copies', type=int, default=20, help="Nombre de copies du texte de test (taille du 'chapitre')")
+    args = parser.parse_args()
+
+    # Le pool est piloté par la configuration : on la surcharge avant l'initialisation
+    tts_service.PIPER_WORKERS = args.workers
+    tts_service.init_tts_engine()
+    if not tts_service.voice or not tts_service.piper_pool:
+        print(f"Modèle Piper introuvable ou pool indisponible ({PIPER_MODEL}).")
+        return 1
+
+    with open(SAMPLE_TEXT, encoding='utf-8') as f:
+        text = "\n".join([f.read().strip()] * args.copies)
+
+    print(f"Texte: {len(text)} caractères, {len(tts_service._split_sentences(text))} segments, {args.workers} processus")
+    serial = _bench("série", _serial, text, args.repeat)
+    parallel = _bench("parallèle", _parallel, text, args.repeat)
+    print(f"Accélération : x{serial / parallel:.2f}")
+
+    tts_service.piper_pool.shutdown()
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,491 @@
+# lutrin_tools/benchmarks/loadtest.py
+# Test de charge du serveur API : des utilisateurs virtuels concurrents rejouent les parcours réels
+# (connexion, capture -> OCR -> synthèse -> téléchargement de l'audio, import d'un EPUB puis lecture
+# du premier chapitre avec préchargement des suivants), contre de faux serveurs Coqui, Groq et
+# Google Books locaux (lutrin_tools.fakes) dont la latence, le taux d'erreur et la taille des
+# réponses sont réglables. Rapport par route : débit, p50/p95/p99 et taux d'erreur, pour
+# dimensionner WAITRESS_THREADS et les JOB_WORKERS_*.
+#
+# Par défaut, un serveur API est démarré pour l'occasion, avec un dossier de données temporaire
+# (DATA_FOLDER), ses propres utilisateurs et la configuration pointant vers les faux serveurs.
+# Attention : les valeurs de lutrin_api/.env.local priment sur celles passées par le test.
+#
+# Usage (depuis la racine du projet) :
+#   python -m lutrin_tools.benchmarks.loadtest [--users 8] [--duration 60] [--threads 6] [--env JOB_WORKERS_OCR=2]
+#   python -m lutrin_tools.benchmarks.loadtest --ocr-engine paddle --tts-engine piper --mix ocr_tts=1
+#   python -m lutrin_tools.benchmarks.loadtest --api http://127.0.0.1:5000 --username demo --password demo
+import argparse
+import io
+import json
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import zipfile
+from collections import Counter, defaultdict
+
+import requests
+
+from lutrin_tools.fakes import coqui_server, google_books_server, groq_server
+from lutrin_tools.fakes.faults import Faults
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+SAMPLE_DIR = os.path.join(ROOT_DIR, 'lutrin_data')
+SAMPLE_TEXT = os.path.join(SAMPLE_DIR, 'test01.txt')
+SAMPLE_IMAGES = ('test02.jpg', 'test03.jpg', 'test04.jpg')
+
+# Variables de configuration fixées par le test pour le serveur démarré, et qu'un .env.local masquerait
+OVERRIDDEN_SETTINGS = ('DATA_FOLDER', 'FLASK_PORT', 'WAITRESS_THREADS', 'COQUI_TTS_URL', 'GROQ_BASE_URL', 'GROQ_TOKEN', 'GOOGLE_BOOKS_URL')
+
+
+# --- Données envoyées ---
+
+def _sample_text():
+    with open(SAMPLE_TEXT, encoding='utf-8') as f:
+        return f.read().strip()
+
+
+def _make_epub(title, chapters, text):
+    """EPUB minimal (OPF, NCX, chapitres XHTML) ; le titre change l'empreinte du fichier et la clé d'enrichissement."""
+    chapter_files = [f"chap_{index + 1:03d}.xhtml" for index in range(chapters)]
+    manifest = "\n".join(f'<item id="c{i}" href="{name}" media-type="application/xhtml+xml"/>' for i, name in enumerate(chapter_files))
+    spine = "\n".join(f'<itemref idref="c{i}"/>' for i in range(chapters))
+    nav_points = "\n".join(
+        f'<navPoint id="n{i}" playOrder="{i + 1}"><navLabel><text>Chapitre {i + 1}</text></navLabel><content src="{name}"/></navPoint>'
+        for i, name in enumerate(chapter_files)
+    )
+    paragraphs = "\n".join(f"<p>{text}</p>" for _ in range(30))
+
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr(zipfile.ZipInfo('mimetype'), 'application/epub+zip') # Premier et non compressé
+        archive.writestr('META-INF/container.xml', (
+            '<?xml version="1.0"?><container version="1.0" xmlns="urn:oasis:names:tc:opendocument:xmlns:container">'
+            '<rootfiles><rootfile full-path="OEBPS/content.opf" media-type="application/oebps-package+xml"/></rootfiles></container>'))
+        archive.writestr('OEBPS/content.opf', (
+            '<?xml version="1.0" encoding="utf-8"?>'
+            '<package xmlns="http://www.idpf.org/2007/opf" version="2.0" unique-identifier="id">'
+            '<metadata xmlns:dc="http://purl.org/dc/elements/1.1/">'
+            f'<dc:identifier id="id">lutrin-loadtest-{title}</dc:identifier><dc:title>{title}</dc:title>'
+            '<dc:creator>Frank Herbert</dc:creator><dc:language>fr</dc:language></metadata>'
+            f'<manifest><item id="ncx" href="toc.ncx" media-type="application/x-dtbncx+xml"/>{manifest}</manifest>'
+            f'<spine toc="ncx">{spine}</spine></package>'))
+        archive.writestr('OEBPS/toc.ncx', (
+            '<?xml version="1.0" encoding="utf-8"?><ncx xmlns="http://www.daisy.org/z3986/2005/ncx/" version="2005-1">'
+            f'<head/><docTitle><text>{title}</text></docTitle><navMap>{nav_points}</navMap></ncx>'))
+        for index, name in enumerate(chapter_files):
+            archive.writestr(f'OEBPS/{name}', (
+                '<?xml version="1.0" encoding="utf-8"?><html xmlns="http://www.w3.org/1999/xhtml"><head><title>T</title></head>'
+                f'<body><h1>Chapitre {index + 1}</h1>\n{paragraphs}</body></html>'))
+    return buffer.getvalue()
+
+
+# --- Mesures ---
+
+def _percentile(sorted_values, q):
+    """Percentile par interpolation linéaire entre les deux valeurs encadrantes."""
+    if not sorted_values:
+        return 0.0
+    position = (len(sorted_values) - 1) * q
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+
+def _latency_summary(timings, duration):
+    ordered = sorted(timings)
+    return {
+        "count": len(ordered),
+        "throughput": round(len(ordered) / duration, 3) if duration else 0.0,
+        "p50": round(_percentile(ordered, 0.5), 4),
+        "p95": round(_percentile(ordered, 0.95), 4),
+        "p99": round(_percentile(ordered, 0.99), 4),
+        "max": round(ordered[-1], 4) if ordered else 0.0,
+    }
+
+
+class Recorder:
+    """Latences et statuts des requêtes (par route) et durées des parcours, partagés par les utilisateurs."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = defaultdict(list) # route -> [(durée, statut ou nom de l'exception)]
+        self.flows = defaultdict(list) # parcours -> [(durée, réussi)]
+
+    def request(self, route, seconds, status):
+        with self._lock:
+            self.requests[route].append((seconds, status))
+
+    def flow(self, name, seconds, ok):
+        with self._lock:
+            self.flows[name].append((seconds, ok))
+
+    def summary(self, duration):
+        with self._lock:
+            requests_ = {route: list(samples) for route, samples in self.requests.items()}
+            flows = {name: list(samples) for name, samples in self.flows.items()}
+        report = {"routes": {}, "flows": {}}
+        for route, samples in sorted(requests_.items()):
+            errors = [status for _, status in samples if not isinstance(status, int) or status >= 400]
+            report["routes"][route] = {
+                **_latency_summary([seconds for seconds, _ in samples], duration),
+                "errors": len(errors),
+                "error_rate": round(len(errors) / len(samples), 4),
+                "statuses": dict(Counter(str(status) for _, status in samples)),
+            }
+        for name, samples in sorted(flows.items()):
+            failed = sum(1 for _, ok in samples if not ok)
+            report["flows"][name] = {
+                **_latency_summary([seconds for seconds, ok in samples if ok], duration),
+                "completed": len(samples) - failed,
+                "failed": failed,
+            }
+        return report
+
+
+# --- Utilisateurs virtuels ---
+
+class VirtualUser:
+    """Un utilisateur : une session HTTP (keep-alive) qui enchaîne les parcours jusqu'à la fin du test."""
+
+    def __init__(self, index, context):
+        self.index = index
+        self.context = context
+        self.args = context['args']
+        self.recorder = context['recorder']
+        self.random = random.Random(self.args.seed * 1000 + index)
+        self.session = requests.Session()
+        self.session.trust_env = False # Pas de proxy système entre le test et le serveur local
+        self.iteration = 0
+
+    def _call(self, route, method, path, **kwargs):
+        """Requête chronométrée (corps de la réponse compris). Retourne la réponse si elle a réussi, sinon None."""
+        start = time.perf_counter()
+        try:
+            response = self.session.request(method, self.context['api'] + path, timeout=self.args.timeout, **kwargs)
+            response.content
+        except requests.RequestException as e:
+            self.recorder.request(route, time.perf_counter() - start, type(e).__name__)
+            return None
+        self.recorder.request(route, time.perf_counter() - start, response.status_code)
+        return response if response.ok else None
+
+    def _process(self, route, path, **kwargs):
+        """
+        Appel d'un traitement (OCR, TTS, EPUB), synchrone ou, avec --async, via la file de travaux :
+        soumission puis attente de la fin sur le flux d'événements du travail. Retourne le résultat ou None.
+        """
+        if not self.args.use_async:
+            response = self._call(route, 'POST', path, **kwargs)
+            return response.json() if response is not None else None
+
+        response = self._call(f"{route} (async)", 'POST', f"{path}?async=1", **kwargs)
+        if response is None:
+            return None
+        events = self._call("GET /jobs/<id>/events", 'GET', f"/jobs/{response.json()['job_id']}/events")
+        if events is None:
+            return None
+        data = [line[len('data: '):] for line in events.text.splitlines() if line.startswith('data: ')]
+        job = json.loads(data[-1]) if data else {}
+        if job.get('status') != 'done' or job.get('result_status', 500) >= 400:
+            return None
+        return job['result']
+
+    def login(self):
+        username, password = self.context['credentials'][self.index % len(self.context['credentials'])]
+        response = self._call("POST /auth/login", 'POST', '/auth/login', json={"username": username, "password": password})
+        if response is None:
+            return False
+        self.session.headers['X-API-Key'] = response.json()['api_key']
+        return True
+
+    def ocr_tts(self):
+        """Capture d'une page, OCR, synthèse du texte reconnu et téléchargement de l'audio."""
+        name = self.random.choice(SAMPLE_IMAGES)
+        upload = self._call("POST /upload", 'POST', '/upload', files={'image': (name, self.context['images'][name], 'image/jpeg')})
+        if upload is None:
+            return False
+        ocr = self._process("POST /ocr", '/ocr', json={"image_filename": upload.json()['image_filename'], "ocr_engine": self.args.ocr_engine})
+        if ocr is None:
+            return False
+
+        text = ocr['text'][:self.args.tts_chars]
+        if not self.args.tts_cache_hits:
+            # Texte unique : la synthèse est réellement effectuée au lieu d'être servie par le cache audio
+            text += f" Page {self.index}-{self.iteration}-{self.context['run_id']}."
+        tts = self._process("POST /tts", '/tts', json={"text": text, "tts_engine": self.args.tts_engine, "format": self.args.audio_format})
+        if tts is None:
+            return False
+        return self._call("GET /file/<audio>", 'GET', f"/file/{tts['audio_filename']}") is not None
+
+    def epub(self):
+        """Import d'un EPUB, ouverture du livre, lecture du premier chapitre et préchargement des suivants."""
+        title = f"Livre {self.context['run_id']}-{self.index}-{self.iteration}"
+        data = _make_epub(title, self.args.epub_chapters, self.context['text'])
+        added = self._process("POST /epub/add", '/epub/add', files={'epub_file': (f"{title}.epub", data, 'application/epub+zip')})
+        if added is None:
+            return False
+
+        book_id = added['data']['book_id']
+        book = self._call("GET /library/books/<id>", 'GET', f"/library/books/{book_id}")
+        if book is None:
+            return False
+        chapters = book.json()['book']['chapters']
+        for chapter in chapters[:1 + self.args.prefetch]:
+            if self._call("GET /library/books/<id>/chapters/<idx>", 'GET', f"/library/books/{book_id}/chapters/{chapter['index']}") is None:
+                return False
+        return True
+
+    def run(self, start_at, stop_at):
+        time.sleep(max(0.0, start_at - time.monotonic()))
+        start = time.perf_counter()
+        ok = self.login()
+        self.recorder.flow('login', time.perf_counter() - start, ok)
+        if not ok:
+            return
+
+        flows, weights = zip(*self.context['mix'])
+        while time.monotonic() < stop_at:
+            flow = self.random.choices(flows, weights)[0]
+            start = time.perf_counter()
+            ok = getattr(self, flow)()
+            self.recorder.flow(flow, time.perf_counter() - start, ok)
+            self.iteration += 1
+            if self.args.think:
+                time.sleep(self.random.uniform(0, 2 * self.args.think))
+
+
+# --- Serveurs ---
+
+def _start_fakes(args):
+    def faults(latency):
+        return Faults(latency, args.fake_jitter, args.fake_error_rate, seed=args.seed)
+
+    return {
+        "coqui": coqui_server.start(delay_per_char=args.coqui_delay_per_char, concurrency=args.coqui_concurrency,
+                                    faults=faults(args.coqui_latency)),
+        "groq": groq_server.start(ocr_chars=args.ocr_chars, faults=faults(args.groq_latency)),
+        "google_books": google_books_server.start(results=args.google_results, description_chars=args.description_chars,
+                                                  faults=faults(args.google_latency)),
+    }
+
+
+def _server_status(api, timeout, credentials=None):
+    """
+    État du serveur API (/status), sans passer par un éventuel proxy système.
+    Avec des identifiants (nom, mot de passe), la réponse contient le détail des caches et des files.
+    """
+    with requests.Session() as session:
+        session.trust_env = False
+        if credentials:
+            username, password = credentials
+            login = session.post(f"{api}/auth/login", json={"username": username, "password": password}, timeout=timeout)
+            login.raise_for_status()
+            session.headers['X-API-Key'] = login.json()['api_key']
+        return session.get(f"{api}/status", timeout=timeout)
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _warn_overridden_settings():
+    """Signale les réglages de lutrin_api/.env.local qui masqueraient ceux du test."""
+    try:
+        from dotenv import dotenv_values
+    except ImportError:
+        return
+    local = dotenv_values(os.path.join(ROOT_DIR, 'lutrin_api', '.env.local'))
+    masked = [key for key in OVERRIDDEN_SETTINGS if local.get(key)]
+    if masked:
+        print(f"Attention : lutrin_api/.env.local fixe {', '.join(masked)}, qui prime sur la configuration du test.", file=sys.stderr)
+
+
+def _spawn_server(args, fakes, data_folder):
+    """Crée les utilisateurs du test puis démarre le serveur API ; retourne (processus, URL)."""
+    port = _free_port()
+    env = dict(os.environ,
+               DATA_FOLDER=data_folder,
+               FLASK_PORT=str(port),
+               WAITRESS_THREADS=str(args.threads),
+               COQUI_TTS_URL=fakes['coqui'].url,
+               GROQ_BASE_URL=fakes['groq'].url,
+               GROQ_TOKEN='loadtest',
+               GOOGLE_BOOKS_URL=fakes['google_books'].url,
+               LOG_LEVEL=args.server_log_level)
+    env.update(setting.split('=', 1) for setting in args.env)
+    _warn_overridden_settings()
+
+    create_users = (
+        "from lutrin_api.services import auth_service\n"
+        "auth_service.init_db()\n"
+        f"for i in range({args.users}):\n"
+        "    auth_service.add_user(f'loadtest{i}', 'loadtest', f'loadtest{i}@lutrin.local')\n"
+    )
+    subprocess.run([args.python, '-c', create_users], env=env, cwd=ROOT_DIR, check=True,
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    log = open(os.path.join(data_folder, 'server.log'), 'wb')
+    process = subprocess.Popen([args.python, '-m', 'lutrin_api.server'], env=env, cwd=ROOT_DIR, stdout=log, stderr=subprocess.STDOUT)
+    api = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + args.startup_timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"le serveur API s'est arrêté au démarrage (voir {log.name})")
+        try:
+            if _server_status(api, 2).ok:
+                return process, api
+        except requests.RequestException:
+            pass
+        time.sleep(0.5)
+    process.terminate()
+    raise RuntimeError(f"le serveur API n'a pas démarré en {args.startup_timeout}s (voir {log.name})")
+
+
+def _parse_mix(value):
+    mix = []
+    for part in value.split(','):
+        name, _, weight = part.partition('=')
+        if name not in ('ocr_tts', 'epub'):
+            raise argparse.ArgumentTypeError(f"parcours inconnu : {name} (ocr_tts, epub)")
+        mix.append((name, float(weight or 1)))
+    return mix
+
+
+def _print_report(report):
+    print(f"\n{report['users']} utilisateurs, {report['duration_s']:.0f}s")
+    print(f"{'route':<42} {'requêtes':>8} {'req/s':>7} {'p50':>8} {'p95':>8} {'p99':>8} {'erreurs':>8}")
+    for route, stats in report['routes'].items():
+        print(f"{route:<42} {stats['count']:>8} {stats['throughput']:>7.2f} {stats['p50']:>8.3f} {stats['p95']:>8.3f} "
+              f"{stats['p99']:>8.3f} {stats['error_rate'] * 100:>7.1f}%")
+    print(f"\n{'parcours':<42} {'réussis':>8} {'/s':>7} {'p50':>8} {'p95':>8} {'p99':>8} {'échecs':>8}")
+    for name, stats in report['flows'].items():
+        print(f"{name:<42} {stats['completed']:>8} {stats['throughput']:>7.2f} {stats['p50']:>8.3f} {stats['p95']:>8.3f} "
+              f"{stats['p99']:>8.3f} {stats['failed']:>8}")
+    fakes = ", ".join(f"{name} {stats['requests']} ({stats['errors']} en erreur)" for name, stats in report['fakes'].items())
+    print(f"\nFaux services : {fakes}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Test de charge du serveur API contre de faux services Coqui, Groq et Google Books")
+    parser.add_argument('--users', type=int, default=8, help="Utilisateurs virtuels simultanés")
+    parser.add_argument('--duration', type=float, default=60, help="Durée du test (s)")
+    parser.add_argument('--ramp-up', type=float, default=5, help="Délai de démarrage de l'ensemble des utilisateurs (s)")
+    parser.add_argument('--think', type=float, default=1.0, help="Pause moyenne entre deux parcours (s)")
+    parser.add_argument('--mix', type=_parse_mix, default=_parse_mix('ocr_tts=3,epub=1'), help="Parcours et poids (ocr_tts=3,epub=1)")
+    parser.add_argument('--async', dest='use_async', action='store_true', help="Traitements via la file de travaux (?async=1)")
+    parser.add_argument('--ocr-engine', default='groq', choices=('groq', 'paddle'))
+    parser.add_argument('--tts-engine', default='coqui', choices=('coqui', 'piper'))
+    parser.add_argument('--audio-format', default='wav', choices=('wav', 'mp3', 'opus'))
+    parser.add_argument('--tts-chars', type=int, default=600, help="Longueur maximale du texte synthétisé")
+    parser.add_argument('--tts-cache-hits', action='store_true', help="Ne pas rendre les textes uniques (synthèses servies par le cache)")
+    parser.add_argument('--epub-chapters', type=int, default=20, help="Chapitres des EPUB importés")
+    parser.add_argument('--prefetch', type=int, default=2, help="Chapitres préchargés après le premier")
+    parser.add_argument('--timeout', type=float, default=300, help="Délai maximal d'une requête (s)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help="Fichier JSON du rapport")
+
+    server = parser.add_argument_group("serveur API")
+    server.add_argument('--api', help="URL d'un serveur déjà démarré (sinon, un serveur est démarré pour le test)")
+    server.add_argument('--username', default='loadtest', help="Compte utilisé avec --api")
+    server.add_argument('--password', default='loadtest', help="Mot de passe du compte utilisé avec --api")
+    server.add_argument('--threads', type=int, default=6, help="WAITRESS_THREADS du serveur démarré")
+    server.add_argument('--env', action='append', default=[], metavar='CLÉ=VALEUR', help="Réglage supplémentaire du serveur démarré (répétable)")
+    server.add_argument('--python', default=sys.executable, help="Interpréteur du serveur démarré")
+    server.add_argument('--startup-timeout', type=float, default=180, help="Attente maximale du démarrage (chargement des modèles)")
+    server.add_argument('--server-log-level', default='warning', help="LOG_LEVEL du serveur démarré")
+    server.add_argument('--keep-data', action='store_true', help="Conserver le dossier de données du serveur démarré")
+
+    fakes_group = parser.add_argument_group("faux services")
+    fakes_group.add_argument('--coqui-delay-per-char', type=float, default=0.01, help="Temps de synthèse Coqui par caractère (s)")
+    fakes_group.add_argument('--coqui-concurrency', type=int, default=1, help="Synthèses Coqui simultanées")
+    fakes_group.add_argument('--coqui-latency', type=float, default=0.05, help="Latence fixe de Coqui (s)")
+    fakes_group.add_argument('--groq-latency', type=float, default=0.8, help="Latence de Groq (s)")
+    fakes_group.add_argument('--google-latency', type=float, default=0.2, help="Latence de Google Books (s)")
+    fakes_group.add_argument('--fake-jitter', type=float, default=0.0, help="Variation aléatoire des latences (± s)")
+    fakes_group.add_argument('--fake-error-rate', type=float, default=0.0, help="Proportion de réponses en erreur (0 à 1)")
+    fakes_group.add_argument('--ocr-chars', type=int, default=1500, help="Longueur du texte renvoyé par l'OCR Groq")
+    fakes_group.add_argument('--google-results', type=int, default=10, help="Volumes renvoyés par Google Books")
+    fakes_group.add_argument('--description-chars', type=int, default=1200, help="Longueur des descriptions Google Books")
+    args = parser.parse_args()
+
+    fakes = _start_fakes(args)
+    process, data_folder = None, None
+    if args.api:
+        api = args.api.rstrip('/')
+        credentials = [(args.username, args.password)]
+        print("Serveur existant : configurez-le avec "
+              f"COQUI_TTS_URL={fakes['coqui'].url} GROQ_BASE_URL={fakes['groq'].url} GOOGLE_BOOKS_URL={fakes['google_books'].url}")
+    else:
+        data_folder = tempfile.mkdtemp(prefix='lutrin_loadtest_')
+        process, api = _spawn_server(args, fakes, data_folder)
+        credentials = [(f"loadtest{i}", 'loadtest') for i in range(args.users)]
+        print(f"Serveur API démarré sur {api} (données : {data_folder})")
+
+    context = {
+        "args": args,
+        "api": api,
+        "credentials": credentials,
+        "mix": args.mix,
+        "recorder": Recorder(),
+        "run_id": f"{int(time.time())}",
+        "text": _sample_text(),
+        "images": {},
+    }
+    for name in SAMPLE_IMAGES:
+        with open(os.path.join(SAMPLE_DIR, name), 'rb') as f:
+            context['images'][name] = f.read()
+
+    try:
+        print(f"{args.users} utilisateurs pendant {args.duration:.0f}s (montée en charge {args.ramp_up:.0f}s)...")
+        start = time.monotonic()
+        stop_at = start + args.duration
+        threads = []
+        for index in range(args.users):
+            user = VirtualUser(index, context)
+            start_at = start + args.ramp_up * index / max(1, args.users)
+            thread = threading.Thread(target=user.run, args=(start_at, stop_at), name=f"user-{index}", daemon=True)
+            thread.start()
+            threads.append(thread)
+        for thread in threads:
+            thread.join()
+        duration = time.monotonic() - start
+
+        report = {
+            "users": args.users,
+            "duration_s": round(duration, 1),
+            "settings": {key: value for key, value in vars(args).items() if key not in ('mix', 'password')},
+            **context['recorder'].summary(duration),
+            "fakes": {name: {"requests": server.stats['requests'], "errors": server.stats['errors']} for name, server in fakes.items()},
+        }
+        try:
+            report["server_status"] = _server_status(api, 10, context['credentials'][0]).json()
+        except (requests.RequestException, ValueError):
+            report["server_status"] = None
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait(timeout=30)
+        for server in fakes.values():
+            server.shutdown()
+        if data_folder and not args.keep_data:
+            shutil.rmtree(data_folder, ignore_errors=True)
+
+    _print_report(report)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+            f.write("\n")
+        print(f"Rapport : {args.output}")
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,475 @@
+# lutrin_tools/benchmarks/suite.py
+# Suite de benchmarks des chemins critiques : OCR Paddle et remise en ordre des pages,
+# synthèse Piper (phrase, page, chapitre), extraction des EPUB et authentification.
+# Chaque cas est exécuté après un échauffement, sur plusieurs répétitions ; le résultat
+# (débit, percentiles de latence, pic de mémoire) est écrit en JSON et comparé à une
+# référence enregistrée : la commande échoue (code 1) si un cas a régressé au-delà du seuil
+# ou s'est terminé en erreur. Seuls les cas dont le moteur est absent (modèle Piper, PaddleOCR)
+# sont ignorés sans faire échouer la commande.
+#
+# Usage (depuis la racine du projet) :
+#   python -m lutrin_tools.benchmarks.suite [--only piper] [--repeat 10] [--output resultats.json]
+#   python -m lutrin_tools.benchmarks.suite --save-baseline   # enregistre la référence
+import os
+
+# Les journaux des services ne doivent ni fausser les mesures ni se mêler aux résultats
+os.environ.setdefault('LOG_LEVEL', 'warning')
+
+import argparse
+import gc
+import io
+import json
+import platform
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+from ebooklib import epub
+
+from lutrin_api.config import BASE_DIR, PIPER_WORKERS, OCR_BATCH_MAX_SIZE, EPUB_PARSE_WORKERS
+from lutrin_api.services import auth_service, epub_service, logger_service, ocr_service, tts_service
+from lutrin_tools.benchmarks.bench_epub_extract import _legacy_extract, _synthetic_book
+
+DATA_DIR = os.path.join(BASE_DIR, '../lutrin_data')
+SAMPLE_TEXT = os.path.join(DATA_DIR, 'test01.txt')
+SAMPLE_IMAGES = ('test02.jpg', 'test03.jpg', 'test04.jpg')
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+# Schéma du fichier de résultats (à incrémenter si sa structure change)
+FORMAT_VERSION = 1
+
+
+class Skip(Exception):
+    """Cas impossible à exécuter dans cet environnement (moteur ou modèle absent)."""
+
+
+class Case:
+    """
+    Cas de benchmark : `run` est appelé à chaque répétition et traite `units` unités
+    (`unit` : images, caractères, Ko...). `warmup` et `repeat` plafonnent les valeurs
+    de la ligne de commande pour les cas longs.
+    """
+
+    def __init__(self, run, units, unit, warmup=None, repeat=None, cleanup=None):
+        self.run = run
+        self.units = units
+        self.unit = unit
+        self.warmup = warmup
+        self.repeat = repeat
+        self.cleanup = cleanup
+
+
+# --- Données de test ---
+
+def _sample_text(copies=1):
+    with open(SAMPLE_TEXT, encoding='utf-8') as f:
+        return "\n".join([f.read().strip()] * copies)
+
+
+def _synthetic_double_page(lines_per_page=32, words_per_line=9, seed=0):
+    """
+    Résultat PaddleOCR simulé d'une double page scannée (une boîte par mot), dans le format
+    attendu par _reordonner_double_page. Les boîtes sont mélangées, comme en sortie du détecteur.
+    """
+    rng = random.Random(seed)
+    words = _sample_text().split()
+    texts, polys = [], []
+    for page_left in (80, 1080):
+        for line in range(lines_per_page):
+            # Saut de paragraphe toutes les 8 lignes
+            top = 100 + line * 42 + (line // 8) * 30
+            x = page_left + rng.randint(0, 12)
+            for _ in range(words_per_line):
+                word = rng.choice(words)
+                width = 12 * len(word) + rng.randint(-4, 4)
+                y = top + rng.randint(-2, 2)
+                texts.append(word)
+                polys.append(np.array([[x, y], [x + width, y], [x + width, y + 30], [x, y + 30]], dtype=np.int16))
+                x += width + 14
+    order = list(range(len(texts)))
+    rng.shuffle(order)
+    return [{'rec_texts': [texts[i] for i in order], 'rec_polys': [polys[i] for i in order]}]
+
+
+def _synthetic_epub(chapters):
+    """Fichier EPUB synthétique (en mémoire) de `chapters` chapitres d'environ 30 Ko."""
+    book = epub.EpubBook()
+    book.set_identifier('lutrin-benchmark')
+    book.set_title('Livre de référence')
+    book.set_language('fr')
+    book.add_author('Lutrin')
+    items = []
+    for index, content in enumerate(_synthetic_book(chapters)):
+        item = epub.EpubHtml(title=f"Chapitre {index + 1}", file_name=f"chap_{index + 1:03d}.xhtml", lang='fr')
+        item.content = content
+        book.add_item(item)
+        items.append(item)
+    book.toc = items
+    book.add_item(epub.EpubNcx())
+    book.add_item(epub.EpubNav())
+    book.spine = ['nav', *items]
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, 'livre.epub')
+        epub.write_epub(path, book)
+        with open(path, 'rb') as f:
+            return f.read()
+
+
+# --- Cas ---
+
+def _ocr_engine():
+    ocr_service.init_ocr_engine()
+    if ocr_service.ocr_engine is None:
+        raise Skip("PaddleOCR indisponible")
+
+
+def case_ocr_paddle(args):
+    """OCR Paddle d'une page scannée (décodée en mémoire), remise en ordre comprise."""
+    _ocr_engine()
+    images = []
+    for name in SAMPLE_IMAGES:
+        with open(os.path.join(DATA_DIR, name), 'rb') as f:
+            images.append(ocr_service._decode_image(f.read()))
+    cycle = iter(range(sys.maxsize))
+    return Case(lambda: ocr_service._ocr_image_paddle(images[next(cycle) % len(images)]), 1, 'images')
+
+
+def case_ocr_reorder(args):
+    """Remise en ordre de lecture d'une double page (environ 580 boîtes)."""
+    result = _synthetic_double_page()
+    return Case(lambda: ocr_service._reordonner_double_page(result), 1, 'pages')
+
+
+def _piper_case(text, warmup=None, repeat=None):
+    tts_service.init_tts_engine()
+    if tts_service.voice is None:
+        raise Skip("modèle Piper introuvable")
+    tmp_dir = tempfile.TemporaryDirectory()
+    audio_path = os.path.join(tmp_dir.name, 'bench.wav')
+
+    def run():
+        success, message = tts_service._generate_tts_piper(text, audio_path)
+        if not success:
+            raise RuntimeError(message)
+
+    return Case(run, len(text), 'caractères', warmup, repeat, tmp_dir.cleanup)
+
+
+def case_piper_short(args):
+    """Synthèse Piper d'une phrase."""
+    return _piper_case(_sample_text().split('.')[0] + '.')
+
+
+def case_piper_page(args):
+    """Synthèse Piper d'une page (environ 2 200 caractères)."""
+    return _piper_case(_sample_text(4))
+
+
+def case_piper_chapter(args):
+    """Synthèse Piper d'un chapitre (environ 22 000 caractères) : 3 répétitions au plus, sans échauffement."""
+    return _piper_case(_sample_text(40), warmup=0, repeat=3)
+
+
+def _epub_documents(args):
+    return _synthetic_book(args.epub_chapters)
+
+
+def case_epub_extract(args):
+    """Extraction des paragraphes des documents XHTML d'un livre (lxml, pool selon la configuration)."""
+    documents = _epub_documents(args)
+    epub_service.init_epub_parser()
+    return Case(lambda: list(epub_service._extract_documents(documents)), sum(map(len, documents)) / 1024, 'Ko')
+
+
+def case_epub_extract_legacy(args):
+    """Même extraction avec l'ancienne chaîne _compact_html + BeautifulSoup (référence)."""
+    documents = _epub_documents(args)
+    return Case(lambda: [_legacy_extract(content) for content in documents], sum(map(len, documents)) / 1024, 'Ko')
+
+
+def case_epub_read(args):
+    """Lecture complète d'un fichier EPUB : archive, métadonnées, couverture, ordre de lecture et chapitres."""
+    data = _synthetic_epub(args.epub_chapters)
+    epub_service.init_epub_parser()
+
+    def run():
+        book = epub.read_epub(io.BytesIO(data))
+        epub_service._read_metadata(book)
+        epub_service._find_cover(book)
+        documents = epub_service._spine_documents(book)
+        return list(epub_service._iter_chapters(book, documents))
+
+    return Case(run, len(data) / 1024, 'Ko')
+
+
+def _auth_database():
+    """Base d'authentification temporaire avec un utilisateur ; retourne (clé d'API, nettoyage)."""
+    tmp_dir = tempfile.TemporaryDirectory()
+    auth_service.DATABASE_PATH = os.path.join(tmp_dir.name, 'bench.db')
+    auth_service._local.conn = None
+    auth_service.init_db()
+    auth_service.add_user('benchmark', 'benchmark', 'benchmark@lutrin.local')
+    api_key = auth_service.get_api_key_by_username('benchmark')
+
+    def cleanup():
+        auth_service._local.conn.close()
+        auth_service._local.conn = None
+        tmp_dir.cleanup()
+
+    return api_key, cleanup
+
+
+def case_auth_lookup_cached(args):
+    """Recherche d'un utilisateur par clé d'API, servie par le cache en mémoire (1 000 recherches)."""
+    api_key, cleanup = _auth_database()
+
+    def run():
+        for _ in range(1000):
+            auth_service.get_user_by_api_key(api_key)
+
+    return Case(run, 1000, 'recherches', cleanup=cleanup)
+
+
+def case_auth_lookup_db(args):
+    """Recherche d'un utilisateur par clé d'API dans SQLite, cache invalidé (1 000 recherches)."""
+    api_key, cleanup = _auth_database()
+
+    def run():
+        for _ in range(1000):
+            auth_service.invalidate_user_cache(api_key)
+            auth_service.get_user_by_api_key(api_key)
+
+    return Case(run, 1000, 'recherches', cleanup=cleanup)
+
+
+CASES = {
+    'ocr_paddle': case_ocr_paddle,
+    'ocr_reorder': case_ocr_reorder,
+    'piper_short': case_piper_short,
+    'piper_page': case_piper_page,
+    'piper_chapter': case_piper_chapter,
+    'epub_extract': case_epub_extract,
+    'epub_extract_legacy': case_epub_extract_legacy,
+    'epub_read': case_epub_read,
+    'auth_lookup_cached': case_auth_lookup_cached,
+    'auth_lookup_db': case_auth_lookup_db,
+}
+
+
+# --- Mesure ---
+
+def _reset_peak_rss():
+    """Remet à zéro le pic de mémoire du processus (Linux). Retourne False si impossible."""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def _peak_rss_kb():
+    """Pic de mémoire résidente du processus, en Ko (VmHWM, sinon ru_maxrss)."""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maxrss // 1024 if sys.platform == 'darwin' else maxrss
+
+
+def _percentile(sorted_values, q):
+    """Percentile par interpolation linéaire entre les deux valeurs encadrantes."""
+    position = (len(sorted_values) - 1) * q
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+
+def _measure(case, warmup, repeat):
+    """Échauffement puis `repeat` exécutions chronométrées ; retourne les statistiques du cas."""
+    warmup = warmup if case.warmup is None else min(warmup, case.warmup)
+    repeat = repeat if case.repeat is None else min(repeat, case.repeat)
+    for _ in range(warmup):
+        case.run()
+    gc.collect()
+    peak_scope = 'case' if _reset_peak_rss() else 'process'
+
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        case.run()
+        timings.append(time.perf_counter() - start)
+
+    ordered = sorted(timings)
+    return {
+        "repeat": repeat,
+        "warmup": warmup,
+        "unit": case.unit,
+        "units_per_run": round(case.units, 3),
+        "throughput": round(case.units * repeat / sum(timings), 3),
+        "latency_s": {
+            "min": round(ordered[0], 6),
+            "mean": round(sum(ordered) / repeat, 6),
+            "p50": round(_percentile(ordered, 0.5), 6),
+            "p90": round(_percentile(ordered, 0.9), 6),
+            "p99": round(_percentile(ordered, 0.99), 6),
+            "max": round(ordered[-1], 6),
+        },
+        "peak_rss_kb": _peak_rss_kb(),
+        "peak_rss_scope": peak_scope,
+    }
+
+
+def _environment():
+    """Contexte de la mesure : machine, versions et configuration influant sur les résultats."""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                cwd=BASE_DIR, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "system": platform.system(),
+        "cpu_count": os.cpu_count(),
+        "config": {
+            "PIPER_WORKERS": PIPER_WORKERS,
+            "OCR_BATCH_MAX_SIZE": OCR_BATCH_MAX_SIZE,
+            "EPUB_PARSE_WORKERS": EPUB_PARSE_WORKERS,
+        },
+    }
+
+
+# --- Comparaison à la référence ---
+
+def _compare(results, baseline, threshold, rss_threshold):
+    """
+    Compare chaque cas à la référence : latence médiane (p50) et pic de mémoire.
+    Un seuil propre à un cas peut être donné dans la référence ("thresholds": {cas: fraction}).
+    Retourne {cas: comparaison} ; 'regression' est vrai si un seuil est dépassé.
+    """
+    comparison = {}
+    thresholds = baseline.get('thresholds', {})
+    for name, result in results.items():
+        reference = baseline.get('results', {}).get(name)
+        if 'error' in result or not reference or 'latency_s' not in reference:
+            continue
+        case_threshold = thresholds.get(name, threshold)
+        latency_ratio = result['latency_s']['p50'] / reference['latency_s']['p50']
+        rss_ratio = result['peak_rss_kb'] / reference['peak_rss_kb'] if reference.get('peak_rss_kb') else 1.0
+        comparison[name] = {
+            "p50_ratio": round(latency_ratio, 3),
+            "rss_ratio": round(rss_ratio, 3),
+            "threshold": case_threshold,
+            "regression": latency_ratio > 1 + case_threshold or rss_ratio > 1 + rss_threshold,
+        }
+    return comparison
+
+
+def _print_summary(report, comparison):
+    """Tableau lisible, sur la sortie d'erreur (la sortie standard peut porter le JSON)."""
+    print(f"{'cas':<22} {'p50':>9} {'p90':>9} {'p99':>9} {'débit':>21} {'RSS Mo':>8}  référence", file=sys.stderr)
+    for name, result in report['results'].items():
+        if 'skipped' in result or 'error' in result:
+            print(f"{name:<22} {'ignoré : ' + result['skipped'] if 'skipped' in result else 'ERREUR : ' + result['error']}",
+                  file=sys.stderr)
+            continue
+        latency = result['latency_s']
+        compared = comparison.get(name)
+        verdict = ''
+        if compared:
+            verdict = f"x{compared['p50_ratio']:.2f}" + ('  RÉGRESSION' if compared['regression'] else '')
+        print(f"{name:<22} {latency['p50']:9.4f} {latency['p90']:9.4f} {latency['p99']:9.4f} "
+              f"{result['throughput']:>10.1f} {result['unit']:<10} {result['peak_rss_kb'] / 1024:8.1f}  {verdict}",
+              file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Suite de benchmarks des chemins critiques (OCR, TTS, EPUB, authentification)")
+    parser.add_argument('--only', action='append', default=[], help="N'exécute que les cas dont le nom contient ce texte (répétable)")
+    parser.add_argument('--list', action='store_true', help="Liste les cas et quitte")
+    parser.add_argument('--warmup', type=int, default=2, help="Exécutions d'échauffement par cas")
+    parser.add_argument('--repeat', type=int, default=10, help="Exécutions mesurées par cas")
+    parser.add_argument('--epub-chapters', type=int, default=40, help="Nombre de chapitres du livre synthétique")
+    parser.add_argument('--output', help="Fichier JSON des résultats (par défaut : sortie standard)")
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help="Fichier de référence")
+    parser.add_argument('--save-baseline', action='store_true', help="Enregistre les résultats comme nouvelle référence")
+    parser.add_argument('--threshold', type=float, default=0.15, help="Hausse tolérée de la latence médiane (fraction)")
+    parser.add_argument('--rss-threshold', type=float, default=0.25, help="Hausse tolérée du pic de mémoire (fraction)")
+    args = parser.parse_args()
+
+    if args.list:
+        for name, factory in CASES.items():
+            print(f"{name:<22} {factory.__doc__.strip()}")
+        return 0
+
+    selected = [name for name in CASES if not args.only or any(part in name for part in args.only)]
+    if not selected:
+        parser.error(f"aucun cas ne correspond à {args.only}")
+
+    report = {"format": FORMAT_VERSION, "environment": _environment(), "results": {}}
+    for name in selected:
+        print(f"... {name}", file=sys.stderr)
+        case = None
+        try:
+            case = CASES[name](args)
+            report['results'][name] = _measure(case, args.warmup, args.repeat)
+        except Skip as e:
+            report['results'][name] = {"skipped": str(e)}
+        except Exception as e:
+            report['results'][name] = {"error": repr(e)}
+        finally:
+            if case is not None and case.cleanup:
+                case.cleanup()
+    logger_service.flush()
+
+    baseline = None
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+    if baseline and not args.save_baseline:
+        if baseline.get('environment', {}).get('machine') != report['environment']['machine']:
+            print(f"Attention : référence mesurée sur une autre machine ({baseline['environment'].get('machine')}).", file=sys.stderr)
+    comparison = _compare(report['results'], baseline, args.threshold, args.rss_threshold) if baseline and not args.save_baseline else {}
+    if comparison:
+        report['baseline'] = {"path": args.baseline, "commit": baseline.get('environment', {}).get('commit'), "comparison": comparison}
+
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+    if args.save_baseline:
+        measured = {name: result for name, result in report['results'].items() if 'latency_s' in result}
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            # Les seuils propres à certains cas, ajoutés à la main, sont conservés
+            json.dump({**report, "results": measured, "thresholds": (baseline or {}).get('thresholds', {})}, f, indent=2, ensure_ascii=False)
+            f.write("\n")
+        print(f"Référence enregistrée : {args.baseline} ({len(measured)} cas)", file=sys.stderr)
+
+    _print_summary(report, comparison)
+    for pool in (tts_service.piper_pool, epub_service.epub_pool):
+        if pool is not None:
+            pool.shutdown()
+    # Un cas en erreur (ex: extraction EPUB cassée) est plus grave qu'une régression : il fait aussi échouer la commande
+    regressions = [name for name, compared in comparison.items() if compared['regression']]
+    failures = [name for name, result in report['results'].items() if 'error' in result]
+    if regressions:
+        print(f"Régressions : {', '.join(regressions)}", file=sys.stderr)
+    if failures:
+        print(f"Cas en erreur : {', '.join(failures)}", file=sys.stderr)
+    return 1 if regressions or failures else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
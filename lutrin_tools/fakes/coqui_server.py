@@ -0,0 +1,131 @@
+# lutrin_tools/fakes/coqui_server.py
+# Serveur HTTP local imitant l'API de Coqui TTS (POST ou GET /api/tts) pour tester la synthèse
+# Coqui sans le conteneur XTTS. Répond un WAV (tonalité) dont la durée suit la longueur du texte,
+# après un temps de "synthèse" proportionnel, avec le même nombre de synthèses simultanées
+# qu'un vrai serveur (une seule par défaut). Latence et erreurs supplémentaires : voir faults.
+#
+# Usage (depuis la racine du projet) :
+#   python -m lutrin_tools.fakes.coqui_server [--port 5002] [--delay-per-char 0.01] [--concurrency 1] [--error-rate 0.05]
+import argparse
+import io
+import math
+import struct
+import threading
+import time
+import wave
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from lutrin_tools.fakes.faults import Faults, add_arguments, from_args
+
+SAMPLE_RATE = 24000 # Fréquence d'échantillonnage de XTTS v2
+SECONDS_PER_CHAR = 0.06 # Débit de parole approximatif
+
+
+def synthesize(text, sample_rate=SAMPLE_RATE):
+    """WAV mono 16 bits : une tonalité dont la hauteur dépend du texte, de durée proportionnelle."""
+    frames = max(1, int(len(text) * SECONDS_PER_CHAR * sample_rate))
+    frequency = 220 + sum(map(ord, text)) % 440
+    step = 2 * math.pi * frequency / sample_rate
+    # Une période est calculée puis répétée : la génération reste négligeable devant le délai simulé
+    period = max(1, round(sample_rate / frequency))
+    cycle = struct.pack(f'<{period}h', *(int(8000 * math.sin(step * i)) for i in range(period)))
+    pcm = (cycle * (frames // period + 1))[:frames * 2]
+
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as wav_file:
+        wav_file.setnchannels(1)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(sample_rate)
+        wav_file.writeframes(pcm)
+    return buffer.getvalue()
+
+
+class FakeCoquiHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1' # Connexions keep-alive, comme le vrai serveur derrière un client poolé
+    server_version = 'FakeCoqui/1.0'
+
+    def _params(self):
+        query = parse_qs(urlparse(self.path).query)
+        if self.command == 'POST':
+            length = int(self.headers.get('Content-Length', 0))
+            query.update(parse_qs(self.rfile.read(length).decode('utf-8')))
+        return {key: values[0] for key, values in query.items()}
+
+    def _reply(self, status, body, content_type):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _tts(self):
+        if urlparse(self.path).path != '/api/tts':
+            self._reply(404, b'Not found', 'text/plain')
+            return
+        params = self._params()
+        text = params.get('text', '').strip()
+        if not text:
+            self._reply(400, b'Missing text', 'text/plain')
+            return
+
+        stats = self.server.stats
+        with self.server.slots:
+            with self.server.stats_lock:
+                stats['requests'] += 1
+                stats['chars'] += len(text)
+                stats['speakers'].add(params.get('speaker_id'))
+            if self.server.faults.should_fail():
+                self.server.faults.delay()
+                with self.server.stats_lock:
+                    stats['errors'] += 1
+                self._reply(self.server.faults.error_status, b'Simulated failure', 'text/plain')
+                return
+            self.server.faults.delay(len(text) * self.server.delay_per_char)
+            body = synthesize(text)
+        self._reply(200, body, 'audio/wav')
+
+    do_GET = _tts
+    do_POST = _tts
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+def start(port=0, delay_per_char=0.01, concurrency=1, verbose=False, host='127.0.0.1', faults=None):
+    """Démarre le serveur dans un thread et le retourne (URL : server.url, arrêt : server.shutdown())."""
+    server = ThreadingHTTPServer((host, port), FakeCoquiHandler)
+    server.daemon_threads = True
+    server.delay_per_char = delay_per_char
+    server.faults = faults or Faults()
+    server.slots = threading.BoundedSemaphore(concurrency)
+    server.verbose = verbose
+    server.stats = {'requests': 0, 'errors': 0, 'chars': 0, 'speakers': set()}
+    server.stats_lock = threading.Lock()
+    server.url = f"http://{host}:{server.server_port}"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Faux serveur Coqui TTS pour les tests et benchmarks")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5002)
+    parser.add_argument('--delay-per-char', type=float, default=0.01, help="Temps de synthèse simulé par caractère (s)")
+    parser.add_argument('--concurrency', type=int, default=1, help="Synthèses simultanées (1 = comme XTTS sur CPU)")
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    server = start(args.port, args.delay_per_char, args.concurrency, verbose=True, host=args.host, faults=from_args(args))
+    print(f"Faux serveur Coqui à l'écoute sur {server.url}/api/tts (Ctrl+C pour arrêter)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
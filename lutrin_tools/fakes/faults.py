@@ -0,0 +1,46 @@
+# lutrin_tools/fakes/faults.py
+# Latence et erreurs simulées, partagées par les faux serveurs (Coqui, Groq, Google Books) :
+# délai de réponse de base avec une variation aléatoire, et proportion de réponses en erreur.
+import random
+import threading
+import time
+
+
+class Faults:
+    """
+    Comportement dégradé d'un faux service : `latency` secondes (± `jitter`) avant chaque
+    réponse, et une proportion `error_rate` de requêtes en échec (statut `error_status`).
+    """
+
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, error_status=503, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def delay(self, extra=0.0):
+        """Attend la latence simulée (plus `extra` secondes, ex: temps de synthèse)."""
+        with self._lock:
+            variation = self._random.uniform(-self.jitter, self.jitter) if self.jitter else 0.0
+        time.sleep(max(0.0, self.latency + variation) + extra)
+
+    def should_fail(self):
+        """Tire au sort si la requête courante doit échouer."""
+        if not self.error_rate:
+            return False
+        with self._lock:
+            return self._random.random() < self.error_rate
+
+
+def add_arguments(parser, latency=0.0):
+    """Ajoute les options de latence et d'erreurs à la ligne de commande d'un faux serveur."""
+    parser.add_argument('--latency', type=float, default=latency, help="Délai avant chaque réponse (s)")
+    parser.add_argument('--jitter', type=float, default=0.0, help="Variation aléatoire du délai (± s)")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Proportion de réponses en erreur (0 à 1)")
+    parser.add_argument('--error-status', type=int, default=503, help="Statut HTTP des réponses en erreur")
+
+
+def from_args(args):
+    return Faults(args.latency, args.jitter, args.error_rate, args.error_status)
@@ -0,0 +1,126 @@
+# lutrin_tools/fakes/google_books_server.py
+# Serveur HTTP local imitant la recherche de l'API Google Books (GET /books/v1/volumes?q=...)
+# pour tester l'enrichissement des EPUB sans accès réseau. Renvoie --results volumes construits
+# à partir du titre et de l'auteur de la requête (intitle:... inauthor:...), avec des descriptions
+# de --description-chars caractères. Le serveur Lutrin s'y branche avec GOOGLE_BOOKS_URL.
+#
+# Usage (depuis la racine du projet) :
+#   python -m lutrin_tools.fakes.google_books_server [--port 5004] [--latency 0.2] [--results 10] [--error-rate 0.05]
+import argparse
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from lutrin_tools.fakes.faults import Faults, add_arguments, from_args
+
+VOLUMES_PATH = '/books/v1/volumes'
+
+DESCRIPTION = ("Sur la planète des sables, une famille noble tente de survivre aux intrigues de l'Empire. "
+               "Un classique de la science-fiction, réédité dans une nouvelle traduction. ")
+
+
+def _volumes(query, count, description_chars):
+    """Résultats de recherche au format Google Books, le premier correspondant à la requête."""
+    match = re.match(r'\s*(?:intitle:)?(.*?)(?:\s+inauthor:(.*))?$', query)
+    title = match.group(1).strip() or "Titre inconnu"
+    author = (match.group(2) or '').strip() or "Auteur inconnu"
+    description = (DESCRIPTION * (description_chars // len(DESCRIPTION) + 1))[:description_chars]
+    items = []
+    for index in range(count):
+        items.append({
+            "kind": "books#volume",
+            "id": f"fake{index:04d}",
+            "volumeInfo": {
+                "title": title if index == 0 else f"{title} ({index})",
+                "subtitle": f"Tome {index + 1}",
+                "authors": [author],
+                "publisher": "Éditions de test",
+                "publishedDate": str(1965 + index),
+                "description": description,
+                "industryIdentifiers": [{"type": "ISBN_13", "identifier": f"978000000{index:04d}"}],
+                "categories": ["Fiction"],
+                "language": "fr",
+            },
+        })
+    return {"kind": "books#volumes", "totalItems": count, "items": items}
+
+
+class FakeGoogleBooksHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    server_version = 'FakeGoogleBooks/1.0'
+
+    def _reply(self, status, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=UTF-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path != VOLUMES_PATH:
+            self._reply(404, {"error": {"code": 404, "message": "Not found"}})
+            return
+
+        server = self.server
+        with server.stats_lock:
+            server.stats['requests'] += 1
+        if server.faults.should_fail():
+            server.faults.delay()
+            with server.stats_lock:
+                server.stats['errors'] += 1
+            self._reply(server.faults.error_status, {"error": {"code": server.faults.error_status, "message": "Simulated failure"}})
+            return
+
+        query = parse_qs(url.query).get('q', [''])[0]
+        server.faults.delay()
+        self._reply(200, _volumes(query, server.results, server.description_chars))
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+def start(port=0, results=10, description_chars=1200, faults=None, verbose=False, host='127.0.0.1'):
+    """
+    Démarre le serveur dans un thread et le retourne (arrêt : server.shutdown()).
+    server.url est l'adresse à donner à GOOGLE_BOOKS_URL.
+    """
+    server = ThreadingHTTPServer((host, port), FakeGoogleBooksHandler)
+    server.daemon_threads = True
+    server.results = results
+    server.description_chars = description_chars
+    server.faults = faults or Faults(latency=0.15)
+    server.verbose = verbose
+    server.stats = {'requests': 0, 'errors': 0}
+    server.stats_lock = threading.Lock()
+    server.url = f"http://{host}:{server.server_port}/books/v1"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Faux serveur Google Books pour les tests de charge")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5004)
+    parser.add_argument('--results', type=int, default=10, help="Nombre de volumes renvoyés par recherche")
+    parser.add_argument('--description-chars', type=int, default=1200, help="Longueur des descriptions")
+    add_arguments(parser, latency=0.15)
+    args = parser.parse_args()
+
+    server = start(args.port, args.results, args.description_chars, from_args(args), verbose=True, host=args.host)
+    print(f"Faux serveur Google Books à l'écoute (GOOGLE_BOOKS_URL={server.url}, Ctrl+C pour arrêter)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,137 @@
+# lutrin_tools/fakes/groq_server.py
+# Serveur HTTP local imitant l'API Groq (POST /openai/v1/chat/completions, format OpenAI)
+# pour tester l'OCR Groq et l'enrichissement des EPUB sans clé ni accès réseau.
+# La réponse dépend de la requête : texte "reconnu" de --ocr-chars caractères pour une image,
+# objet JSON de désambiguïsation pour une liste de résultats Google Books, sinon métadonnées
+# nettoyées. Le serveur Lutrin s'y branche avec GROQ_BASE_URL (et un GROQ_TOKEN quelconque).
+#
+# Usage (depuis la racine du projet) :
+#   python -m lutrin_tools.fakes.groq_server [--port 5003] [--latency 0.8] [--ocr-chars 1500] [--error-rate 0.05]
+import argparse
+import json
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from lutrin_tools.fakes.faults import Faults, add_arguments, from_args
+
+COMPLETIONS_PATH = '/openai/v1/chat/completions'
+
+SAMPLE_TEXT = ("Pour un Mentat, Piter, tu parles trop, dit le Baron. Et il songea : il faudra que je me "
+               "débarrasse de celui-là avant peu. Il a presque fait son temps. ")
+
+
+def _ocr_text(chars):
+    """Texte de `chars` caractères, découpé en paragraphes comme une page de livre."""
+    text = (SAMPLE_TEXT * (chars // len(SAMPLE_TEXT) + 1))[:chars]
+    return "\n\n".join(text[i:i + 600].strip() for i in range(0, len(text), 600))
+
+
+def _answer(messages, response_format, ocr_chars):
+    """Contenu de la réponse de l'assistant, selon le type de requête reconnu."""
+    for message in messages:
+        content = message.get('content')
+        if isinstance(content, list) and any(part.get('type') == 'image_url' for part in content):
+            return _ocr_text(ocr_chars)
+
+    prompt = " ".join(message.get('content', '') for message in messages if isinstance(message.get('content'), str))
+    if (response_format or {}).get('type') != 'json_object':
+        return _ocr_text(ocr_chars)
+    if '"index"' in prompt:
+        return json.dumps({
+            "index": 0,
+            "reason": "Titre et auteur identiques",
+            "confidence": 0.92,
+            "description_fr": _ocr_text(min(ocr_chars, 800)),
+        }, ensure_ascii=False)
+    return json.dumps({"title": "livre de test", "style": "Roman", "series": None, "series_number": None}, ensure_ascii=False)
+
+
+class FakeGroqHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    server_version = 'FakeGroq/1.0'
+
+    def _reply(self, status, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        raw = self.rfile.read(length)
+        if self.path.split('?')[0] != COMPLETIONS_PATH:
+            self._reply(404, {"error": {"message": "Unknown path", "type": "invalid_request_error"}})
+            return
+
+        server = self.server
+        with server.stats_lock:
+            server.stats['requests'] += 1
+            server.stats['bytes_in'] += len(raw)
+        if server.faults.should_fail():
+            server.faults.delay()
+            with server.stats_lock:
+                server.stats['errors'] += 1
+            self._reply(server.faults.error_status, {"error": {"message": "Simulated failure", "type": "server_error"}})
+            return
+
+        request = json.loads(raw or b'{}')
+        content = _answer(request.get('messages', []), request.get('response_format'), server.ocr_chars)
+        server.faults.delay()
+        self._reply(200, {
+            "id": f"chatcmpl-{uuid.uuid4().hex}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get('model', 'fake'),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
+                "logprobs": None,
+            }],
+            "usage": {"prompt_tokens": len(raw) // 4, "completion_tokens": len(content) // 4,
+                      "total_tokens": (len(raw) + len(content)) // 4},
+        })
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+def start(port=0, ocr_chars=1500, faults=None, verbose=False, host='127.0.0.1'):
+    """Démarre le serveur dans un thread et le retourne (URL : server.url, arrêt : server.shutdown())."""
+    server = ThreadingHTTPServer((host, port), FakeGroqHandler)
+    server.daemon_threads = True
+    server.ocr_chars = ocr_chars
+    server.faults = faults or Faults(latency=0.5)
+    server.verbose = verbose
+    server.stats = {'requests': 0, 'errors': 0, 'bytes_in': 0}
+    server.stats_lock = threading.Lock()
+    server.url = f"http://{host}:{server.server_port}"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Faux serveur Groq (chat completions) pour les tests de charge")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5003)
+    parser.add_argument('--ocr-chars', type=int, default=1500, help="Longueur du texte renvoyé pour une image")
+    add_arguments(parser, latency=0.5)
+    args = parser.parse_args()
+
+    server = start(args.port, args.ocr_chars, from_args(args), verbose=True, host=args.host)
+    print(f"Faux serveur Groq à l'écoute sur {server.url} (GROQ_BASE_URL={server.url}, Ctrl+C pour arrêter)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
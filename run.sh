@@ -12,6 +12,7 @@ VENV_PYTHON="$API_DIR/venv/bin/python3"
 VENV_PIP="$API_DIR/venv/bin/pip3"
 API_PORT=5000
 CLIENT_PORT=8000
+CLIENT_MAX_CONNECTIONS=32 # Connexions navigateur traitées simultanément par le proxy
 
 # Fichiers pour stocker les PIDs (Process IDs) des serveurs
 API_PID_FILE="/tmp/lutrin_api.pid"
@@ -77,7 +78,7 @@ start_client() {
         EchoOrange "Le serveur client semble déjà en cours d'exécution."
     else
         cd "$CLIENT_DIR" # On est déjà dans le répertoire lutrin_client
-        nohup python3 -u server.py "$CLIENT_PORT" "$API_PORT" "../$CERT_FILE" "../$KEY_FILE" > "$CLIENT_LOG_FILE" 2>&1 & echo $! > "$CLIENT_PID_FILE"
+        nohup python3 -u server.py "$CLIENT_PORT" "$API_PORT" "../$CERT_FILE" "../$KEY_FILE" "$CLIENT_MAX_CONNECTIONS" > "$CLIENT_LOG_FILE" 2>&1 & echo $! > "$CLIENT_PID_FILE"
         cd ..
         # Lire l'IP depuis le fichier de config pour un message correct
         local client_ip=$(grep -oP 'const IP_ADDRESS = "\K[^"]+' "$CLIENT_CONFIG_FILE" || echo "localhost")
@@ -141,7 +142,7 @@ install_project() {
 
     Title "Installation des dépendances système"
     EchoOrange "Cette étape nécessite les droits super-utilisateur (sudo)."
-    sudo apt update && sudo apt install -y python3 python3-pip python3-venv git make inotify-tools libgl1 openssl
+    sudo apt update && sudo apt install -y python3 python3-pip python3-venv git make inotify-tools libgl1 openssl ffmpeg python3-brotli
     if [ $? -ne 0 ]; then
         EchoRouge "L'installation des dépendances système a échoué."
         exit 1